@@ -1,32 +1,59 @@
 import os
+import csv
+import json
+import time
+import glob
 import yaml
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from expertdx.verification import LLMEval, calculate_elbo, parse_diagnostic_outcome
 from expertdx.initialize import load_env, load_llm
 from expertdx.utils.logging_utils import setup_logger
 
+CONFIG_PATH = "config/local.yaml"
+LLM_CONFIG_PATH = "config/llm.yaml"
+RESULTS_DIR = "results/experiments"
+RESULT_FIELDS = ["task_id", "status", "coherence", "consistency", "relevance", "elbo",
+                 "send_tokens", "recv_tokens", "total_tokens", "wall_time", "error"]
 
-def run_experiment(task_id):
+
+def run_experiment(task_id, config_path=CONFIG_PATH, llm_config_path=LLM_CONFIG_PATH):
+    scores, elbo, _ = evaluate_task(task_id, config_path, llm_config_path)
+    return scores, elbo
+
+
+def evaluate_task(task_id, config_path=CONFIG_PATH, llm_config_path=LLM_CONFIG_PATH, rate_limit_shares=1):
+    """
+    :param rate_limit_shares: number of worker processes sharing the rate limit budgets of the config
+    :return: llm-eval scores, ELBO and the [send, recv, total] tokens of the diagnosis
+    """
     output_file = f"logs/{task_id}.log"
     if not os.path.exists(output_file):
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
     setup_logger(output_file)
 
-    llm_config_path = "config/llm.yaml"
     with open(llm_config_path) as f:
         task_config = yaml.safe_load(f)
     llm_config = task_config["llm"]
     llm = load_llm(llm_config)
+    # optional cheaper model to extract the ELBO prediction vector
+    extract_llm = load_llm(task_config["extract_llm"]) if "extract_llm" in task_config else None
 
-    root_causes, state, summary = run_diagnosis(task_id)
-    observation = parse_diagnostic_outcome(state)
+    env = load_env(task_id, config_path, rate_limit_shares=rate_limit_shares)
+    root_causes, summary = env.run(task_id=task_id)
+    observation = parse_diagnostic_outcome(env.state)
+    # steps of all agents: the helper, with the tool analyses of verify, and the mitigations of module agents
+    tokens = env.helper.get_run_history().get_tokens()
 
     scores = run_llm_eval(llm, summary)
-    elbo = calculate_elbo(llm, root_causes, observation)
-    return scores, elbo
+    elbo = calculate_elbo(llm, root_causes, observation, extract_llm=extract_llm)
+    return scores, elbo, tokens
 
 
-def run_diagnosis(task_id):
-    env = load_env("config/local.yaml")
+def run_diagnosis(task_id, config_path=CONFIG_PATH):
+    env = load_env(task_id, config_path)
     root_causes, summary = env.run(task_id=task_id)
     return root_causes, env.state, summary
 
@@ -36,3 +63,124 @@ def run_llm_eval(llm, report):
     llm_eval.load_prompts()
     scores = llm_eval.evaluate(report)
     return scores
+
+
+def run_task(task_id, config_path=CONFIG_PATH, llm_config_path=LLM_CONFIG_PATH, results_dir=RESULTS_DIR,
+             rate_limit_shares=1) -> dict:
+    """
+    run one task in a worker process and save its result, failures are recorded instead of raised.
+    steps recorded in the checkpoint of an interrupted run are replayed without llm calls, so partial tasks resume.
+    """
+    start = time.time()
+    result = {"task_id": task_id}
+    try:
+        scores, elbo, tokens = evaluate_task(task_id, config_path, llm_config_path, rate_limit_shares)
+        result.update(status="ok", elbo=float(elbo), error="")
+        result.update(zip(["coherence", "consistency", "relevance"], scores))
+        result.update(zip(["send_tokens", "recv_tokens", "total_tokens"], tokens))
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+        result["traceback"] = traceback.format_exc()
+    result["wall_time"] = round(time.time() - start, 2)
+
+    with open(_get_result_path(results_dir, task_id), "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return result
+
+
+def run_batch(task_ids, workers=4, config_path=CONFIG_PATH, llm_config_path=LLM_CONFIG_PATH,
+              results_dir=RESULTS_DIR, force=False) -> str:
+    """
+    run tasks across a process pool, skipping tasks completed before unless `force`.
+    :return: path of the consolidated results table
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    pending = [task_id for task_id in task_ids if force or not _is_completed(results_dir, task_id)]
+    print(f"{len(task_ids) - len(pending)} tasks completed before, {len(pending)} to run.")
+
+    # spawned workers start clean, without the event loop and connections of the parent,
+    # each with an equal share of the rate limit budgets so that the batch stays within them
+    workers = max(1, min(workers, len(pending)))
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(run_task, task_id, config_path, llm_config_path, results_dir, workers): task_id
+            for task_id in pending
+        }
+        for future in as_completed(futures):
+            task_id = futures[future]
+            try:
+                result = future.result()
+                print(f"[{result['status']}] {task_id} ({result['wall_time']}s) {result['error']}")
+            except Exception as e:
+                # the worker itself died, e.g. killed by the system
+                print(f"[failed] {task_id}: {type(e).__name__}: {e}")
+
+    return write_results_table(task_ids, results_dir)
+
+
+def write_results_table(task_ids, results_dir=RESULTS_DIR) -> str:
+    table_path = os.path.join(results_dir, "results.csv")
+    with open(table_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for task_id in task_ids:
+            result_path = _get_result_path(results_dir, task_id)
+            if os.path.exists(result_path):
+                with open(result_path) as rf:
+                    writer.writerow(json.load(rf))
+            else:
+                writer.writerow({"task_id": task_id, "status": "missing"})
+    print(f"results of {len(task_ids)} tasks written to {table_path}")
+    return table_path
+
+
+def find_tasks(patterns, data_dir) -> list:
+    """
+    task ids under `data_dir` matching any of `patterns` (task ids or globs), in sorted order.
+    """
+    task_ids = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(data_dir, pattern)):
+            if os.path.isdir(path):
+                task_ids.add(os.path.basename(os.path.normpath(path)))
+    return sorted(task_ids)
+
+
+def _get_result_path(results_dir, task_id) -> str:
+    return os.path.join(results_dir, f"{task_id}.json")
+
+
+def _is_completed(results_dir, task_id) -> bool:
+    result_path = _get_result_path(results_dir, task_id)
+    if not os.path.exists(result_path):
+        return False
+    with open(result_path) as f:
+        return json.load(f).get("status") == "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run ExpertDX diagnosis and evaluation over recorded incidents.")
+    parser.add_argument("tasks", nargs="*", default=["*"], help="task ids or glob patterns under the data dir")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--llm-config", default=LLM_CONFIG_PATH)
+    parser.add_argument("--data-dir", default=None, help="defaults to `environment.data_dir` of the config")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="re-run tasks completed before")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        with open(args.config) as f:
+            data_dir = yaml.safe_load(f)["environment"]["data_dir"]
+    task_ids = find_tasks(args.tasks, data_dir)
+    if not task_ids:
+        parser.error(f"no task matches {args.tasks} in {data_dir}.")
+
+    run_batch(task_ids, workers=args.workers, config_path=args.config, llm_config_path=args.llm_config,
+              results_dir=args.results_dir, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
 from expertdx.registry import Registry
+from expertdx.utils.lazy_utils import lazy_exports
 agent_registry = Registry(name="AgentRegistry")
+agent_registry.register_lazy("expertdx.agents.helper_agent", "helper_agent")
+agent_registry.register_lazy("expertdx.agents.module_agent", "module_agent")
 
 from .base import Agent
+from .checkpoint import Checkpoint, open_checkpoint, get_checkpoint, input_key
+from .history import RunHistory, open_run_history, get_run_history
 from .tool_agent import ToolAgent, AgentFinish, AgentAction
-from .helper_agent import HelperAgent
-from .module_agent import ModuleAgent
+
+__getattr__ = lazy_exports(__name__, {
+    "HelperAgent": ".helper_agent",
+    "ModuleAgent": ".module_agent",
+})
@@ -1,7 +1,7 @@
 from abc import abstractmethod
-from typing import Any, Dict, Set, Union, Optional
+from typing import Any, Dict, Set, Union, Optional, Tuple
 from pydantic import BaseModel, Field
-from expertdx.llms import BaseLLM
+from expertdx.llms import BaseLLM, LLMResult, generate_json
 from expertdx.memory import ChatMemory, Memory
 from expertdx.toolkit import Toolkit
 from expertdx.utils.logging_utils import get_logger
@@ -13,6 +13,7 @@ class Agent(BaseModel):
     toolkit: Toolkit = Field(default_factory=Toolkit)
 
     llm: BaseLLM
+    routes: Dict[str, BaseLLM] = Field(default_factory=dict)     # step type -> (cheaper) llm for that step
     memory: Memory = Field(default_factory=Memory)
     chat_memory: ChatMemory = Field(default_factory=ChatMemory)
     receiver: Set[str] = Field(default={"all"})
@@ -33,6 +34,15 @@ class Agent(BaseModel):
         """Reset the agent"""
         pass
 
+    def get_llm(self, step: str) -> BaseLLM:
+        return self.routes.get(step, self.llm)
+
+    def generate_json(self, step: str, schema: Any, **kwargs) -> Tuple[Any, LLMResult]:
+        """
+        JSON request on the llm routed for `step`, falling back to `llm` when the output does not match `schema`.
+        """
+        return generate_json(self.get_llm(step), schema, fallback_llm=self.llm, **kwargs)
+
     def get_receiver(self) -> Set[str]:
         return self.receiver
 
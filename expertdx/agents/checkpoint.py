@@ -0,0 +1,118 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from expertdx.utils.logging_utils import get_logger
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+_checkpoints: Dict[str, "Checkpoint"] = {}
+_checkpoints_lock = threading.Lock()
+
+
+def input_key(*parts: str) -> str:
+    """content address of the input a step is computed from."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """
+    Append-only log of the steps of a diagnosis run, one JSON record per line: `{seq, kind, key, output, time}`,
+    `key` addressing the input of the step and `output` holding all it applies to the state.
+    A resumed run replays the log in order: while the next record matches the kind and input of the step,
+    its output is applied without calling the llm. At the first mismatch the rest of the log is stale and
+    dropped, the run continues live from there.
+    """
+
+    def __init__(self, path: str):
+        dir_path = os.path.dirname(path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+        self.path = path
+        self.records: List[dict] = []
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.logger = get_logger(self.__class__.__name__)
+        self._load()
+
+    def replay(self, kind: str, key: str) -> Optional[dict]:
+        """
+        :return: output of the next record if it is a `kind` step of the same input, else None
+        """
+        with self.lock:
+            if self.cursor >= len(self.records):
+                return None
+            record = self.records[self.cursor]
+            if record["kind"] == kind and record["key"] == key:
+                self.cursor += 1
+                self.logger.info(f"replay #{record['seq']}: {kind}.")
+                # the state takes ownership of what is applied, the log keeps its own copy
+                return copy.deepcopy(record["output"])
+            reason = f"input of {kind} changed" if record["kind"] == kind else f"recorded {record['kind']}, now {kind}"
+            self.logger.warning(f"checkpoint diverges at #{self.cursor} ({reason}), "
+                                f"drop {len(self.records) - self.cursor} records.")
+            self._truncate()
+            return None
+
+    def record(self, kind: str, key: str, output: dict) -> None:
+        with self.lock:
+            if self.cursor < len(self.records):
+                # records not replayed would follow from a different past
+                self._truncate()
+            line = json.dumps({"seq": self.cursor, "kind": kind, "key": key, "output": output, "time": time.time()},
+                              ensure_ascii=False)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.records.append(json.loads(line))
+            self.cursor += 1
+
+    def is_replaying(self) -> bool:
+        return self.cursor < len(self.records)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        torn = False
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    self.records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a record cut short by a crash, and anything after it, is not replayed
+                    torn = True
+                    break
+        self.logger.info(f"load {len(self.records)} records from {self.path}.")
+        if torn:
+            self._truncate(len(self.records))
+
+    def _truncate(self, length: Optional[int] = None) -> None:
+        self.records = self.records[:self.cursor if length is None else length]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+def open_checkpoint(path: str) -> Checkpoint:
+    """
+    (re)open the checkpoint at `path` for a new run, replaying from its first record.
+    """
+    checkpoint = Checkpoint(path)
+    with _checkpoints_lock:
+        _checkpoints[path] = checkpoint
+    return checkpoint
+
+
+def get_checkpoint(path: str) -> Checkpoint:
+    """
+    checkpoint of the run at `path`, shared by the agents of the run.
+    """
+    with _checkpoints_lock:
+        checkpoint = _checkpoints.get(path)
+    return checkpoint if checkpoint is not None else open_checkpoint(path)
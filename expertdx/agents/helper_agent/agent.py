@@ -1,24 +1,28 @@
 import os
 import re
 import json
-from typing import List, Dict, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional, Union, Callable, Tuple
 from string import Template
 from pydantic import Field
-from expertdx.llms import BaseLLM, AzureOpenAIChat
+from expertdx.llms import BaseLLM, AzureOpenAIChat, JSONEvent, LLMResult, SelfConsistency, \
+    cause_name_similarity, extract_cause_names
 from expertdx.toolkit import Toolkit
+from expertdx.memory import Memory
 from expertdx.diagnostics import DiagnosticState, DiagnosticItem, Severity,\
     create_diagnostic_item, create_diagnostic_criteria, product_name2id, update_item_name
 from expertdx.message import SystemMessage, UserMessage, ToolMessage, AssistantMessage
 from expertdx.utils.debug_utils import debug_on_end
-from expertdx.plot import plot_causal_graph
+from expertdx.plot import plot_causal_graph, PlotQueue, PLOT_FORMATS
+from expertdx.retrieval import IncidentIndex
 from .. import agent_registry
 from ..tool_agent import ToolAgent, AgentAction, AgentFinish
+from ..checkpoint import CHECKPOINT_FILE, Checkpoint, open_checkpoint, get_checkpoint, input_key
+from ..history import HISTORY_FILE, RunHistory, open_run_history, get_run_history
 from ..module_agent import ModuleAgent
 from .prompt import ROLE_DESCRIPTION, PRODUCT_DESCRIPTION, SELECT_PROMPT, \
     EXPAND_ANALYZE_PROMPT, EXPAND_GENERATE_PROMPT, EXPAND_EXTRACT_PROMPT, \
-    VERIFY_PROMPT, VERIFY_UPDATE_PROMPT, SUMMARY_PROMPT
-
-DEBUG = True
+    VERIFY_PROMPT, VERIFY_UPDATE_PROMPT, SUMMARY_PROMPT, SELECT_SCHEMA, EXPAND_EXTRACT_SCHEMA, VERIFY_UPDATE_SCHEMA
 
 
 @agent_registry.register("helper_agent")
@@ -38,28 +42,35 @@ class HelperAgent(ToolAgent):
 
     data_dir: str = Field(default="data")
     history: List[dict] = Field(default=[])
+    incident_index: Optional[IncidentIndex] = Field(default=None)   # similar past incidents seed the causal graph
+    self_consistency: Optional[SelfConsistency] = Field(default=None)   # adaptive sample count of expand
+    async_plot: bool = Field(default=True)      # render plots in a worker process, flushed at the end of a run
+    plot_queue: Any = Field(default=None)
+    plot_format: str = Field(default="png")     # png, svg, dot or mermaid
 
     def causal_analyze(self, task_id, plot=True, consist_k: int = 3) -> DiagnosticState:
         self.task_id = task_id
         self.logger.info("[step 0: causal analysis]")
 
-        if DEBUG:
-            filename = self._get_filepath("step0_causal_graph.json")
-            if os.path.exists(filename):
-                self.load_history()
-                with open(filename) as f:
-                    causal_graph = json.load(f)
-                items = DiagnosticItem.from_dict(causal_graph["nodes"])
-                rels = causal_graph["edges"]
-                state = DiagnosticState(diagnostic_items=items, causal_relationships=rels)
-                return state
-
-        rule_analyzer = self.toolkit.get_tool_by_name("rule_analyzer")
-        state = rule_analyzer(task_id=task_id, consist_k=consist_k)
-        causal_graph = {
-            "nodes": state.to_list(),
-            "edges": state.causal_relationships
-        }
+        checkpoint = open_checkpoint(self._get_filepath(CHECKPOINT_FILE))
+        # the history of a resumed run is rebuilt by the replayed steps
+        open_run_history(self._get_filepath(HISTORY_FILE), reset=True)
+        self.history = []
+        with open(f"{self.data_dir}/{task_id}/rule_diagnostic_results.json") as f:
+            key = input_key(task_id, f.read())
+        causal_graph = checkpoint.replay("causal_analysis", key)
+        replayed = causal_graph is not None
+        if replayed:
+            items = DiagnosticItem.from_dict(causal_graph["nodes"])
+            state = DiagnosticState(diagnostic_items=items, causal_relationships=causal_graph["edges"])
+        else:
+            rule_analyzer = self.toolkit.get_tool_by_name("rule_analyzer")
+            state = rule_analyzer(task_id=task_id, consist_k=consist_k, incident_index=self.incident_index)
+            causal_graph = {
+                "nodes": state.to_list(),
+                "edges": state.causal_relationships
+            }
+            checkpoint.record("causal_analysis", key, causal_graph)
 
         filename = self._get_filepath("step0_causal_graph.json")
         if not os.path.exists(os.path.dirname(filename)):
@@ -76,44 +87,47 @@ class HelperAgent(ToolAgent):
             "diagnostic_state": state.to_dict()
         }
         self.update_history(step_info)
-        self.save_history()
-        if plot:
+        if plot and not replayed:
             self.plot(state, "step0_causal_analysis")
 
         return state
 
     @debug_on_end
-    def select(self, state: DiagnosticState, stream=True, plot=True) -> DiagnosticItem:
+    def select(self, state: DiagnosticState, stream=True, plot=True,
+               on_select: Optional[Callable[[DiagnosticItem], None]] = None,
+               prefetched: Optional[Tuple[dict, LLMResult]] = None) -> DiagnosticItem:
+        """
+        :param on_select: called with the selected item as soon as its name is generated, before the response completes;
+            provisional, if that attempt is rejected the fallback may select another item (each item is reported once)
+        :param prefetched: result of `query_select` already computed for this state, e.g. speculatively
+        """
         self.iteration += 1
         self.logger.info(f"[step {self.iteration}: select]")
 
-        if DEBUG:
-            filename = self._get_filepath(f"step{self.iteration}_select.json")
-            if os.path.exists(filename):
-                self.load_history()
-                with open(filename) as f:
-                    content = json.load(f)
+        selected = {}
 
-                name = content["name"]
-                item = state.get_item_by_name(name)
-                item.set_possible_root_cause(not content["need_verify"])
-
-                self.logger.info(f"[step {self.iteration}: select] `{name}`.")
-                return item
-
-        input_items = {
-            "diagnostic_items": state.to_list(add_causes=True, only_not_fixed=True)
-        }
-        response = self.llm.generate_response(
-            messages=[
-                {"role": "system", "content": self.role_description},
-                {"role": "user", "content": Template(SELECT_PROMPT).substitute(
-                    items=json.dumps(input_items, indent=2, ensure_ascii=False))}
-            ],
-            stream=stream,
-            response_format={"type": "json_object"},
-        )
-        content = json.loads(response.message.content)
+        def on_event(event: JSONEvent):
+            # resolve the item once `name` closes, `need_verify` is not needed to start on it
+            if event.key == "name" and event.value not in selected:
+                try:
+                    selected[event.value] = state.get_item_by_name(event.value)
+                except (AssertionError, IndexError):
+                    return
+                self.logger.info(f"[step {self.iteration}: select] `{event.value}` (streaming).")
+                if on_select is not None:
+                    on_select(selected[event.value])
+
+        checkpoint = self.get_checkpoint()
+        key = input_key(self.get_select_prompt(state))
+        replayed = checkpoint.replay("select", key)
+        if replayed is not None:
+            content, response = replayed["content"], LLMResult.from_dict(replayed["response"])
+        else:
+            if prefetched is not None:
+                content, response = prefetched
+            else:
+                content, response = self.query_select(state, stream=stream, on_event=on_event if stream else None)
+            checkpoint.record("select", key, {"content": content, "response": response.to_dict()})
         filename = self._get_filepath(f"step{self.iteration}_select.json")
         with open(filename, "w") as f:
             json.dump(content, f, indent=2, ensure_ascii=False)
@@ -123,8 +137,10 @@ class HelperAgent(ToolAgent):
         recv_tokens = response.recv_tokens
 
         name = content["name"]
-        item = state.get_item_by_name(name)
+        item = selected.get(name) or state.get_item_by_name(name)
         item.set_possible_root_cause(not content["need_verify"])
+        if on_select is not None and name not in selected:
+            on_select(item)
 
         # save history and plot
         self.logger.info(f"[step {self.iteration}: select] `{name}`.")
@@ -137,52 +153,93 @@ class HelperAgent(ToolAgent):
             "tokens": [send_tokens, recv_tokens, total_tokens]
         }
         self.update_history(step_info)
-        self.save_history()
-        if plot:
+        if plot and replayed is None:
             self.plot(state, f"step{self.iteration}_select", select_name=item.name)
 
         return item
 
+    def query_select(self, state: DiagnosticState, stream: bool = False,
+                     on_event: Optional[Callable[[JSONEvent], None]] = None) -> Tuple[dict, LLMResult]:
+        """
+        llm request of select, reading the state only.
+        """
+        return self.generate_json(
+            "select",
+            SELECT_SCHEMA,
+            messages=[
+                {"role": "system", "content": self.role_description},
+                {"role": "user", "content": self.get_select_prompt(state)}
+            ],
+            stream=stream,
+            on_event=on_event,
+        )
+
+    @staticmethod
+    def get_select_prompt(state: DiagnosticState) -> str:
+        input_items = {
+            "diagnostic_items": state.to_list(add_causes=True, only_not_fixed=True)
+        }
+        return Template(SELECT_PROMPT).substitute(items=json.dumps(input_items, indent=2, ensure_ascii=False))
+
     @debug_on_end
     def expand(self, anomaly: DiagnosticItem, state: DiagnosticState, consist_k: int = 3,
                plot=True, stream: bool = True) -> List[DiagnosticItem]:
         self.iteration += 1
         self.logger.info(f"[step {self.iteration}: expand {anomaly.name}]")
 
-        if DEBUG:
-            analysis_filename = self._get_filepath(f"step{self.iteration}_expand_analysis.md")
-            filename = self._get_filepath(f"step{self.iteration}_expand.json")
-            if os.path.exists(filename):
-                self.load_history()
-                with open(analysis_filename) as f:
-                    analysis = f.read()
-                with open(filename) as f:
-                    subgraph = json.load(f)
-
-                suspects = list()
-                for node in subgraph["nodes"]:
-                    suspect = create_diagnostic_item(
-                        name=node["name"],
-                        product_id=product_name2id(node["product"]),
-                        severity_status=-1,
-                        expert_analysis=node["expert_analysis"],
-                        expert_suggests=node["expert_suggests"]
-                    )
-                    suspects.append(suspect)
-
-                # update anomaly syptom analysis
-                match = re.search(r'(### Symptom Analysis.*?)(###|$)', analysis, re.DOTALL)
-                try:
-                    symptom_analysis = match.group(1)
-                    anomaly.expert_analysis = symptom_analysis
-                except AttributeError as e:
-                    self.logger.warning(e)
+        checkpoint = self.get_checkpoint()
+        key = input_key(Template(EXPAND_ANALYZE_PROMPT).substitute(anomaly=anomaly), self._get_product_description())
+        result = checkpoint.replay("expand", key)
+        replayed = result is not None
+        if not replayed:
+            result = self.query_expand(anomaly, consist_k=consist_k, stream=stream)
+            checkpoint.record("expand", key, result)
+        analysis, subgraph = result["analysis"], result["subgraph"]
+
+        analysis_filename = self._get_filepath(f"step{self.iteration}_expand_analysis.md")
+        with open(analysis_filename, "w") as f:
+            f.write(analysis + "\n\n" + "\n\n".join(result["samples"]))
+        filename = self._get_filepath(f"step{self.iteration}_expand.json")
+        with open(filename, "w") as f:
+            json.dump(subgraph, f, indent=2, ensure_ascii=False)
+
+        # update diagnostic state
+        suspects = [self._create_suspect(node) for node in subgraph["nodes"]]
+        state.update(suspects, subgraph["edges"])
+
+        # update anomaly symptom analysis
+        match = re.search(r'(### Symptom Analysis.*?)(###|$)', analysis, re.DOTALL)
+        try:
+            symptom_analysis = match.group(1)
+            anomaly.expert_analysis = symptom_analysis
+        except AttributeError as e:
+            self.logger.warning(e)
+
+        # save history and plot
+        self.logger.info(f"[step {self.iteration}: expand] `{anomaly.name}` -> {[_.name for _ in suspects]}.")
+        step_info = {
+            "step": self.iteration,
+            "action": "expand",
+            "node_name": ",".join([node.name for node in suspects]),
+            "content": {
+                "analysis": analysis,
+                "subgraph": subgraph
+            },
+            "diagnostic_state": state.to_dict(),
+            "tokens": result["tokens"],
+            "samples": len(result["samples"])
+        }
+        self.update_history(step_info)
+        if plot and not replayed:
+            self.plot(state, f"step{self.iteration}_expand", select_name=[_.name for _ in suspects])
 
-                state.update(suspects, subgraph["edges"])
-                self.logger.info(f"[step {self.iteration}: expand] "
-                                 f"`{anomaly.name}` -> {[_.name for _ in suspects]}.")
-                return suspects
+        return suspects
 
+    def query_expand(self, anomaly: DiagnosticItem, consist_k: int = 3, stream: bool = True) -> dict:
+        """
+        llm requests of expand: analyze the symptoms, sample the possible causes and extract them as a subgraph.
+        :return: the analysis, the cause samples, the subgraph and the tokens used
+        """
         total_tokens, send_tokens, recv_tokens = 0, 0, 0
         # 1) analyze symptoms
         self.logger.info(f"[step {self.iteration}: expand] analysis symptoms.")
@@ -190,7 +247,7 @@ class HelperAgent(ToolAgent):
             {"role": "system", "content": self.role_description},
             {"role": "user", "content": Template(EXPAND_ANALYZE_PROMPT).substitute(anomaly=anomaly)},
         ]
-        response = self.llm.generate_response(
+        response = self.get_llm("expand.analyze").generate_response(
             messages=messages,
             stream=stream
         )
@@ -201,143 +258,130 @@ class HelperAgent(ToolAgent):
         send_tokens += response.send_tokens
         recv_tokens += response.recv_tokens
 
-        # 2) generate root causes
-        repeated = []
+        # 2) generate root causes, self-consistency samples share one prompt
         messages.append({"role": "user", "content": EXPAND_GENERATE_PROMPT})
-        for i in range(consist_k):
-            response = self.llm.generate_response(
+        if self.self_consistency is not None:
+            # sample until the cause names agree, `consist_k` is ignored
+            repeated, _, response = self.self_consistency.sample(
+                self.get_llm("expand.generate"),
+                similarity=cause_name_similarity,
+                parse=extract_cause_names,
+                name=f"step {self.iteration}: expand.generate",
                 messages=messages,
                 stream=stream
             )
-            causes = response.message.content
-            repeated.append(causes)
-
-            total_tokens += response.total_tokens
-            send_tokens += response.send_tokens
-            recv_tokens += response.recv_tokens
+        else:
+            response = self.get_llm("expand.generate").generate_response(
+                messages=messages,
+                stream=stream,
+                n=consist_k
+            )
+            repeated = [message.content for message in response.messages]
 
-        analysis_filename = self._get_filepath(f"step{self.iteration}_expand_analysis.md")
-        with open(analysis_filename, "w") as f:
-            f.write(analysis + "\n\n" + "\n\n".join(repeated))
+        total_tokens += response.total_tokens
+        send_tokens += response.send_tokens
+        recv_tokens += response.recv_tokens
 
         # 3) generate DiagnosticItems and CausalRelationships
         self.logger.info(f"[step {self.iteration}: expand] extract nodes and edges.")
-        cause_analysis = "\n\n".join([f"Analysis #{i+1}\n{repeated[i]}\n" for i in range(consist_k)])
-
-        module_names = [agent.name.split('_')[0] for agent in self.module_agents]
-        lines = PRODUCT_DESCRIPTION.split('\n')
-        pattern = re.compile(r'- (\w+):')
-        kept_lines = []
-        for line in lines:
-            match = pattern.search(line)
-            if match and match.group(1) in module_names:
-                kept_lines.append(line)
-        kept_description = '\n'.join(kept_lines)
-
+        cause_analysis = "\n\n".join([f"Analysis #{i+1}\n{repeated[i]}\n" for i in range(len(repeated))])
         messages.append({"role": "user", "content": Template(EXPAND_EXTRACT_PROMPT).substitute(
-            k=consist_k, anomaly=anomaly.name, cause_analysis=cause_analysis, product_description=kept_description)})
+            k=len(repeated), anomaly=anomaly.name, cause_analysis=cause_analysis,
+            product_description=self._get_product_description())})
 
-        response = self.llm.generate_response(
+        subgraph, response = self.generate_json(
+            "expand.extract",
+            EXPAND_EXTRACT_SCHEMA,
             messages=messages,
             stream=stream,
-            response_format={"type": "json_object"},
         )
-        content = response.message.content
-        subgraph = json.loads(content)
-
-        filename = self._get_filepath(f"step{self.iteration}_expand.json")
-        with open(filename, "w") as f:
-            json.dump(subgraph, f, indent=2, ensure_ascii=False)
 
         total_tokens += response.total_tokens
         send_tokens += response.send_tokens
         recv_tokens += response.recv_tokens
 
-        # update diagnostic state
-        suspects = list()
-        for node in subgraph["nodes"]:
-            suspect = create_diagnostic_item(
-                name=node["name"],
-                product_id=product_name2id(node["product"]),
-                severity_status=-1,
-                expert_analysis=node["expert_analysis"],
-                expert_suggests=node["expert_suggests"]
-            )
-            suspects.append(suspect)
-        state.update(suspects, subgraph["edges"])
-
-        # update anomaly symptom analysis
-        match = re.search(r'(### Symptom Analysis.*?)(###|$)', analysis, re.DOTALL)
-        try:
-            symptom_analysis = match.group(1)
-            anomaly.expert_analysis = symptom_analysis
-        except AttributeError as e:
-            self.logger.warning(e)
-
-        # save history and plot
-        self.logger.info(f"[step {self.iteration}: expand] `{anomaly.name}` -> {[_.name for _ in suspects]}.")
-        step_info = {
-            "step": self.iteration,
-            "action": "expand",
-            "node_name": ",".join([node.name for node in suspects]),
-            "content": {
-                "analysis": analysis,
-                "subgraph": subgraph
-            },
-            "diagnostic_state": state.to_dict(),
+        return {
+            "analysis": analysis,
+            "samples": repeated,
+            "subgraph": subgraph,
             "tokens": [send_tokens, recv_tokens, total_tokens]
         }
-        self.update_history(step_info)
-        self.save_history()
-        if plot:
-            self.plot(state, f"step{self.iteration}_expand", select_name=[_.name for _ in suspects])
-
-        return suspects
 
     @debug_on_end
-    def verify(self, item: DiagnosticItem, state: DiagnosticState, stream: bool = False, plot: bool = True) -> bool:
+    def verify(self, item: DiagnosticItem, state: DiagnosticState, stream: bool = False, plot: bool = True,
+               prefetched: Optional[dict] = None) -> bool:
+        """
+        :param prefetched: result of `query_verify` already computed for this item, e.g. speculatively
+        """
         self.iteration += 1
         self.logger.info(f"[step {self.iteration}: verify]")
 
-        if DEBUG:
-            filename = self._get_filepath(f"step{self.iteration}_verify.json")
-            if os.path.exists(filename):
-                self.load_history()
-                with open(filename) as f:
-                    node = json.load(f)
-                update_item_name(item, state, node["name"])
-                item.symptom = node["symptom"]
-                item.severity = Severity[node["severity"].upper()]
-                item.expert_analysis = node["expert_analysis"]
-                item.expert_suggests = node["expert_suggests"]
-                item.diagnostic_criteria = create_diagnostic_criteria(
-                    node["diagnostic_criteria"]["name"],
-                    node["diagnostic_criteria"]["type"],
-                    None,
-                    node["diagnostic_criteria"]["description"]
-                )
-                abnormal = (item.severity != Severity.NORMAL)
-                self.logger.info(
-                    f"[step {self.iteration}: verify] `{item.name}`: {'abnormal' if abnormal else 'normal'}")
-                return abnormal
+        checkpoint = self.get_checkpoint()
+        key = input_key(self.get_verify_prompt(item, state))
+        result = checkpoint.replay("verify", key)
+        if result is not None:
+            return self.apply_verify(item, state, self.iteration, result, plot=False)
+
+        result = prefetched or self.query_verify(item, state, stream=stream)
+        checkpoint.record("verify", key, result)
+        return self.apply_verify(item, state, self.iteration, result, plot=plot)
+
+    def verify_batch(self, items: List[DiagnosticItem], state: DiagnosticState, max_workers: int = 4,
+                     stream: bool = False, plot: bool = True) -> List[bool]:
+        """
+        verify sibling suspects concurrently: steps are numbered in sibling order up front, the independent
+        verification conversations run in parallel, and their results are applied to the state in sibling order.
+        :return: abnormal or not, in the order of `items`
+        """
+        if not items:
+            return []
+        iterations = [self.iteration + i + 1 for i in range(len(items))]
+        self.iteration += len(items)
+        self.logger.info(f"[step {iterations[0]}-{iterations[-1]}: verify {len(items)} suspects]")
+
+        # replayed up to the first sibling not in the checkpoint, the others are queried again
+        checkpoint = self.get_checkpoint()
+        keys = [input_key(self.get_verify_prompt(item, state)) for item in items]
+        replayed = {}
+        for i in range(len(items)):
+            result = checkpoint.replay("verify", keys[i])
+            if result is None:
+                break
+            replayed[i] = result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # concurrent streams would interleave on stdout, so only the tool loop follows `stream`
+            futures = {
+                i: executor.submit(self.query_verify, items[i], state, stream, False)
+                for i in range(len(items)) if i not in replayed
+            }
+            results = {i: future.result() for i, future in futures.items()}
+
+        abnormal = []
+        for i, item in enumerate(items):
+            if i in replayed:
+                abnormal.append(self.apply_verify(item, state, iterations[i], replayed[i], plot=False))
+            else:
+                checkpoint.record("verify", keys[i], results[i])
+                abnormal.append(self.apply_verify(item, state, iterations[i], results[i], plot=plot))
+        return abnormal
 
+    def query_verify(self, item: DiagnosticItem, state: DiagnosticState, stream: bool = False,
+                     stream_update: bool = True) -> dict:
+        """
+        query phase of verify: the tool-calling conversation, in its own memory and without touching the state or files.
+        :return: the updated node, the conversation, the query summary and the tokens used
+        """
         total_tokens, send_tokens, recv_tokens = 0, 0, 0
 
-        causal_relationship = state.get_relationships_by_cause(item.name)[0]
-        effect_item = state.get_item_by_name(causal_relationship["effect"])
-
         tool_calls_cnt = 0
-        self.memory.reset()
-        self.memory.add_message(SystemMessage(content=self.role_description))
-        self.memory.add_message(UserMessage(content=Template(VERIFY_PROMPT).substitute(
-            anomaly_name=effect_item.name,
-            cause_name=item.name,
-            anomaly_analysis=effect_item.expert_analysis,
-            causal_analysis=causal_relationship["description"]
-        )))
+        summary = None
+        memory = Memory()
+        memory.add_message(SystemMessage(content=self.role_description))
+        memory.add_message(UserMessage(content=self.get_verify_prompt(item, state)))
         while tool_calls_cnt < self.max_tool_calls:
-            response = self.llm.generate_response(
-                messages=self.memory.get_messages(),
+            response = self.get_llm("verify").generate_response(
+                messages=memory.get_messages(),
                 stream=stream,
                 tools=self._get_tools(),
                 tool_choice="auto",
@@ -353,75 +397,101 @@ class HelperAgent(ToolAgent):
                 tool_calls_cnt += 1
 
                 assistant_message = response.message
-                self.memory.add_message(AssistantMessage(content=str(assistant_message.tool_calls[0].function)))
+                memory.add_message(AssistantMessage(content=str(assistant_message.tool_calls[0].function)))
 
                 # tool observation
                 tool = self.toolkit.get_tool_by_name(output.tool)
                 module_agent = self._get_module_agent_by_name(tool.belong_to)
                 assert module_agent is not None, f"module agent for {tool.belong_to} not found."
-                observation = module_agent.tool_call(tool, {"task_id": self.task_id})
-                self.memory.add_message(ToolMessage(name=tool.name, content=observation))
+                observation, tool_tokens = module_agent.query_tool(tool, {"task_id": self.task_id})
+                memory.add_message(ToolMessage(name=tool.name, content=observation))
+                send_tokens += tool_tokens[0]
+                recv_tokens += tool_tokens[1]
+                total_tokens += tool_tokens[2]
 
             elif isinstance(output, AgentFinish):
-                self.memory.add_message(UserMessage(content=output.return_values))
+                memory.add_message(UserMessage(content=output.return_values))
                 self.logger.info(f"Return Values: {output.return_values}")
-
-                summary_filename = self._get_filepath(f"step{self.iteration}_query_summary.md")
-                with open(summary_filename, "w") as f:
-                    f.write(output.return_values)
-
+                summary = output.return_values
                 break
 
-        self.memory.add_message(UserMessage(content=VERIFY_UPDATE_PROMPT))
-        response = self.llm.generate_response(
-            messages=self.memory.get_messages(),
-            stream=True,
-            response_format={"type": "json_object"},
-        )
-        self.memory.add_message(UserMessage(content=response.message.content))
-        node = json.loads(response.message.content)
-        filename = self._get_filepath(f"step{self.iteration}_verify.json")
-        with open(filename, "w") as f:
-            json.dump(node, f, indent=2, ensure_ascii=False)
-
-        update_item_name(item, state, node["name"])
-        item.symptom = node["symptom"]
-        item.severity = Severity[node["severity"].upper()]
-        item.expert_analysis = node["expert_analysis"]
-        item.expert_suggests = node["expert_suggests"]
-        item.diagnostic_criteria = create_diagnostic_criteria(
-            node["diagnostic_criteria"]["name"],
-            node["diagnostic_criteria"]["type"],
-            None,
-            node["diagnostic_criteria"]["description"]
+        memory.add_message(UserMessage(content=VERIFY_UPDATE_PROMPT))
+        node, response = self.generate_json(
+            "verify.update",
+            VERIFY_UPDATE_SCHEMA,
+            messages=memory.get_messages(),
+            stream=stream_update,
         )
+        memory.add_message(UserMessage(content=response.message.content))
 
         total_tokens += response.total_tokens
         send_tokens += response.send_tokens
         recv_tokens += response.recv_tokens
 
-        mem_filename = self._get_filepath(f"step{self.iteration}_verify_memory.json")
-        with open(mem_filename, "w") as f:
-            json.dump({"memory": self.memory.get_messages()}, f, indent=2, ensure_ascii=False)
+        return {
+            "node": node,
+            "messages": memory.get_messages(),
+            "summary": summary,
+            "tokens": [send_tokens, recv_tokens, total_tokens]
+        }
 
-        # save history and plot
-        abnormal = (item.severity != Severity.NORMAL)
-        self.logger.info(f"[step {self.iteration}: verify] `{item.name}`: {'abnormal' if abnormal else 'normal'}")
+    @staticmethod
+    def get_verify_prompt(item: DiagnosticItem, state: DiagnosticState) -> str:
+        causal_relationship = state.get_relationships_by_cause(item.name)[0]
+        effect_item = state.get_item_by_name(causal_relationship["effect"])
+        return Template(VERIFY_PROMPT).substitute(
+            anomaly_name=effect_item.name,
+            cause_name=item.name,
+            anomaly_analysis=effect_item.expert_analysis,
+            causal_analysis=causal_relationship["description"]
+        )
+
+    def apply_verify(self, item: DiagnosticItem, state: DiagnosticState, iteration: int, result: dict,
+                     plot: bool = True) -> bool:
+        """
+        apply phase of verify: update the item and the state from the query result, then save results, history and plot.
+        """
+        if result["summary"] is not None:
+            with open(self._get_filepath(f"step{iteration}_query_summary.md"), "w") as f:
+                f.write(result["summary"])
+        with open(self._get_filepath(f"step{iteration}_verify.json"), "w") as f:
+            json.dump(result["node"], f, indent=2, ensure_ascii=False)
+        with open(self._get_filepath(f"step{iteration}_verify_memory.json"), "w") as f:
+            json.dump({"memory": result["messages"]}, f, indent=2, ensure_ascii=False)
+
+        abnormal = self._apply_verify_node(item, state, result["node"], iteration)
         step_info = {
-            "step": self.iteration,
+            "step": iteration,
             "action": "verify",
             "node_name": item.name,
-            "content": self.memory.get_messages(),
+            "content": result["messages"],
             "diagnostic_state": state.to_dict(),
-            "tokens": [send_tokens, recv_tokens, total_tokens]
+            "tokens": result["tokens"]
         }
         self.update_history(step_info)
-        self.save_history()
         if plot:
-            self.plot(state, f"step{self.iteration}_verify", select_name=item.name)
+            self.plot(state, f"step{iteration}_verify", select_name=item.name)
 
         return abnormal
 
+    def _apply_verify_node(self, item: DiagnosticItem, state: DiagnosticState, node: dict,
+                           iteration: Optional[int] = None) -> bool:
+        update_item_name(item, state, node["name"])
+        item.symptom = node["symptom"]
+        item.severity = Severity[node["severity"].upper()]
+        item.expert_analysis = node["expert_analysis"]
+        item.expert_suggests = node["expert_suggests"]
+        item.diagnostic_criteria = create_diagnostic_criteria(
+            node["diagnostic_criteria"]["name"],
+            node["diagnostic_criteria"]["type"],
+            None,
+            node["diagnostic_criteria"]["description"]
+        )
+        abnormal = (item.severity != Severity.NORMAL)
+        self.logger.info(f"[step {iteration or self.iteration}: verify] `{item.name}`: "
+                         f"{'abnormal' if abnormal else 'normal'}")
+        return abnormal
+
     @debug_on_end
     def summarize(self):
         self.logger.info(f"[summarize diagnostic history]")
@@ -435,7 +505,7 @@ class HelperAgent(ToolAgent):
                 history.append({
                     "step": info["step"],
                     "action": info["action"],
-                    "diagnostic_state": info["diagnostic_state"],
+                    "diagnostic_state": self.get_run_history().get_record(info["record"])["diagnostic_state"],
                 })
             elif info["action"] == "select":
                 history.append({
@@ -460,7 +530,7 @@ class HelperAgent(ToolAgent):
                 })
 
         prompt = Template(SUMMARY_PROMPT).substitute(history=json.dumps(history, indent=2, ensure_ascii=False))
-        response = self.llm.generate_response(
+        response = self.get_llm("summarize").generate_response(
             messages=[{"role": "system", "content": prompt}],
             stream=True,
         )
@@ -473,25 +543,85 @@ class HelperAgent(ToolAgent):
         recv_tokens += response.recv_tokens
         return summary_content
 
+    def record_incident(self, state: DiagnosticState, root_causes: List[DiagnosticItem]) -> None:
+        """
+        add the finished diagnosis to the incident index, if any, for the retrieval of later incidents.
+        """
+        if self.incident_index is None:
+            return
+        self.incident_index.add(self.task_id, state, root_causes)
+
     def update_history(self, step_info: dict) -> None:
-        self.history.append(step_info)
+        """
+        append the step to the run history file; the history in memory keeps the step without its state,
+        which is read back by `record` index when needed.
+        """
+        index = self.get_run_history().append(step_info)
+        info = {key: value for key, value in step_info.items() if key != "diagnostic_state"}
+        info["record"] = index
+        self.history.append(info)
+
+    def get_run_history(self) -> RunHistory:
+        return get_run_history(self._get_filepath(HISTORY_FILE))
 
-    def save_history(self) -> None:
-        output_file = self._get_filepath("run_history.json")
-        with open(output_file, "w") as f:
-            f.write(json.dumps(self.history, indent=4, ensure_ascii=False))
-        self.logger.debug(f"save run history to {output_file}")
+    def plot(self, state: DiagnosticState, filename: str, select_name: Optional[Union[str, List]] = None):
+        if self.plot_format not in PLOT_FORMATS:
+            raise ValueError(f"invalid plot format: {self.plot_format}, expected one of {list(PLOT_FORMATS)}")
+        fig_path = self._get_filepath(f"plot/{filename}.{PLOT_FORMATS[self.plot_format]}")
+        if self.async_plot:
+            if self.plot_queue is None:
+                self.plot_queue = PlotQueue()
+            self.plot_queue.submit(state, fig_path, select_name)
+            self.logger.debug(f"queue figure {fig_path}")
+        else:
+            plot_causal_graph(state, fig_path, select_name)
+            self.logger.debug(f"save figure to {fig_path}")
+
+    def flush_plots(self, close: bool = False) -> None:
+        """
+        wait for the queued plots; `close` also shuts down the plot worker, the next plot starts a new one.
+        """
+        if self.plot_queue is None:
+            return
+        if close:
+            self.plot_queue.close()
+            self.plot_queue = None
+        else:
+            self.plot_queue.flush()
+
+    def _create_suspect(self, node: dict) -> DiagnosticItem:
+        suspect = create_diagnostic_item(
+            name=node["name"],
+            product_id=product_name2id(node["product"]),
+            severity_status=-1,
+            expert_analysis=node["expert_analysis"],
+            expert_suggests=node["expert_suggests"]
+        )
+        try:
+            suspect.likelihood = min(max(float(node["likelihood"]), 0.0), 1.0)
+        except KeyError:
+            pass
+        except (TypeError, ValueError):
+            self.logger.warning(f"invalid likelihood of `{suspect.name}`: {node['likelihood']}")
+        return suspect
+
+    def _get_product_description(self) -> str:
+        # descriptions of the products with a module agent
+        module_names = [agent.name.split('_')[0] for agent in self.module_agents]
+        lines = PRODUCT_DESCRIPTION.split('\n')
+        pattern = re.compile(r'- (\w+):')
+        kept_lines = []
+        for line in lines:
+            match = pattern.search(line)
+            if match and match.group(1) in module_names:
+                kept_lines.append(line)
+        return '\n'.join(kept_lines)
 
-    def load_history(self) -> None:
-        output_file = self._get_filepath("run_history.json")
-        with open(output_file) as f:
-            self.history = json.load(f)
-        self.logger.debug(f"load run history from {output_file}")
+    def get_checkpoint(self) -> Checkpoint:
+        return get_checkpoint(self._get_filepath(CHECKPOINT_FILE))
 
-    def plot(self, state: DiagnosticState, filename: str, select_name: Optional[Union[str, List]] = None):
-        fig_path = self._get_filepath(f"plot/{filename}.png")
-        plot_causal_graph(state, fig_path, select_name)
-        self.logger.debug(f"save figure to {fig_path}")
+    def is_replaying(self) -> bool:
+        return self.get_checkpoint().is_replaying()
 
     def _get_tools(self, **kwargs) -> List[Dict]:
         # Rule Analyzer is used once at the beginning and further excluded
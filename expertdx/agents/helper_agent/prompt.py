@@ -86,6 +86,7 @@ ${product_description}
             "product": (choose one name from `Product Description`),
             "expert_analysis": (Description of the anomaly item),
             "expert_suggests": (Suggested troubleshooting and repair measures for the anomaly),
+            "likelihood": (Probability between 0 and 1 that this cause leads to the anomaly, based on how many analyses support it),
         },
         ...
     ],
@@ -181,6 +182,23 @@ Output in JSON format
 
 """
 
+# minimal output schemas, used to validate JSON of routed (cheaper) models
+SELECT_SCHEMA = {"name": None, "need_verify": None}
+
+EXPAND_EXTRACT_SCHEMA = {
+    "nodes": [{"name": None, "product": None, "expert_analysis": None, "expert_suggests": None}],
+    "edges": [{"cause": None, "effect": None, "description": None}],
+}
+
+VERIFY_UPDATE_SCHEMA = {
+    "name": None,
+    "symptom": None,
+    "severity": None,
+    "diagnostic_criteria": {"name": None, "type": None, "description": None},
+    "expert_suggests": None,
+    "expert_analysis": None,
+}
+
 SUMMARY_PROMPT = """As a big data system diagnostic expert, you need to summarize the following task diagnostic process. The diagnostic process includes the following action types:
 - causal analysis: carry out causal analysis on exceptions captured by rules for subsequent root cause analysis of faults;
 - select: choose the root cause for repair, or the fault closest to the root cause for in-depth analysis;
@@ -0,0 +1,244 @@
+import os
+import json
+import bisect
+import threading
+from typing import Dict, List, Optional, Tuple
+from expertdx.utils.logging_utils import get_logger
+
+HISTORY_FILE = "run_history.jsonl"
+
+_histories: Dict[str, "RunHistory"] = {}
+_histories_lock = threading.Lock()
+
+
+def diff_state(old: dict, new: dict) -> Optional[dict]:
+    """
+    delta from the `state.to_dict()` snapshot `old` to `new`, nodes keyed by name and edges by (cause, effect);
+    None if a snapshot has duplicate keys and can only be stored in full.
+    """
+    old_nodes, new_nodes = _key_nodes(old["nodes"]), _key_nodes(new["nodes"])
+    old_edges, new_edges = _key_edges(old["edges"]), _key_edges(new["edges"])
+    if old_nodes is None or new_nodes is None or old_edges is None or new_edges is None:
+        return None
+
+    delta = {
+        "nodes": [node for name, node in new_nodes.items() if old_nodes.get(name) != node],
+        "removed_nodes": [name for name in old_nodes if name not in new_nodes],
+        "edges": [edge for key, edge in new_edges.items() if old_edges.get(key) != edge],
+        "removed_edges": [list(key) for key in old_edges if key not in new_edges],
+    }
+    # order is only stored when applying the delta would not reproduce it
+    if list(_apply_keyed(old_nodes, delta["nodes"], delta["removed_nodes"], _node_key)) != list(new_nodes):
+        delta["node_order"] = list(new_nodes)
+    if list(_apply_keyed(old_edges, delta["edges"], map(tuple, delta["removed_edges"]), _edge_key)) != list(new_edges):
+        delta["edge_order"] = [list(key) for key in new_edges]
+    return {key: value for key, value in delta.items() if value}
+
+
+def apply_state_delta(state: dict, delta: dict) -> dict:
+    nodes = _apply_keyed(_key_nodes(state["nodes"]), delta.get("nodes", []), delta.get("removed_nodes", []), _node_key)
+    edges = _apply_keyed(_key_edges(state["edges"]), delta.get("edges", []),
+                         map(tuple, delta.get("removed_edges", [])), _edge_key)
+    if "node_order" in delta:
+        nodes = {name: nodes[name] for name in delta["node_order"]}
+    if "edge_order" in delta:
+        edges = {tuple(key): edges[tuple(key)] for key in delta["edge_order"]}
+    return {"nodes": list(nodes.values()), "edges": list(edges.values())}
+
+
+class RunHistory:
+    """
+    Append-only run history of a task, one JSON record per step.
+    The diagnostic state of a step is stored as a delta against the previous step (`state_delta`),
+    with a full snapshot (`diagnostic_state`) every `snapshot_every` records, so writing a step costs
+    the size of its changes. `get_record` rebuilds the full state of any step from the closest snapshot.
+    """
+
+    def __init__(self, path: str, snapshot_every: int = 20):
+        dir_path = os.path.dirname(path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.offsets: List[int] = []        # byte offset of each record
+        self.snapshots: List[int] = []      # indexes of the records with a full snapshot
+        self.last_state: Optional[dict] = None
+        self.tokens = [0, 0, 0]             # send, recv and total tokens of all steps
+        self.lock = threading.Lock()
+        self.logger = get_logger(self.__class__.__name__)
+        self._scan()
+
+    def append(self, step_info: dict) -> int:
+        """
+        :return: index of the record of `step_info`
+        """
+        record = dict(step_info)
+        state = record.pop("diagnostic_state", None)
+        with self.lock:
+            index = len(self.offsets)
+            if state is not None:
+                # serialized now, the snapshot may share lists with the live state
+                state = json.loads(json.dumps(state, ensure_ascii=False))
+                delta = None
+                if self.last_state is not None and index - self.snapshots[-1] < self.snapshot_every:
+                    delta = diff_state(self.last_state, state)
+                if delta is None:
+                    record["diagnostic_state"] = state
+                    self.snapshots.append(index)
+                else:
+                    record["state_delta"] = delta
+                self.last_state = state
+            record["index"] = index
+            self._count_tokens(record)
+
+            with open(self.path, "a") as f:
+                self.offsets.append(f.tell())
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.logger.debug(f"append step {record.get('step')} ({record.get('action')}) to {self.path}")
+        return index
+
+    def get_record(self, index: int) -> dict:
+        """
+        :return: the step info of record `index`, with its full `diagnostic_state` if it has one
+        """
+        with self.lock:
+            if index < 0:
+                index += len(self.offsets)
+            assert 0 <= index < len(self.offsets), f"record {index} not in {self.path} ({len(self.offsets)} records)."
+            # closest snapshot at or before the record, the state is rebuilt forward from there
+            position = bisect.bisect_right(self.snapshots, index) - 1
+            start = self.snapshots[position] if position >= 0 else index
+            records = self._read(start, index + 1)
+
+        record = records[-1]
+        has_state = "diagnostic_state" in record or "state_delta" in record
+        state = None
+        for r in records:
+            if "diagnostic_state" in r:
+                state = r["diagnostic_state"]
+            elif "state_delta" in r:
+                state = apply_state_delta(state, r["state_delta"])
+        record.pop("state_delta", None)
+        if has_state:
+            record["diagnostic_state"] = state
+        return record
+
+    def read(self, with_state: bool = False) -> List[dict]:
+        """
+        all step infos in order; full states are rebuilt only `with_state`, at the cost of a copy per step.
+        """
+        with self.lock:
+            records = self._read(0, len(self.offsets))
+        state = None
+        for record in records:
+            delta = record.pop("state_delta", None)
+            if not with_state:
+                record.pop("diagnostic_state", None)
+            elif "diagnostic_state" in record:
+                state = record["diagnostic_state"]
+            elif delta is not None:
+                state = apply_state_delta(state, delta)
+                record["diagnostic_state"] = state
+        return records
+
+    def get_tokens(self) -> List[int]:
+        """
+        :return: send, recv and total tokens of the steps of all agents of the run
+        """
+        with self.lock:
+            return list(self.tokens)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def reset(self) -> None:
+        with self.lock:
+            open(self.path, "w").close()
+            self.offsets, self.snapshots, self.last_state = [], [], None
+            self.tokens = [0, 0, 0]
+
+    def _scan(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        state = None
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a record cut short by a crash
+                    break
+                if "diagnostic_state" in record:
+                    self.snapshots.append(len(self.offsets))
+                    state = record["diagnostic_state"]
+                elif "state_delta" in record:
+                    state = apply_state_delta(state, record["state_delta"])
+                self._count_tokens(record)
+                self.offsets.append(offset)
+                offset += len(line)
+        self.last_state = state
+        if offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+    def _count_tokens(self, record: dict) -> None:
+        # usage is unknown (-1) in results recorded before streamed responses were counted
+        for i, count in enumerate(record.get("tokens") or []):
+            self.tokens[i] += max(count or 0, 0)
+
+    def _read(self, start: int, stop: int) -> List[dict]:
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[start])
+            for _ in range(start, stop):
+                records.append(json.loads(f.readline()))
+        return records
+
+
+def _node_key(node: dict) -> str:
+    return node["name"]
+
+
+def _edge_key(edge: dict) -> Tuple[str, str]:
+    return edge["cause"], edge["effect"]
+
+
+def _key_nodes(nodes: List[dict]) -> Optional[Dict[str, dict]]:
+    keyed = {_node_key(node): node for node in nodes}
+    return keyed if len(keyed) == len(nodes) else None
+
+
+def _key_edges(edges: List[dict]) -> Optional[Dict[Tuple[str, str], dict]]:
+    keyed = {_edge_key(edge): edge for edge in edges}
+    return keyed if len(keyed) == len(edges) else None
+
+
+def _apply_keyed(keyed: dict, upserts, removed, key_fn) -> dict:
+    result = dict(keyed)
+    for key in removed:
+        result.pop(key, None)
+    for value in upserts:
+        result[key_fn(value)] = value
+    return result
+
+
+def open_run_history(path: str, reset: bool = False) -> RunHistory:
+    """
+    (re)open the run history at `path`, emptied if `reset`, e.g. at the start of a run.
+    """
+    history = RunHistory(path)
+    if reset:
+        history.reset()
+    with _histories_lock:
+        _histories[path] = history
+    return history
+
+
+def get_run_history(path: str) -> RunHistory:
+    """
+    run history at `path`, one instance shared by the agents of the run.
+    """
+    with _histories_lock:
+        history = _histories.get(path)
+    return history if history is not None else open_run_history(path)
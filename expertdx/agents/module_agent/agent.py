@@ -1,6 +1,6 @@
 import os
 import json
-import requests
+from typing import List, Tuple
 from pydantic import Field
 from string import Template
 from expertdx.llms import BaseLLM, AzureOpenAIChat
@@ -8,10 +8,10 @@ from expertdx.toolkit import Tool
 from expertdx.diagnostics import DiagnosticState, DiagnosticItem
 from .. import agent_registry
 from ..tool_agent import ToolAgent
+from ..checkpoint import CHECKPOINT_FILE, Checkpoint, get_checkpoint, input_key
+from ..history import HISTORY_FILE, get_run_history
 from .prompt import MITIGATE_PROMPT, ANALYZE_PROMPT
 
-DEBUG = True
-
 
 @agent_registry.register("module_agent")
 class ModuleAgent(ToolAgent):
@@ -24,10 +24,17 @@ class ModuleAgent(ToolAgent):
     offline: bool = Field(default=True)
 
     def tool_call(self, tool: Tool, data: dict) -> str:
-        self.task_id = data.get("task_id", "")
+        return self.query_tool(tool, data)[0]
+
+    def query_tool(self, tool: Tool, data: dict) -> Tuple[str, List[int]]:
+        """
+        call `tool` and analyze its observation; safe to call concurrently, the task is taken from `data` only.
+        :return: the analysis and the tokens used
+        """
+        tokens = [0, 0, 0]
         try:
             observation = tool(data=data)
-            response = self.llm.generate_response(
+            response = self.get_llm("tool_analysis").generate_response(
                 messages=[
                     {"role": "system", "content": self.role_description},
                     {"role": "user", "content": Template(ANALYZE_PROMPT).substitute(
@@ -38,42 +45,31 @@ class ModuleAgent(ToolAgent):
                 ]
             )
             analysis = response.message.content
-        except:
-            observation = input()
-            analysis = observation
+            tokens = [response.send_tokens, response.recv_tokens, response.total_tokens]
+        except Exception as e:
+            # the failure is the observation, the helper agent decides how to go on
+            self.logger.error(f"failed to call {tool.name} for task {data.get('task_id')}: {type(e).__name__}: {e}")
+            analysis = f"Tool {tool.name} failed: {type(e).__name__}: {e}"
         self.logger.info(f"Observation Analysis: {analysis}")
-        return analysis
+        return analysis, tokens
 
     def mitigate(self, task_id: str, anomaly: DiagnosticItem, state: DiagnosticState, stream=True):
         self.task_id = task_id
         self.logger.info(f"[{self.name}: mitigate {anomaly.name}]")
 
-        if DEBUG:
-            filename = self._get_filepath(f"{self.name}_mitigate.txt")
-            if os.path.exists(filename):
-                anomaly.set_fixed()
-                return True
-
-        messages = [
-            {"role": "system", "content": self.role_description},
-            {"role": "user", "content": Template(MITIGATE_PROMPT).substitute(
-                anomaly=json.dumps(anomaly.to_dict(), indent=2, ensure_ascii=False))},
-        ]
-        response = self.llm.generate_response(
-            messages=messages,
-            stream=stream
-        )
-        solution = response.message.content
-
-        total_tokens = response.total_tokens
-        send_tokens = response.send_tokens
-        recv_tokens = response.recv_tokens
+        # the anomaly is part of the key, a mitigation is never reused for another anomaly
+        checkpoint = self.get_checkpoint()
+        key = input_key(self.name, anomaly.name, json.dumps(anomaly.to_dict(), ensure_ascii=False))
+        result = checkpoint.replay("mitigate", key)
+        if result is None:
+            result = self.query_mitigate(task_id, anomaly, stream=stream)
+            checkpoint.record("mitigate", key, result)
+        solution = result["solution"]
 
         filename = self._get_filepath(f"{self.name}_mitigate.txt")
         with open(filename, "w") as f:
             f.write(solution)
 
-        is_fixed = self.check_mitigation({"task_id": task_id, "anomaly": anomaly.name, "cause": None, "suggests": solution})
         anomaly.set_fixed()
 
         step_info = {
@@ -82,10 +78,32 @@ class ModuleAgent(ToolAgent):
             "node_name": anomaly.name,
             "content": solution,
             "diagnostic_state": state.to_dict(),
-            "tokens": [send_tokens, recv_tokens, total_tokens]
+            "tokens": result["tokens"]
         }
         self.load_and_update_history(step_info)
-        return is_fixed
+        return result["is_fixed"]
+
+    def query_mitigate(self, task_id: str, anomaly: DiagnosticItem, stream=True) -> dict:
+        """
+        llm request of the mitigation and its check.
+        :return: the solution, whether it fixes the anomaly and the tokens used
+        """
+        messages = [
+            {"role": "system", "content": self.role_description},
+            {"role": "user", "content": Template(MITIGATE_PROMPT).substitute(
+                anomaly=json.dumps(anomaly.to_dict(), indent=2, ensure_ascii=False))},
+        ]
+        response = self.get_llm("mitigate").generate_response(
+            messages=messages,
+            stream=stream
+        )
+        solution = response.message.content
+        is_fixed = self.check_mitigation({"task_id": task_id, "anomaly": anomaly.name, "cause": None, "suggests": solution})
+        return {
+            "solution": solution,
+            "is_fixed": is_fixed,
+            "tokens": [response.send_tokens, response.recv_tokens, response.total_tokens]
+        }
 
     def check_mitigation(self, data: dict):
         # online: provide mitigation suggestion to re-run task for check
@@ -97,10 +115,47 @@ class ModuleAgent(ToolAgent):
                 'accept': '*/*',
                 'Content-Type': 'application/json'
             }
+            import requests
             r = requests.post(url=url, headers=headers, data=json.dumps(data))
             res = r.json()
             return res["is_fixed"]
 
+    def check_mitigation_batch(self, task_id: str, items: List[dict]) -> List[bool]:
+        """
+        check several mitigations with one request;
+        request: {"task_id": ..., "items": [{"anomaly": ..., "cause": ...}, ...]}
+        response: {"results": [{"anomaly": ..., "is_fixed": ...}, ...]}
+        :return: is_fixed, in the order of `items`
+        """
+        if not items:
+            return []
+        if self.offline:
+            return [True] * len(items)  # default
+        else:
+            # online checks re-run the task, a resumed run replays their outcome
+            self.task_id = task_id
+            checkpoint = self.get_checkpoint()
+            key = input_key(self.name, json.dumps(items, ensure_ascii=False))
+            result = checkpoint.replay("check_mitigation", key)
+            if result is not None:
+                return result["is_fixed"]
+
+            url = ""
+            headers = {
+                'accept': '*/*',
+                'Content-Type': 'application/json'
+            }
+            import requests
+            r = requests.post(url=url, headers=headers, data=json.dumps({"task_id": task_id, "items": items}))
+            res = r.json()
+            is_fixed = {result["anomaly"]: result["is_fixed"] for result in res["results"]}
+            is_fixed = [is_fixed.get(item["anomaly"], False) for item in items]
+            checkpoint.record("check_mitigation", key, {"is_fixed": is_fixed})
+            return is_fixed
+
+    def get_checkpoint(self) -> Checkpoint:
+        return get_checkpoint(self._get_filepath(CHECKPOINT_FILE))
+
     def _get_filepath(self, filename: str) -> str:
         file_path = os.path.join(self.data_dir, f"{self.task_id}/results/{filename}")
         dir_path = os.path.dirname(file_path)
@@ -109,10 +164,5 @@ class ModuleAgent(ToolAgent):
         return file_path
 
     def load_and_update_history(self, step_info: dict):
-        output_file = self._get_filepath("run_history.json")
-        with open(output_file) as f:
-            history = json.load(f)
-        history.append(step_info)
-        with open(output_file, "w") as f:
-            f.write(json.dumps(history, indent=4, ensure_ascii=False))
-        self.logger.debug(f"save run history to {output_file}")
+        # appended to the run history shared with the helper agent
+        get_run_history(self._get_filepath(HISTORY_FILE)).append(step_info)
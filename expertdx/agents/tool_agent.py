@@ -50,8 +50,7 @@ class ToolAgent(Agent):
             tool_call_id = response.message.tool_calls[0].id
             function_call = response.message.tool_calls[0].function
 
-            print(function_call.name)
-            print(function_call.arguments)
+            self.logger.debug(f"tool call: {function_call.name} {function_call.arguments}")
 
             return AgentAction(
                 tool=function_call.name,
@@ -68,6 +68,7 @@ class DiagnosticItem(BaseModel):
 
     fixed: bool = Field(default=False)
     possible_root_cause: int = Field(default=1)
+    likelihood: Optional[float] = Field(default=None)     # llm-estimated probability of a suspected cause
 
     def is_suspect(self) -> bool:
         return self.severity.is_unknown()
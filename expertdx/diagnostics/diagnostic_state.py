@@ -1,13 +1,21 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import List, Dict, Optional, Tuple
 from .diagnostic_item import DiagnosticItem
 
 
 class DiagnosticState(BaseModel):
     diagnostic_items: List[DiagnosticItem] = Field(default_factory=list)
-    causal_relationships: List[Dict] = Field(default_factory=dict)
+    causal_relationships: List[Dict] = Field(default_factory=list)
     cnt: int = Field(default=0)
 
+    # indexes by name, kept up to date by `update`, `replace` and `rename_item`: item names and relationship ends
+    # are only changed through them. Lists replaced or appended to from outside are detected and re-indexed.
+    _signature: Optional[tuple] = PrivateAttr(default=None)
+    _items_by_name: Dict[str, List[DiagnosticItem]] = PrivateAttr(default_factory=dict)
+    _rels_by_cause: Dict[str, List[Dict]] = PrivateAttr(default_factory=dict)
+    _rels_by_effect: Dict[str, List[Dict]] = PrivateAttr(default_factory=dict)
+    _rel_by_pair: Dict[Tuple[str, str], Dict] = PrivateAttr(default_factory=dict)
+
     def to_dict(self) -> dict:
         return {
             "nodes": [item.to_dict() for item in self.diagnostic_items],
@@ -20,23 +28,22 @@ class DiagnosticState(BaseModel):
         else:
             items = [item.to_dict() for item in self.diagnostic_items]
 
+        items_by_name = {}
         for item in items:
             if add_causes:
                 item["potential_causes"] = list()
             if add_effects:
                 item["potential_effects"] = list()
+            items_by_name.setdefault(item["name"], item)
 
         for rel in self.causal_relationships:
             cause_name = rel["cause"]
             effect_name = rel["effect"]
             description = rel["description"]
 
-            cause_items = [_ for _ in items if _['name'] == cause_name]
-            effect_items = [_ for _ in items if _['name'] == effect_name]
-            if len(cause_items) > 0 and len(effect_items) > 0:
-                cause_item = cause_items[0]
-                effect_item = effect_items[0]
-
+            cause_item = items_by_name.get(cause_name)
+            effect_item = items_by_name.get(effect_name)
+            if cause_item is not None and effect_item is not None:
                 if add_causes is True:
                     effect_item["potential_causes"].append({
                         "name": cause_name,
@@ -54,40 +61,49 @@ class DiagnosticState(BaseModel):
         return all([item.is_fixed() for item in self.diagnostic_items if item.is_abnormal()])
 
     def update(self, items: Optional[List[DiagnosticItem]] = None, relationships: Optional[List] = None):
+        self._ensure_index()
         if items is not None:
             for item in items:
                 self.diagnostic_items.append(item)
+                self._index_item(item)
         if relationships is not None:
             for rel in relationships:
                 self.causal_relationships.append(rel)
+                self._index_relationship(rel)
+        self._signature = self._get_signature()
 
     def replace(self, old_item: DiagnosticItem, new_items: Optional[List[DiagnosticItem]] = None):
         new = list()
         for item in self.diagnostic_items:
             if item is old_item:
-                new.extend(new_items)
+                new.extend(new_items or [])
             else:
                 new.append(item)
         self.diagnostic_items = new
-        for rel in self.causal_relationships:
-            if rel["cause"] == old_item.name or rel["effect"] == old_item.name:
-                self.causal_relationships.remove(rel)
+        self.causal_relationships = [
+            rel for rel in self.causal_relationships
+            if rel["cause"] != old_item.name and rel["effect"] != old_item.name
+        ]
+        self._rebuild_index()
 
     def get_relationships_by_cause(self, name: str) -> Optional[List]:
-        rels = []
-        for rel in self.causal_relationships:
-            if rel["cause"] == name:
-                rels.append(rel)
-        return rels
+        self._ensure_index()
+        return list(self._rels_by_cause.get(name, []))
+
+    def get_relationships_by_effect(self, name: str) -> List:
+        self._ensure_index()
+        return list(self._rels_by_effect.get(name, []))
 
     def get_relationship_by_cause_and_effect(self, cause_name: str, effect_name: str) -> Dict:
-        for rel in self.causal_relationships:
-            if rel["cause"] == cause_name and rel["effect"] == effect_name:
-                return rel
+        self._ensure_index()
+        rel = self._rel_by_pair.get((cause_name, effect_name))
+        if rel is not None:
+            return rel
         raise ValueError(f"no cause relationship found: cause_name = {cause_name}, effect_name = {effect_name}")
 
     def get_item_by_name(self, name: str) -> DiagnosticItem:
-        _items = [item for item in self.diagnostic_items if item.name == name]
+        self._ensure_index()
+        _items = self._items_by_name.get(name, [])
         assert len(_items) == 1, ValueError(f"more than 1 items with name: {name}")
         return _items[0]
 
@@ -98,21 +114,96 @@ class DiagnosticState(BaseModel):
             diagnostic_criteria_subtype_list: Optional[List[str]] = None,
             severity_status_list: Optional[List[int]] = None
     ) -> List[DiagnosticItem]:
+        # item attributes change in place (e.g. verify sets the severity), so they are matched on the items
         _items = self.diagnostic_items.copy()
         if product_id_list:
-            _items = [item for item in _items if item.product.value in product_id_list]
+            values = _get_values(product_id_list)
+            _items = [item for item in _items if item.product.value in values]
         if diagnostic_criteria_type_list:
-            _items = [item for item in _items if item.diagnostic_criteria.type in diagnostic_criteria_type_list]
+            values = _get_values(diagnostic_criteria_type_list)
+            _items = [item for item in _items if item.diagnostic_criteria is not None
+                      and getattr(item.diagnostic_criteria.type, "value", item.diagnostic_criteria.type) in values]
         if diagnostic_criteria_subtype_list:
-            _items = [item for item in _items if item.diagnostic_criteria.subtype in diagnostic_criteria_subtype_list]
+            values = _get_values(diagnostic_criteria_subtype_list)
+            _items = [item for item in _items if item.diagnostic_criteria is not None
+                      and item.diagnostic_criteria.subtype in values]
         if severity_status_list:
-            _items = [item for item in _items if item.severity.value in severity_status_list]
+            values = _get_values(severity_status_list)
+            _items = [item for item in _items if item.severity.value in values]
         return _items
 
+    def rename_item(self, item: DiagnosticItem, new_name: str) -> None:
+        """
+        rename `item` and its relationships on both ends, keeping the indexes up to date.
+        """
+        self._ensure_index()
+        old_name = item.name
+        if old_name == new_name:
+            return
+        if new_name in self._items_by_name or new_name in self._rels_by_cause or new_name in self._rels_by_effect:
+            # merged with the entries of another item, re-indexed so that lookups keep the order of the lists
+            for rel in self._rels_by_cause.get(old_name, []):
+                rel["cause"] = new_name
+            for rel in self._rels_by_effect.get(old_name, []):
+                rel["effect"] = new_name
+            item.name = new_name
+            self._rebuild_index()
+            return
+        renamed = []
+        for rel in self._rels_by_cause.pop(old_name, []):
+            renamed.append(((rel["cause"], rel["effect"]), rel))
+            rel["cause"] = new_name
+            self._rels_by_cause.setdefault(new_name, []).append(rel)
+        for rel in self._rels_by_effect.pop(old_name, []):
+            renamed.append(((rel["cause"], rel["effect"]), rel))
+            rel["effect"] = new_name
+            self._rels_by_effect.setdefault(new_name, []).append(rel)
+        for old_pair, rel in renamed:
+            if self._rel_by_pair.get(old_pair) is rel:
+                del self._rel_by_pair[old_pair]
+        for _, rel in renamed:
+            self._rel_by_pair.setdefault((rel["cause"], rel["effect"]), rel)
+
+        items = [_ for _ in self._items_by_name.pop(old_name, []) if _ is not item]
+        if items:
+            self._items_by_name[old_name] = items
+        self._items_by_name.setdefault(new_name, []).append(item)
+        item.name = new_name
+        self._signature = self._get_signature()
+
+    def _get_signature(self) -> tuple:
+        return (id(self.diagnostic_items), len(self.diagnostic_items),
+                id(self.causal_relationships), len(self.causal_relationships))
+
+    def _ensure_index(self) -> None:
+        # lists replaced or appended to from outside, e.g. by a copy or a direct assignment
+        if self._signature != self._get_signature():
+            self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        self._items_by_name = {}
+        self._rels_by_cause = {}
+        self._rels_by_effect = {}
+        self._rel_by_pair = {}
+        for item in self.diagnostic_items:
+            self._index_item(item)
+        for rel in self.causal_relationships:
+            self._index_relationship(rel)
+        self._signature = self._get_signature()
+
+    def _index_item(self, item: DiagnosticItem) -> None:
+        self._items_by_name.setdefault(item.name, []).append(item)
+
+    def _index_relationship(self, rel: Dict) -> None:
+        self._rels_by_cause.setdefault(rel["cause"], []).append(rel)
+        self._rels_by_effect.setdefault(rel["effect"], []).append(rel)
+        self._rel_by_pair.setdefault((rel["cause"], rel["effect"]), rel)
 
-def update_item_name(item: DiagnosticItem, state: DiagnosticState, new_name):
-    causal_relationships = state.get_relationships_by_cause(item.name)
-    for rel in causal_relationships:
-        rel["cause"] = new_name
-    item.name = new_name
 
+def _get_values(values: list) -> set:
+    # enum members and raw values alike
+    return {getattr(value, "value", value) for value in values}
+
+
+def update_item_name(item: DiagnosticItem, state: DiagnosticState, new_name):
+    state.rename_item(item, new_name)
@@ -1,5 +1,12 @@
 from expertdx.registry import Registry
+from expertdx.utils.lazy_utils import lazy_exports
 env_registry = Registry(name="EnvRegistry")
+env_registry.register_lazy("expertdx.environments.diagnose", "diagnosis")
+env_registry.register_lazy("expertdx.environments.best_first", "best_first_diagnosis")
 
 from .base import Environment
-from .diagnose import DiagEnvironment
+
+__getattr__ = lazy_exports(__name__, {
+    "DiagEnvironment": ".diagnose",
+    "BestFirstDiagEnvironment": ".best_first",
+})
@@ -0,0 +1,154 @@
+import heapq
+from typing import List, Tuple, Dict, Optional
+from pydantic import Field
+from expertdx.diagnostics import DiagnosticItem
+from . import env_registry
+from .diagnose import DiagEnvironment
+
+
+@env_registry.register('best_first_diagnosis')
+class BestFirstDiagEnvironment(DiagEnvironment):
+    """
+    Best-first AGRCS: rather than walking suspects depth-first in generation order, candidates are kept in a
+    priority frontier scored from llm likelihoods and graph features, and the most promising one is analyzed next.
+    The search stops once the state is fixed or the step/token budget is exhausted.
+    """
+    beam_width: int = Field(default=3)              # candidates kept in the frontier, 0 for unbounded
+    max_steps: int = Field(default=30)              # helper steps: select, expand and verify
+    max_tokens: Optional[int] = Field(default=None)
+
+    default_likelihood: float = Field(default=0.5)  # for candidates without an llm likelihood
+    effect_weight: float = Field(default=0.2)       # bonus per unfixed abnormal effect the candidate explains
+    depth_weight: float = Field(default=0.1)        # bonus per expansion level below the detected anomalies
+
+    frontier: list = Field(default_factory=list)    # heap of (-score, seq, item)
+    pruned: list = Field(default_factory=list)      # (score, item) dropped from the beam
+    depths: Dict[str, int] = Field(default_factory=dict)   # by item name, moved along when verify renames
+    confirmed: List[DiagnosticItem] = Field(default_factory=list)
+    seq: int = Field(default=0)
+
+    def run(self, task_id, plot=True) -> Tuple[list, str]:
+        self.task_id = task_id
+        try:
+            self.state = self.helper.causal_analyze(task_id, plot=plot)
+            self.frontier, self.pruned, self.depths, self.confirmed = [], [], {}, []
+
+            while not self.state.is_fixed():
+                if self.is_exhausted():
+                    self.logger.info(f"budget exhausted after {self.helper.iteration} steps, "
+                                     f"{self.get_used_tokens()} tokens.")
+                    break
+                if not self.frontier:
+                    # the llm picks where to start, as in the depth-first search
+                    self.push(self.helper.select(self.state, plot=plot))
+                item = self.pop()
+                if item is not None:
+                    self.analyze(item, plot=plot)
+
+            self.helper.record_incident(self.state, self.confirmed)
+            summary = self.helper.summarize()
+        finally:
+            # the plot worker is shut down also when a step fails
+            self.helper.flush_plots(close=True)
+        candidates = self.ranked_candidates()
+        if candidates:
+            self.logger.info("unconfirmed candidates: " +
+                             ", ".join(f"`{item.name}` ({score:.2f})" for item, score in candidates))
+        return [item for item, _ in self.ranked_root_causes()], summary
+
+    def analyze(self, item: DiagnosticItem, plot: bool = True) -> None:
+        if item.is_suspect():
+            name = item.name
+            self.helper.verify(item, state=self.state, plot=plot)
+            if item.name != name and name in self.depths:
+                self.depths[item.name] = self.depths.pop(name)
+        if not item.is_abnormal():
+            return
+
+        if item.is_possible_root_cause():
+            self.confirmed.append(item)
+            self.mitigate(item)
+        else:
+            suspects = self.helper.expand(item, state=self.state, plot=plot)
+            depth = self.get_depth(item) + 1
+            for suspect in suspects:
+                self.depths.setdefault(suspect.name, depth)
+                self.push(suspect)
+            self.prune()
+
+    def ranked_root_causes(self) -> List[Tuple[DiagnosticItem, float]]:
+        """
+        :return: (item, score) of confirmed root causes, by score
+        """
+        return sorted([(item, self.score(item)) for item in self.confirmed], key=lambda _: -_[1])
+
+    def ranked_candidates(self) -> List[Tuple[DiagnosticItem, float]]:
+        """
+        :return: (item, score) of unconfirmed candidates left in the frontier or pruned from the beam, by score
+        """
+        candidates = [(item, -neg_score) for neg_score, _, item in self.frontier if self.is_candidate(item)]
+        candidates += [(item, score) for score, item in self.pruned if self.is_candidate(item)]
+        return sorted(candidates, key=lambda _: -_[1])
+
+    def score(self, item: DiagnosticItem) -> float:
+        likelihood = item.likelihood if item.likelihood is not None else self.default_likelihood
+        abnormal_effects = sum(1 for effect in self.get_effects(item) if effect.is_abnormal() and not effect.is_fixed())
+        return likelihood * (1 + self.effect_weight * abnormal_effects) + self.depth_weight * self.get_depth(item)
+
+    def get_depth(self, item: DiagnosticItem) -> int:
+        # detected anomalies are at depth 0
+        return self.depths.get(item.name, 0)
+
+    def is_candidate(self, item: DiagnosticItem) -> bool:
+        if item.is_fixed() or item.is_normal():
+            return False
+        if item.is_suspect():
+            # a suspect is only worth verifying while it may explain an unfixed anomaly
+            return any(not effect.is_fixed() for effect in self.get_effects(item))
+        return True
+
+    def get_effects(self, item: DiagnosticItem) -> List[DiagnosticItem]:
+        effects = []
+        for rel in self.state.get_relationships_by_cause(item.name):
+            try:
+                effects.append(self.state.get_item_by_name(rel["effect"]))
+            except AssertionError:
+                continue        # no item, or several items, with the effect name
+        return effects
+
+    def push(self, item: DiagnosticItem, score: Optional[float] = None) -> None:
+        score = self.score(item) if score is None else score
+        self.seq += 1
+        heapq.heappush(self.frontier, (-score, self.seq, item))
+
+    def pop(self) -> Optional[DiagnosticItem]:
+        while self.frontier:
+            _, _, item = heapq.heappop(self.frontier)
+            if not self.is_candidate(item):
+                continue
+            # scores change with the state, re-queue the item if it no longer is the best
+            score = self.score(item)
+            if self.frontier and score < -self.frontier[0][0]:
+                self.push(item, score)
+                continue
+            return item
+        return None
+
+    def prune(self) -> None:
+        if self.beam_width <= 0 or len(self.frontier) <= self.beam_width:
+            return
+        ranked = sorted(self.frontier)
+        self.frontier = ranked[:self.beam_width]
+        heapq.heapify(self.frontier)
+        for neg_score, _, item in ranked[self.beam_width:]:
+            self.pruned.append((-neg_score, item))
+            self.logger.info(f"prune `{item.name}` (score {-neg_score:.2f}) from the beam.")
+
+    def is_exhausted(self) -> bool:
+        if self.helper.iteration >= self.max_steps:
+            return True
+        return self.max_tokens is not None and self.get_used_tokens() >= self.max_tokens
+
+    def get_used_tokens(self) -> int:
+        # total tokens of the steps of all agents so far, including the mitigations of module agents
+        return self.helper.get_run_history().get_tokens()[2]
@@ -1,10 +1,11 @@
 import json
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Any
 from pydantic import Field
 from expertdx.agents import HelperAgent, ModuleAgent
 from expertdx.diagnostics import DiagnosticState, DiagnosticItem, Product
 from expertdx.environments.base import Environment
 from . import env_registry
+from .speculation import Speculator
 
 
 @env_registry.register('diagnosis')
@@ -13,6 +14,10 @@ class DiagEnvironment(Environment):
     helper: Optional[HelperAgent] = Field(default=None)
     state: Optional[DiagnosticState] = Field(default=None)
     offline: bool = Field(default=True)
+    concurrent_verify: bool = Field(default=False)    # verify sibling suspects of an expansion in parallel
+    max_fanout: int = Field(default=4)                 # max concurrent verifications
+    speculative: bool = Field(default=False)           # run the likely next llm step ahead on a state snapshot
+    speculator: Any = Field(default=None)
 
     def __init__(self, **data):
         super().__init__(**data)
@@ -23,14 +28,32 @@ class DiagEnvironment(Environment):
 
     def run(self, task_id, plot=True) -> Tuple[list, str]:
         self.task_id = task_id
-        self.state = self.helper.causal_analyze(task_id, plot=plot)
+        try:
+            self.state = self.helper.causal_analyze(task_id, plot=plot)
 
-        root_causes = list()
-        while not self.state.is_fixed():
-            anomaly = self.helper.select(self.state, plot=plot)
-            root_causes += self.root_cause_analyze(anomaly)
+            if self.speculative:
+                self.speculator = Speculator()
 
-        root_causes, summary = self.helper.summarize()
+            root_causes = list()
+            while not self.state.is_fixed():
+                prefetched = None
+                if self.speculator is not None:
+                    prefetched = self.speculator.take(
+                        "select", self.helper.get_select_prompt(self.state), discard_others=True)
+                # a selected suspect is verified next, which starts as soon as its name is streamed
+                on_select = self.speculate_verify if self.speculator is not None else None
+                anomaly = self.helper.select(self.state, plot=plot, prefetched=prefetched, on_select=on_select)
+                root_causes += self.root_cause_analyze(anomaly)
+
+            self.helper.record_incident(self.state, root_causes)
+            summary = self.helper.summarize()
+        finally:
+            # also when a step fails: pending speculations are discarded and their threads joined,
+            # and the plot worker is shut down (a reused environment starts a new one)
+            if self.speculator is not None:
+                self.speculator.close()
+                self.speculator = None
+            self.helper.flush_plots(close=True)
         return root_causes, summary
 
     def root_cause_analyze(self, item: DiagnosticItem) -> List[DiagnosticItem]:
@@ -40,38 +63,117 @@ class DiagEnvironment(Environment):
         :return: all root-cause nodes
         """
         if item.is_suspect():
-            self.helper.verify(item, state=self.state)
+            prefetched = None
+            if self.speculator is not None:
+                prefetched = self.speculator.take("verify", self.helper.get_verify_prompt(item, self.state))
+            self.helper.verify(item, state=self.state, prefetched=prefetched)
 
         if item.is_abnormal():
             if item.is_possible_root_cause():
-                while not item.is_fixed():
-                    agent = self.get_module_agent(item.product)
-                    fixed = agent.mitigate(self.task_id, item, state=self.state)
-                    if fixed:
-                        self.back_propagate(item)
+                if self.speculator is not None:
+                    # a select follows once the mitigation is propagated
+                    self.speculate_select(item)
+                self.mitigate(item)
                 return [item, ]
             else:
                 root_causes = []
                 suspects = self.helper.expand(item, state=self.state)
+                if self.concurrent_verify:
+                    # verified suspects are no longer suspects, the recursion below continues on the abnormal ones
+                    self.helper.verify_batch([_ for _ in suspects if _.is_suspect()], state=self.state,
+                                             max_workers=self.max_fanout)
                 while not item.is_fixed():
                     suspect = suspects.pop(0)
+                    if self.speculator is not None and not self.concurrent_verify and suspects:
+                        # the next sibling is verified unless this one fixes the anomaly
+                        self.speculate_verify(suspects[0])
                     root_causes += self.root_cause_analyze(suspect)
                 return root_causes
 
-    def back_propagate(self, anomaly: DiagnosticItem):
-        cause = anomaly
-        rels = self.state.get_relationships_by_cause(cause.name)
+    def mitigate(self, item: DiagnosticItem) -> None:
+        while not item.is_fixed():
+            agent = self.get_module_agent(item.product)
+            fixed = agent.mitigate(self.task_id, item, state=self.state)
+            if fixed:
+                self.back_propagate(item)
 
-        for rel in rels:
-            effect_name = rel["effect"]
-            effect = self.state.get_item_by_name(effect_name)
-            if effect.is_fixed():
+    def speculate_select(self, item: DiagnosticItem) -> None:
+        """
+        speculate the select following the mitigation of `item`, on a snapshot where it is fixed
+        (offline, mitigations are always confirmed, so are its transitive effects).
+        """
+        if self.helper.is_replaying():
+            # the step is replayed from the checkpoint without llm calls
+            return
+        snapshot = self.state.copy(deep=True)
+        pending = [item.name]
+        while pending:
+            name = pending.pop()
+            fixed = snapshot.get_item_by_name(name)
+            if fixed.is_fixed():
                 continue
-            agent = self.get_module_agent(effect.product)
-            is_fixed = agent.check_mitigation(data={"task_id": self.task_id, "anomaly": effect.name, "cause": anomaly.name})
-            if is_fixed:
-                effect.set_fixed()
-                self.back_propagate(effect)
+            fixed.set_fixed()
+            if self.offline:
+                pending.extend(rel["effect"] for rel in snapshot.get_relationships_by_cause(name))
+        if snapshot.is_fixed():
+            return
+        self.speculator.launch(
+            "select", self.helper.get_select_prompt(snapshot),
+            lambda: self.helper.query_select(snapshot),
+            count_tokens=lambda result: result[1].total_tokens
+        )
+
+    def speculate_verify(self, suspect: DiagnosticItem) -> None:
+        """
+        speculate the verification of `suspect` on a snapshot of the current state.
+        """
+        if not suspect.is_suspect() or self.helper.is_replaying():
+            return
+        snapshot = self.state.copy(deep=True)
+        snapshot_suspect = snapshot.get_item_by_name(suspect.name)
+        self.speculator.launch(
+            "verify", self.helper.get_verify_prompt(suspect, self.state),
+            lambda: self.helper.query_verify(snapshot_suspect, snapshot, stream_update=False),
+            count_tokens=lambda result: result["tokens"][2]
+        )
+
+    def back_propagate(self, anomaly: DiagnosticItem):
+        """
+        propagate the mitigation of `anomaly` to its effects, round by round with one batched check per module agent.
+        as in a recursive walk, an unfixed effect is checked against each of its causes once that cause is fixed, so an
+        effect not fixed by one cause is checked again when another one is fixed. Fixed effects are not checked again,
+        which also ends cycles. A round checks an effect with one cause, the pairs of its other causes wait.
+        """
+        pending = self._get_unfixed_effects(anomaly)
+        while pending:
+            batches, deferred, reached = {}, [], set()
+            for effect, cause in pending:
+                if effect.is_fixed():
+                    continue
+                if effect.name in reached:
+                    deferred.append((effect, cause))
+                    continue
+                reached.add(effect.name)
+                agent = self.get_module_agent(effect.product)
+                batches.setdefault(agent.name, (agent, []))[1].append((effect, cause))
+
+            fixed = []
+            for agent, pairs in batches.values():
+                results = agent.check_mitigation_batch(
+                    self.task_id, [{"anomaly": effect.name, "cause": cause.name} for effect, cause in pairs])
+                for (effect, _), is_fixed in zip(pairs, results):
+                    if is_fixed:
+                        effect.set_fixed()
+                        fixed.append(effect)
+            pending = deferred + [pair for effect in fixed for pair in self._get_unfixed_effects(effect)]
+
+    def _get_unfixed_effects(self, cause: DiagnosticItem) -> List[Tuple[DiagnosticItem, DiagnosticItem]]:
+        effects = []
+        for rel in self.state.get_relationships_by_cause(cause.name):
+            effect = self.state.get_item_by_name(rel["effect"])
+            if not effect.is_fixed():
+                effects.append((effect, cause))
+        return effects
 
     def get_module_agent(self, product: Product) -> ModuleAgent:
         product_name = product.name.lower()
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, Optional, Tuple
+from expertdx.utils.logging_utils import get_logger
+
+
+class Speculator:
+    """
+    Runs the likely next llm step in the background while the current one runs.
+    A speculation is keyed by the prompt input it was computed from: `take` returns its result only when
+    the actual input matches, otherwise the result is discarded and its tokens are counted as wasted.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self.pending: Dict[Tuple[str, str], Tuple[Future, Callable[[Any], int]]] = {}
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+        self.wasted_tokens = 0
+        self.lock = threading.Lock()
+        self.logger = get_logger(self.__class__.__name__)
+
+    def launch(self, kind: str, key: str, fn: Callable[[], Any], count_tokens: Callable[[Any], int]) -> None:
+        """
+        :param kind: step type, e.g. select or verify
+        :param key: prompt input the speculated step is computed from
+        :param count_tokens: tokens used by a result of `fn`, for the accounting of discarded speculations
+        """
+        with self.lock:
+            if (kind, key) in self.pending:
+                return
+            self.pending[(kind, key)] = (self.executor.submit(fn), count_tokens)
+            self.launched += 1
+        self.logger.debug(f"speculate {kind}")
+
+    def take(self, kind: str, key: str, discard_others: bool = False) -> Optional[Any]:
+        """
+        :return: result of the speculation matching (kind, key), waiting for it to complete, or None
+        """
+        with self.lock:
+            entry = self.pending.pop((kind, key), None)
+            others = [k for k in self.pending if k[0] == kind] if discard_others else []
+            discarded = [self.pending.pop(k) for k in others]
+        for future, count_tokens in discarded:
+            self._discard(future, count_tokens)
+        if entry is None:
+            return None
+
+        future, _ = entry
+        try:
+            result = future.result()
+        except Exception as e:
+            self.logger.warning(f"speculative {kind} failed: {e}")
+            with self.lock:
+                self.failed += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        self.logger.info(f"speculative {kind} hit.")
+        return result
+
+    def close(self) -> dict:
+        """
+        discard all pending speculations and wait for them to finish.
+        """
+        with self.lock:
+            discarded = list(self.pending.values())
+            self.pending.clear()
+        for future, count_tokens in discarded:
+            self._discard(future, count_tokens)
+        self.executor.shutdown(wait=True)
+        stats = self.get_stats()
+        self.logger.info(f"speculation: {stats}")
+        return stats
+
+    def get_stats(self) -> dict:
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failed": self.failed,
+            "hit_rate": round(self.hits / self.launched, 3) if self.launched else 0.0,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+    def _discard(self, future: Future, count_tokens: Callable[[Any], int]) -> None:
+        with self.lock:
+            self.misses += 1
+
+        def on_done(f: Future):
+            if f.cancelled() or f.exception() is not None:
+                return
+            tokens = max(count_tokens(f.result()), 0)
+            with self.lock:
+                self.wasted_tokens += tokens
+
+        # a running speculation cannot be interrupted, its tokens are counted once it completes
+        future.cancel()
+        future.add_done_callback(on_done)
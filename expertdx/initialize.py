@@ -2,7 +2,7 @@ import yaml
 import json
 import logging
 from typing import List, Dict
-from expertdx.llms import BaseLLM, llm_registry
+from expertdx.llms import BaseLLM, llm_registry, configure_client_pool, configure_rate_limiter
 from expertdx.tools import tool_registry
 from expertdx.toolkit import Toolkit
 from expertdx.agents import Agent, agent_registry
@@ -14,6 +14,9 @@ DATA_DIR = "data"
 def load_llm(llm_config: Dict, prefix: str = "") -> BaseLLM:
     llm_type = llm_config.pop("type")
     logging.debug(f"{prefix}initialize llm: {llm_type}")
+    if isinstance(llm_config.get("llm"), dict):
+        # wrapper backends (e.g. cached_llm) receive the wrapped llm
+        llm_config["llm"] = load_llm(llm_config["llm"], prefix=prefix)
     return llm_registry.build(llm_type, **llm_config)
 
 
@@ -35,11 +38,19 @@ def load_agent(agent_config: Dict) -> Agent:
     return agent
 
 
-def load_env(task_id, config_path="config/local.yaml"):
+def load_env(task_id, config_path="config/local.yaml", rate_limit_shares: int = 1):
+    """
+    :param rate_limit_shares: number of processes sharing the `rate_limit` budgets of the config
+    """
     logging.info(f"load config from {config_path}")
     with open(config_path) as f:
         task_config = yaml.safe_load(f)
 
+    if "http_pool" in task_config:
+        configure_client_pool(**task_config["http_pool"])
+    for key, limiter_config in task_config.get("rate_limit", {}).items():
+        configure_rate_limiter(key, shares=rate_limit_shares, **limiter_config)
+
     env_config = task_config["environment"]
     offline = env_config["offline"]
     data_dir = env_config["data_dir"]
@@ -63,6 +74,10 @@ def load_env(task_id, config_path="config/local.yaml"):
         if agent_name != "helper_agent" and agent_name.split('_')[0] not in products:
             continue
         agent_config["llm"] = load_llm(agent_config.get("llm"))
+        agent_config["routes"] = {
+            step: load_llm(llm_config, prefix=f"({agent_name}: {step}) ")
+            for step, llm_config in agent_config.get("routes", {}).items()
+        }
         agent_config["toolkit"] = load_toolkit(agent_config.pop("tools", []), offline=offline, data_dir=data_dir)
         agent_config["data_dir"] = data_dir
         agent = load_agent(agent_config)
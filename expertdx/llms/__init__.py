@@ -1,5 +1,22 @@
 from expertdx.registry import Registry
+from expertdx.utils.lazy_utils import lazy_exports
 llm_registry = Registry(name="LLMRegistry")
+llm_registry.register_lazy("expertdx.llms.azure_openai", "azure_openai_chat")
+llm_registry.register_lazy("expertdx.llms.cache", "cached_llm")
+llm_registry.register_lazy("expertdx.llms.replay", "replay_llm")
 
+from .budget import ContextBudget, Tokenizer, get_tokenizer
+from .hedge import HedgePolicy
 from .base import BaseLLM, LLMResult
-from .azure_openai import AzureOpenAIChat
+from .client_pool import configure_client_pool, close_clients
+from .rate_limit import RateLimiter, configure_rate_limiter, get_rate_limiter
+from .json_stream import JSONEvent, JSONStreamParser, stream_json
+from .router import generate_json, validate_json
+from .consistency import SelfConsistency, edge_set_similarity, cause_name_similarity, extract_cause_names
+
+__getattr__ = lazy_exports(__name__, {
+    "AzureOpenAIChat": ".azure_openai",
+    "CachedLLM": ".cache",
+    "CacheStore": ".cache",
+    "ReplayLLM": ".replay",
+})
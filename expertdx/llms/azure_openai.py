@@ -1,10 +1,15 @@
 import json
-from openai import AzureOpenAI
-from typing import Optional, Union, Any
+import functools
+from typing import Optional, Union, Any, List, Callable, Tuple
 from pydantic import Field
 from expertdx.message import AssistantMessage
 from . import llm_registry
 from .base import BaseChatModel, LLMResult
+from .budget import Tokenizer, get_tokenizer
+from .client_pool import get_client, get_async_client
+from .rate_limit import get_rate_limiter, RETRYABLE_ERRORS
+from .hedge import HedgePolicy
+from expertdx.utils.async_utils import run_sync
 
 
 @llm_registry.register("azure_openai_chat")
@@ -18,15 +23,17 @@ class AzureOpenAIChat(BaseChatModel):
     endpoint: str = Field(default=...)
     apikey: str = Field(default=...)        # APIKEY here
 
+    rate_limit_key: str = Field(default="default")     # models sharing a quota share a limiter
+    hedge: Optional[HedgePolicy] = Field(default=None)  # opt-in hedged requests against tail latency
+
     client: Any = None
+    async_client: Any = None
 
     def __init__(self, **data):
         super().__init__(**data)
-        self.client = AzureOpenAI(
-            azure_endpoint=self.endpoint,
-            api_version=self.version,
-            api_key=self.apikey
-        )
+        # clients are shared by all models with the same endpoint, version and key
+        self.client = get_client(self.endpoint, self.version, self.apikey)
+        self.async_client = get_async_client(self.endpoint, self.version, self.apikey)
 
     def generate_response(
             self,
@@ -39,94 +46,274 @@ class AzureOpenAIChat(BaseChatModel):
             top_p: Optional[float] = None,
             response_format: Optional[dict] = None,
             stream: bool = False,
+            n: int = 1,
+            callback: Optional[Callable[[str], None]] = None,
     ) -> LLMResult:
+        """
+        :param callback: called with each streamed content delta of the first choice
+        """
+
+        if self.hedge is not None:
+            # hedging races two requests, which is done on the event loop
+            return run_sync(self.agenerate_response(
+                messages, tools=tools, tool_choice=tool_choice, model=model, max_tokens=max_tokens,
+                temperature=temperature, top_p=top_p, response_format=response_format, stream=stream, n=n,
+                callback=callback
+            ))
+
+        params = self._get_params(tools, tool_choice, model, max_tokens, temperature, top_p, response_format, stream, n)
+        messages = self.fit_context(messages, params.get("tools"), params["max_tokens"], n)
+        limiter = get_rate_limiter(self.rate_limit_key)
+        estimated_tokens = self._estimate_tokens(messages, params)
+
+        if not stream:
+            response = limiter.call(
+                lambda: self.client.chat.completions.create(messages=messages, stream=False, **params),
+                estimated_tokens
+            )
+            result = self._to_result(messages, response)
+
+        else:
+            # the limiter slot is held until the stream is fully consumed
+            result = limiter.call(lambda: self._stream(messages, params, n, callback), estimated_tokens)
+        limiter.settle(estimated_tokens, result.total_tokens)
+        return result
+
+    def _stream(self, messages, params: dict, n: int, callback: Optional[Callable[[str], None]]) -> LLMResult:
+        response = self.client.chat.completions.create(messages=messages, stream=True, **params)
+        choices = [AssistantMessage(content="") for _ in range(n)]
+        finish_reasons = [None] * n
+        emitted = False
+
+        try:
+            for chunk in response:
+                delta_content = self._merge_chunk(choices, finish_reasons, chunk)
+                if delta_content is not None:
+                    print(delta_content, end="")      # print the delay and text
+                    if callback is not None:
+                        callback(delta_content)
+                    emitted = True
+        except RETRYABLE_ERRORS as e:
+            _raise_interrupted(e, emitted)
+        print()
+
+        return self._to_stream_result(messages, choices, finish_reasons)
+
+    async def agenerate_response(
+            self,
+            messages,
+            tools: Optional[list] = None,
+            tool_choice: Union[str, dict] = "none",
+            model: Optional[str] = None,
+            max_tokens: Optional[int] = None,
+            temperature: Optional[float] = None,
+            top_p: Optional[float] = None,
+            response_format: Optional[dict] = None,
+            stream: bool = False,
+            n: int = 1,
+            callback: Optional[Callable[[str], None]] = None,
+    ) -> LLMResult:
+        """
+        :param callback: called with each streamed content delta of the first choice
+        """
+
+        params = self._get_params(tools, tool_choice, model, max_tokens, temperature, top_p, response_format, stream, n)
+        messages = self.fit_context(messages, params.get("tools"), params["max_tokens"], n)
+        if self.hedge is not None:
+            if stream and callback is not None:
+                owner = []
+                return await self.hedge.run(
+                    lambda: self._arequest(messages, params, stream, n, _claim_callback(callback, owner))
+                )
+            return await self.hedge.run(lambda: self._arequest(messages, params, stream, n))
+        return await self._arequest(messages, params, stream, n, callback)
+
+    async def _arequest(self, messages, params: dict, stream: bool, n: int,
+                        callback: Optional[Callable[[str], None]] = None) -> LLMResult:
+        limiter = get_rate_limiter(self.rate_limit_key)
+        estimated_tokens = self._estimate_tokens(messages, params)
+
+        if not stream:
+            response = await limiter.acall(
+                lambda: self.async_client.chat.completions.create(messages=messages, stream=False, **params),
+                estimated_tokens
+            )
+            result = self._to_result(messages, response)
+
+        else:
+            # the limiter slot is held until the stream is fully consumed
+            result = await limiter.acall(lambda: self._astream(messages, params, n, callback), estimated_tokens)
+        limiter.settle(estimated_tokens, result.total_tokens)
+        return result
+
+    async def _astream(self, messages, params: dict, n: int,
+                       callback: Optional[Callable[[str], None]]) -> LLMResult:
+        # concurrent streams would interleave on stdout, so chunks are not printed here
+        response = await self.async_client.chat.completions.create(messages=messages, stream=True, **params)
+        choices = [AssistantMessage(content="") for _ in range(n)]
+        finish_reasons = [None] * n
+        emitted = False
+
+        try:
+            async for chunk in response:
+                delta_content = self._merge_chunk(choices, finish_reasons, chunk)
+                if delta_content is not None and callback is not None:
+                    callback(delta_content)
+                    emitted = True
+        except RETRYABLE_ERRORS as e:
+            _raise_interrupted(e, emitted)
+
+        return self._to_stream_result(messages, choices, finish_reasons)
 
+    def _get_params(self, tools, tool_choice, model, max_tokens, temperature, top_p, response_format, stream,
+                    n) -> dict:
         params = {
             "model": model or self.model,
             "max_tokens": max_tokens or self.max_tokens,
-            "temperature": temperature or self.temperature,
-            "top_p": top_p or self.top_p,
+            "temperature": temperature if temperature is not None else self.temperature,
+            "top_p": top_p if top_p is not None else self.top_p,
             "response_format": response_format or {"type": "text"}
         }
+        if n > 1:
+            # sample several choices from one prompt, the prompt tokens are only billed once
+            params["n"] = n
 
         if tool_choice != "none":
             assert stream is False, "tool call "
             params["tools"] = tools
             params["tool_choice"] = tool_choice
+        return params
 
-        response = self.client.chat.completions.create(
-            messages=messages,
-            stream=stream,
-            **params
+    @staticmethod
+    def _estimate_tokens(messages, params: dict) -> int:
+        # rough upper bound charged against the tokens/min budget until the real usage is known
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in messages if isinstance(m, dict))
+        return prompt_chars // 4 + params["max_tokens"] * params.get("n", 1)
+
+    def _to_result(self, messages, response) -> LLMResult:
+        choices = sorted(response.choices, key=lambda choice: choice.index)
+        self.logger.debug(
+            f"Input Messages ({response.usage.prompt_tokens} tokens):\n"
+            f"{json.dumps({'messages': [m.get('content') for m in messages]}, indent=2, ensure_ascii=False)}"
+        )
+        self.logger.debug(
+            f"Output Message ({response.usage.completion_tokens} tokens):\n"
+            f"{json.dumps([choice.message.content for choice in choices], indent=2, ensure_ascii=False)}"
+        )
+        self.logger.info(
+            f"total_tokens: {response.usage.total_tokens}, "
+            f"send_tokens: {response.usage.prompt_tokens}, "
+            f"recv_tokens: {response.usage.completion_tokens}."
+        )
+        return LLMResult(
+            message=choices[0].message,                # content, role, function_call, tool_calls
+            finish_reason=choices[0].finish_reason,
+            send_tokens=response.usage.prompt_tokens,
+            recv_tokens=response.usage.completion_tokens,
+            total_tokens=response.usage.total_tokens,
+            messages=[choice.message for choice in choices],
+            finish_reasons=[choice.finish_reason for choice in choices],
         )
 
-        if not stream:
-            self.logger.debug(
-                f"Input Messages ({response.usage.prompt_tokens} tokens):\n"
-                f"{json.dumps({'messages': [m.get('content') for m in messages]}, indent=2, ensure_ascii=False)}"
-            )
-            self.logger.debug(
-                f"Output Message ({response.usage.completion_tokens} tokens):\n"
-                f"{json.dumps(response.choices[0].message.content, indent=2, ensure_ascii=False)}"
-            )
-            self.logger.info(
-                f"total_tokens: {response.usage.total_tokens}, "
-                f"send_tokens: {response.usage.prompt_tokens}, "
-                f"recv_tokens: {response.usage.completion_tokens}."
-            )
-            return LLMResult(
-                message=response.choices[0].message,                # content, role, function_call, tool_calls
-                finish_reason=response.choices[0].finish_reason,
-                send_tokens=response.usage.prompt_tokens,
-                recv_tokens=response.usage.completion_tokens,
-                total_tokens=response.usage.total_tokens,
-            )
+    def _to_stream_result(self, messages, choices: List[AssistantMessage], finish_reasons: List) -> LLMResult:
+        self.logger.debug(
+            f"Input Messages:\n"
+            f"{json.dumps({'messages': [m.get('content') for m in messages]}, indent=2, ensure_ascii=False)}"
+        )
+        self.logger.debug(
+            f"Output Message:\n"
+            f"{json.dumps([message.content for message in choices], indent=2, ensure_ascii=False)}"
+        )
 
-        else:
-            message = AssistantMessage(content="")
-            finish_reason = None
+        send_tokens, recv_tokens = self._count_usage(messages, choices)
+        self.logger.info(
+            f"total_tokens: {send_tokens + recv_tokens} (counted locally), "
+            f"send_tokens: {send_tokens}, "
+            f"recv_tokens: {recv_tokens}."
+        )
+        return LLMResult(
+            message=choices[0],
+            finish_reason=finish_reasons[0],
+            send_tokens=send_tokens,
+            recv_tokens=recv_tokens,
+            total_tokens=send_tokens + recv_tokens,
+            messages=choices,
+            finish_reasons=finish_reasons,
+        )
 
-            for chunk in response:
-                if not chunk.choices:
-                    continue
-
-                delta = chunk.choices[0].delta
-                if delta.content is not None:
-                    message.content += delta.content
-                    print(delta.content, end="")      # print the delay and text
-
-                if chunk.choices[0].finish_reason:
-                    finish_reason = chunk.choices[0].finish_reason
-
-                if delta.tool_calls:
-                    tool_call = delta.tool_calls[0]
-                    index = tool_call.index
-                    if index == len(message.tool_calls):
-                        # add tool_call dict
-                        tool_call = {
-                            "id": tool_call.get("id", None),
-                            "type": "function",
-                            "function": {
-                                "name": tool_call.function.name,
-                                "arguments": tool_call.function.arguments
-                            }
+    def _count_usage(self, messages, choices: List[AssistantMessage]) -> Tuple[int, int]:
+        """
+        streamed responses report no usage, the prompt and generated text are counted with the local tokenizer.
+        :return: send tokens, recv tokens
+        """
+        tokenizer = self.context_budget.tokenizer_impl if self.context_budget is not None else _get_tokenizer()
+        send_tokens = sum(
+            tokenizer.count(str(m.get("content") or "")) + 4 for m in messages if isinstance(m, dict)
+        )
+        recv_tokens = 0
+        for message in choices:
+            recv_tokens += tokenizer.count(message.content or "")
+            for tool_call in message.tool_calls:
+                recv_tokens += tokenizer.count(json.dumps(tool_call, ensure_ascii=False, default=str))
+        return send_tokens, recv_tokens
+
+    @staticmethod
+    def _merge_chunk(choices: List[AssistantMessage], finish_reasons: List, chunk) -> Optional[str]:
+        """
+        merge one streamed chunk into the per-choice messages and finish reasons;
+        :return: delta content of the first choice
+        """
+        delta_content = None
+        for choice in chunk.choices:
+            message = choices[choice.index]
+            delta = choice.delta
+            if delta.content is not None:
+                message.content += delta.content
+                if choice.index == 0:
+                    delta_content = delta.content
+
+            if choice.finish_reason:
+                finish_reasons[choice.index] = choice.finish_reason
+
+            if delta.tool_calls:
+                tool_call = delta.tool_calls[0]
+                index = tool_call.index
+                if index == len(message.tool_calls):
+                    # add tool_call dict
+                    tool_call = {
+                        "id": tool_call.id,
+                        "type": "function",
+                        "function": {
+                            "name": tool_call.function.name,
+                            "arguments": tool_call.function.arguments
                         }
-                        message.tool_calls.append(tool_call)
-            print()
+                    }
+                    message.tool_calls.append(tool_call)
 
-            self.logger.debug(
-                f"Input Messages:\n"
-                f"{json.dumps({'messages': [m.get('content') for m in messages]}, indent=2, ensure_ascii=False)}"
-            )
-            self.logger.debug(
-                f"Output Message:\n"
-                f"{json.dumps(message.content, indent=2, ensure_ascii=False)}"
-            )
+        return delta_content
 
-            return LLMResult(
-                message=message,
-                finish_reason=finish_reason,
-                send_tokens=-1,
-                recv_tokens=-1,
-                total_tokens=-1
-            )
+
+@functools.lru_cache(maxsize=None)
+def _get_tokenizer() -> Tokenizer:
+    return get_tokenizer("auto")
+
+
+def _claim_callback(callback: Callable[[str], None], owner: list) -> Callable[[str], None]:
+    """
+    the copies of a hedged request share `callback`: the first copy to stream a delta claims it,
+    the other one fails on its first delta, so the returned result is always the streamed one.
+    """
+    def forward(delta_content: str) -> None:
+        if not owner:
+            owner.append(forward)
+        if owner[0] is not forward:
+            raise RuntimeError("another copy of the hedged request is already streaming.")
+        callback(delta_content)
+    return forward
+
+
+def _raise_interrupted(error: Exception, emitted: bool) -> None:
+    # deltas already passed to the callback cannot be taken back, so a broken stream is only retried before them
+    if emitted:
+        raise RuntimeError(f"stream interrupted after its first tokens: {type(error).__name__}: {error}") from error
+    raise error
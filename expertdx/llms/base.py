@@ -1,8 +1,11 @@
+import asyncio
 from abc import abstractmethod, ABC
-from typing import Union, Optional, Any
+from typing import Union, Optional, Any, List
 from pydantic import BaseModel, Field
-from expertdx.message import Message
+from openai.types.chat import ChatCompletionMessage
+from expertdx.message import Message, AssistantMessage
 from expertdx.utils.logging_utils import get_logger
+from .budget import ContextBudget
 
 
 class LLMResult(BaseModel):
@@ -11,10 +14,36 @@ class LLMResult(BaseModel):
     send_tokens: Optional[int]
     recv_tokens: Optional[int]
     total_tokens: Optional[int]
+    # all sampled choices (n >= 1); `message` and `finish_reason` refer to the first one
+    messages: List[Message] = Field(default_factory=list)
+    finish_reasons: List[Optional[str]] = Field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "messages": [message_to_dict(message) for message in (self.messages or [self.message])],
+            "finish_reasons": self.finish_reasons or [self.finish_reason],
+            "send_tokens": self.send_tokens,
+            "recv_tokens": self.recv_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "LLMResult":
+        messages = [message_from_dict(message) for message in data["messages"]]
+        return LLMResult(
+            message=messages[0],
+            finish_reason=data["finish_reasons"][0],
+            send_tokens=data["send_tokens"],
+            recv_tokens=data["recv_tokens"],
+            total_tokens=data["total_tokens"],
+            messages=messages,
+            finish_reasons=data["finish_reasons"],
+        )
 
 
 class BaseLLM(BaseModel):
     model: str = Field(default="gpt4-turbo")
+    context_budget: Optional[ContextBudget] = Field(default=None)
     logger: Any = Field(default_factory=None)
 
     def __init__(self, **data):
@@ -25,6 +54,15 @@ class BaseLLM(BaseModel):
     def generate_response(self, **kwargs) -> LLMResult:
         pass
 
+    async def agenerate_response(self, **kwargs) -> LLMResult:
+        # backends without a native async client run the blocking call in a worker thread
+        return await asyncio.to_thread(self.generate_response, **kwargs)
+
+    def fit_context(self, messages: List, tools: Optional[list] = None, max_tokens: int = 0, n: int = 1) -> List:
+        if self.context_budget is None:
+            return messages
+        return self.context_budget.fit(messages, tools=tools, max_tokens=max_tokens, n=n)
+
 
 class BaseChatModel(BaseLLM, ABC):
     pass
@@ -32,3 +70,19 @@ class BaseChatModel(BaseLLM, ABC):
 
 class BaseCompletionModel(BaseLLM, ABC):
     pass
+
+
+def message_to_dict(message: Message) -> dict:
+    tool_calls = getattr(message, "tool_calls", None) or []
+    return {
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [tool_call if isinstance(tool_call, dict) else tool_call.dict() for tool_call in tool_calls]
+    }
+
+
+def message_from_dict(data: dict) -> Message:
+    # tool calls are restored as openai objects, callers access them by attribute
+    if data.get("tool_calls"):
+        return ChatCompletionMessage(role="assistant", content=data["content"], tool_calls=data["tool_calls"])
+    return AssistantMessage(content=data["content"] or "")
@@ -0,0 +1,198 @@
+import json
+import math
+import importlib.util
+from typing import Optional, List, Dict, Any, Tuple
+from pydantic import BaseModel, Field
+from expertdx.utils.logging_utils import get_logger
+
+ELISION_MARKER = "\n...[{} tokens elided to fit the context window]...\n"
+
+
+class Tokenizer:
+    """Approximate tokenizer (~4 characters per token), the fallback when no real tokenizer is installed."""
+
+    chars_per_token: float = 4.0
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def elide(self, text: str, max_tokens: int) -> str:
+        """
+        keep the head and tail of `text` within `max_tokens`, replacing the middle with a marker.
+        """
+        total = self.count(text)
+        if total <= max_tokens:
+            return text
+        keep = max(max_tokens - self.count(ELISION_MARKER.format(total)), 0)
+        head, tail = self._split(text, keep - keep // 2, keep // 2)
+        return head + ELISION_MARKER.format(total - keep) + tail
+
+    def _split(self, text: str, head_tokens: int, tail_tokens: int) -> Tuple[str, str]:
+        head_chars = int(head_tokens * self.chars_per_token)
+        tail_chars = int(tail_tokens * self.chars_per_token)
+        return text[:head_chars], text[len(text) - tail_chars:]
+
+
+class TiktokenTokenizer(Tokenizer):
+    def __init__(self, encoding: str = "cl100k_base"):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _split(self, text: str, head_tokens: int, tail_tokens: int) -> Tuple[str, str]:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return self.encoding.decode(tokens[:head_tokens]), self.encoding.decode(tokens[len(tokens) - tail_tokens:])
+
+
+def get_tokenizer(name: str = "auto") -> Tokenizer:
+    """
+    :param name: `approx`, `tiktoken[:<encoding>]`, or `auto` (tiktoken if installed)
+    """
+    if name == "auto":
+        name = "tiktoken" if importlib.util.find_spec("tiktoken") is not None else "approx"
+    if name == "approx":
+        return Tokenizer()
+    if name.startswith("tiktoken"):
+        _, _, encoding = name.partition(":")
+        return TiktokenTokenizer(encoding or "cl100k_base")
+    raise ValueError(f"invalid tokenizer: {name}, choose from [auto, approx, tiktoken[:<encoding>]].")
+
+
+class ContextBudget(BaseModel):
+    """
+    Pre-flight check of prompts against the model context window.
+    The budget left after reserving the completion (`max_tokens` per choice) and tool schemas is shared between
+    message roles by `role_shares`; roles needing less than their share pass the surplus on to the others.
+    Within a role, the newest messages are kept first and older ones are elided in the middle.
+    """
+
+    context_window: int = Field(default=128000)
+    tokenizer: str = Field(default="auto")
+    role_shares: Dict[str, float] = Field(
+        default_factory=lambda: {"system": 0.25, "user": 0.5, "assistant": 0.15, "function": 0.1}
+    )
+    message_overhead: int = Field(default=4)        # role and separator tokens per message
+    min_message_tokens: int = Field(default=32)     # below this a message is elided completely
+
+    calls: int = Field(default=0)
+    truncated_calls: int = Field(default=0)
+    elided_tokens: int = Field(default=0)
+    max_prompt_tokens: int = Field(default=0)
+    last_metrics: dict = Field(default_factory=dict)
+    tokenizer_impl: Any = None
+    logger: Any = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.tokenizer_impl = get_tokenizer(self.tokenizer)
+        self.logger = get_logger(self.__class__.__name__)
+
+    def count(self, text: str) -> int:
+        return self.tokenizer_impl.count(text)
+
+    def fit(self, messages: List, tools: Optional[list] = None, max_tokens: int = 0, n: int = 1) -> List:
+        """
+        :return: `messages`, with the lowest-priority content elided if the prompt exceeds the budget
+        """
+        budget = self.context_window - max_tokens * n
+        if tools:
+            budget -= self.count(json.dumps(tools, ensure_ascii=False))
+
+        counts = [self._count_message(message) for message in messages]
+        prompt_tokens = sum(counts)
+        metrics = {"prompt_tokens": prompt_tokens, "budget": budget, "elided_tokens": 0, "elided_messages": 0}
+
+        if prompt_tokens > budget:
+            messages, metrics = self._truncate(messages, counts, budget, metrics)
+            self.truncated_calls += 1
+            self.elided_tokens += metrics["elided_tokens"]
+            self.logger.warning(
+                f"prompt of {prompt_tokens} tokens exceeds budget {budget}: "
+                f"elided {metrics['elided_tokens']} tokens in {metrics['elided_messages']} messages."
+            )
+        else:
+            self.logger.debug(f"prompt tokens: {prompt_tokens}/{budget}")
+
+        self.calls += 1
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        self.last_metrics = metrics
+        return messages
+
+    def get_stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "truncated_calls": self.truncated_calls,
+            "elided_tokens": self.elided_tokens,
+            "max_prompt_tokens": self.max_prompt_tokens,
+        }
+
+    def _count_message(self, message) -> int:
+        if isinstance(message, dict):
+            content = message.get("content") or ""
+            if message.get("tool_calls"):
+                content += json.dumps(message["tool_calls"], ensure_ascii=False, default=str)
+        else:
+            content = str(message)
+        return self.count(content) + self.message_overhead
+
+    def _allocate(self, demands: Dict[str, int], budget: int) -> Dict[str, int]:
+        # water-filling: roles under their share are fully served, the rest split what is left by share
+        allocation = {}
+        remaining_roles = list(demands)
+        remaining_budget = max(budget, 0)
+        while remaining_roles:
+            shares = {role: self.role_shares.get(role, 0.1) for role in remaining_roles}
+            total_share = sum(shares.values())
+            satisfied = [role for role in remaining_roles
+                         if demands[role] <= remaining_budget * shares[role] / total_share]
+            if not satisfied:
+                for role in remaining_roles:
+                    allocation[role] = int(remaining_budget * shares[role] / total_share)
+                break
+            for role in satisfied:
+                allocation[role] = demands[role]
+                remaining_budget -= demands[role]
+                remaining_roles.remove(role)
+        return allocation
+
+    def _truncate(self, messages: List, counts: List[int], budget: int, metrics: dict) -> Tuple[List, dict]:
+        roles = [message.get("role", "user") if isinstance(message, dict) else "assistant" for message in messages]
+        demands = {}
+        for role, count in zip(roles, counts):
+            demands[role] = demands.get(role, 0) + count
+        allocation = self._allocate(demands, budget)
+
+        # messages without text content (e.g. tool calls) are kept as is, the others cost at least an elision marker
+        elidable = [isinstance(message, dict) and bool(message.get("content")) for message in messages]
+        floor = self.message_overhead + self.count(ELISION_MARKER.format(10 ** 9).strip())
+        reserved = {role: 0 for role in allocation}
+        for role, count, can_elide in zip(roles, counts, elidable):
+            if can_elide:
+                reserved[role] += floor
+            else:
+                allocation[role] -= count
+
+        fitted = list(messages)
+        for i in reversed(range(len(messages))):
+            if not elidable[i]:
+                continue
+            message, role = messages[i], roles[i]
+            reserved[role] -= floor
+            # what is left once the older messages of the role get at least their marker
+            available = allocation[role] - reserved[role]
+            if counts[i] <= available:
+                allocation[role] -= counts[i]
+                continue
+
+            keep = max(available - self.message_overhead, 0)
+            if keep < self.min_message_tokens:
+                keep = 0
+            content = self.tokenizer_impl.elide(message["content"], keep) if keep else \
+                ELISION_MARKER.format(counts[i] - self.message_overhead).strip()
+            fitted[i] = {**message, "content": content}
+            allocation[role] -= self._count_message(fitted[i])
+            metrics["elided_tokens"] += counts[i] - self._count_message(fitted[i])
+            metrics["elided_messages"] += 1
+        return fitted, metrics
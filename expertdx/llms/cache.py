@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Any
+from pydantic import Field
+from . import llm_registry
+from .base import BaseLLM, LLMResult
+
+
+def request_key(messages, **params) -> str:
+    """
+    content address of an LLM request: sha256 over the messages and all params that change the answer.
+    """
+    payload = json.dumps(
+        {"messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=lambda obj: obj.dict() if hasattr(obj, "dict") else str(obj)
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheStore:
+    """SQLite-backed key-value store with TTL expiry and size-based LRU eviction."""
+
+    def __init__(self, path: str, max_size_mb: float = 512, ttl: Optional[float] = None):
+        dir_path = os.path.dirname(path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def put(self, key: str, value: dict) -> None:
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now)
+            )
+            if self.ttl is not None:
+                self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._evict()
+
+    def _evict(self) -> None:
+        total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        # least recently accessed entries go first
+        evicted = []
+        for key, size in self.conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+            if total_size <= self.max_size:
+                break
+            evicted.append((key,))
+            total_size -= size
+        self.conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+@llm_registry.register("cached_llm")
+class CachedLLM(BaseLLM):
+    """Wraps any BaseLLM with a persistent, content-addressed response cache."""
+
+    llm: BaseLLM
+    cache_path: str = Field(default="results/cache/llm_cache.sqlite")
+    max_size_mb: float = Field(default=512)
+    ttl: Optional[float] = Field(default=7 * 24 * 3600)     # seconds, None for no expiry
+    cache_sampled: bool = Field(default=False)              # also cache requests with temperature > 0
+
+    hits: int = Field(default=0)
+    misses: int = Field(default=0)
+    bypasses: int = Field(default=0)
+    store: Any = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.model = self.llm.model
+        self.store = CacheStore(self.cache_path, max_size_mb=self.max_size_mb, ttl=self.ttl)
+
+    def generate_response(self, messages, use_cache: Optional[bool] = None, **kwargs) -> LLMResult:
+        if not self._use_cache(use_cache, kwargs):
+            self.bypasses += 1
+            return self.llm.generate_response(messages=messages, **kwargs)
+
+        key = self._get_key(messages, kwargs)
+        result = self._lookup(key)
+        if result is None:
+            result = self.llm.generate_response(messages=messages, **kwargs)
+            self.store.put(key, result.to_dict())
+        return result
+
+    async def agenerate_response(self, messages, use_cache: Optional[bool] = None, **kwargs) -> LLMResult:
+        if not self._use_cache(use_cache, kwargs):
+            self.bypasses += 1
+            return await self.llm.agenerate_response(messages=messages, **kwargs)
+
+        key = self._get_key(messages, kwargs)
+        result = self._lookup(key)
+        if result is None:
+            result = await self.llm.agenerate_response(messages=messages, **kwargs)
+            self.store.put(key, result.to_dict())
+        return result
+
+    def get_stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "bypasses": self.bypasses}
+
+    def _lookup(self, key: str) -> Optional[LLMResult]:
+        cached = self.store.get(key)
+        if cached is None:
+            self.misses += 1
+            self.logger.debug(f"cache miss {key[:12]} (hits: {self.hits}, misses: {self.misses})")
+            return None
+        self.hits += 1
+        self.logger.info(f"cache hit {key[:12]} (hits: {self.hits}, misses: {self.misses})")
+        return LLMResult.from_dict(cached)
+
+    def _use_cache(self, use_cache: Optional[bool], kwargs: dict) -> bool:
+        # sampled answers are only reused when the caller explicitly opts in
+        if use_cache is not None:
+            return use_cache
+        temperature = kwargs.get("temperature")
+        if temperature is None:
+            temperature = getattr(self.llm, "temperature", 0)
+        return temperature == 0 or self.cache_sampled
+
+    def _get_key(self, messages, kwargs: dict) -> str:
+        params = {
+            name: kwargs.get(name) if kwargs.get(name) is not None else getattr(self.llm, name, None)
+            for name in ["model", "max_tokens", "temperature", "top_p"]
+        }
+        params.update({name: kwargs.get(name) for name in ["tools", "tool_choice", "response_format", "n"]})
+        return request_key(messages, **params)
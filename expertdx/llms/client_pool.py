@@ -0,0 +1,112 @@
+import os
+import atexit
+import threading
+import importlib.util
+from typing import Dict, Tuple
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from pydantic import BaseModel, Field
+from expertdx.utils.async_utils import run_sync
+from expertdx.utils.logging_utils import get_logger
+
+logger = get_logger("ClientPool")
+
+
+class ClientPoolConfig(BaseModel):
+    max_connections: int = Field(default=100)
+    max_keepalive_connections: int = Field(default=20)
+    keepalive_expiry: float = Field(default=30.0)          # seconds an idle connection is kept open
+    timeout: float = Field(default=600.0)
+    connect_timeout: float = Field(default=5.0)
+    http2: bool = Field(default=True)                       # only when the `h2` package is installed
+
+
+_config = ClientPoolConfig()
+_clients: Dict[Tuple[str, str, str], AzureOpenAI] = {}
+_async_clients: Dict[Tuple[str, str, str], AsyncAzureOpenAI] = {}
+_lock = threading.Lock()
+
+
+def configure_client_pool(**kwargs) -> None:
+    """
+    Set pool options for clients created from now on.
+    """
+    global _config
+    _config = ClientPoolConfig(**kwargs)
+
+
+def get_client(endpoint: str, api_version: str, api_key: str) -> AzureOpenAI:
+    """
+    Return the process-wide client for (endpoint, api_version, api_key), creating it on first use.
+    """
+    key = (endpoint, api_version, api_key)
+    with _lock:
+        if key not in _clients:
+            logger.debug(f"create pooled client for {endpoint} ({api_version})")
+            _clients[key] = AzureOpenAI(
+                azure_endpoint=endpoint,
+                api_version=api_version,
+                api_key=api_key,
+                max_retries=0,          # retries are handled by the shared rate limiter
+                http_client=httpx.Client(**_get_http_options())
+            )
+        return _clients[key]
+
+
+def get_async_client(endpoint: str, api_version: str, api_key: str) -> AsyncAzureOpenAI:
+    key = (endpoint, api_version, api_key)
+    with _lock:
+        if key not in _async_clients:
+            logger.debug(f"create pooled async client for {endpoint} ({api_version})")
+            _async_clients[key] = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_version=api_version,
+                api_key=api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(**_get_http_options())
+            )
+        return _async_clients[key]
+
+
+def close_clients() -> None:
+    """
+    Close all pooled clients and their connections.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        async_clients = list(_async_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+
+    for client in clients:
+        client.close()
+    for client in async_clients:
+        try:
+            run_sync(client.close())
+        except RuntimeError as e:
+            logger.warning(f"failed to close async client: {e}")
+
+
+def _get_http_options() -> dict:
+    http2 = _config.http2 and importlib.util.find_spec("h2") is not None
+    return {
+        "limits": httpx.Limits(
+            max_connections=_config.max_connections,
+            max_keepalive_connections=_config.max_keepalive_connections,
+            keepalive_expiry=_config.keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(_config.timeout, connect=_config.connect_timeout),
+        "http2": http2,
+    }
+
+
+def _reset_after_fork():
+    # sockets are shared with the parent after fork(), let the child open its own connections
+    global _lock
+    _clients.clear()
+    _async_clients.clear()
+    _lock = threading.Lock()
+
+
+atexit.register(close_clients)
+os.register_at_fork(after_in_child=_reset_after_fork)
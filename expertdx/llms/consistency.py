@@ -0,0 +1,124 @@
+import re
+import itertools
+from typing import Any, Callable, List, Optional, Set, Tuple
+from pydantic import BaseModel, Field
+from expertdx.utils.logging_utils import get_logger
+from .base import BaseLLM, LLMResult
+
+CAUSE_LINE_PATTERN = re.compile(r"^\s*\d+[.)、]\s*(.+)$", re.MULTILINE)
+NAME_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]")
+
+
+def edge_set_similarity(a: Set[Tuple[str, str]], b: Set[Tuple[str, str]]) -> float:
+    """Jaccard of two sets of (cause, effect) edges."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def extract_cause_names(content: str) -> List[str]:
+    """
+    names of the causes of a numbered `1. name: description` list, normalized into lowercase word tokens
+    (single characters for chinese) joined by spaces.
+    """
+    names = []
+    for line in CAUSE_LINE_PATTERN.findall(content or ""):
+        name = re.split(r"[:：]", line.replace("*", ""), maxsplit=1)[0]
+        tokens = NAME_TOKEN_PATTERN.findall(name.lower())
+        if tokens:
+            names.append(" ".join(tokens))
+    return names
+
+
+def cause_name_similarity(a: List[str], b: List[str], name_threshold: float = 0.5) -> float:
+    """
+    overlap of two lists of normalized cause names: the fraction of names of either list that have a counterpart
+    in the other, two names being counterparts when the Jaccard of their tokens reaches `name_threshold`.
+    """
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    a_tokens, b_tokens = [set(_.split()) for _ in a], [set(_.split()) for _ in b]
+
+    def matched(xs, ys) -> int:
+        return sum(any(len(x & y) / len(x | y) >= name_threshold for y in ys) for x in xs)
+
+    return (matched(a_tokens, b_tokens) + matched(b_tokens, a_tokens)) / (len(a) + len(b))
+
+
+class SelfConsistency(BaseModel):
+    """
+    Adaptive self-consistency: `min_k` samples are drawn first, then `step` more at a time while their agreement
+    (mean pairwise similarity) stays below `threshold`, up to `max_k`. Consistent steps stop early, uncertain ones
+    get more samples. The sample agreeing most with the others, the majority answer, is returned first.
+    """
+
+    min_k: int = Field(default=2)
+    max_k: int = Field(default=5)
+    step: int = Field(default=1)
+    threshold: float = Field(default=0.8)
+    logger: Any = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        assert 1 <= self.min_k <= self.max_k, f"invalid sample range [{self.min_k}, {self.max_k}]."
+        self.logger = get_logger(self.__class__.__name__)
+
+    def sample(self, llm: BaseLLM, similarity: Callable[[Any, Any], float],
+               parse: Callable[[str], Any] = lambda _: _, name: str = "", **kwargs) -> Tuple[List[str], List[Any], LLMResult]:
+        """
+        :param similarity: agreement of two parsed samples, in [0, 1]
+        :param parse: from the content of a sample to what `similarity` compares
+        :param name: step name for the log
+        :return: contents and parsed samples, the majority sample first (see `vote`),
+            and the LLMResult with all sampled choices and their summed tokens
+        """
+        contents, parsed, responses = [], [], []
+        agreement = 0.0
+        n = self.min_k
+        while True:
+            response = llm.generate_response(n=n, **kwargs)
+            responses.append(response)
+            for message in response.messages or [response.message]:
+                contents.append(message.content)
+                parsed.append(parse(message.content))
+
+            agreement = self.agreement(parsed, similarity)
+            if agreement >= self.threshold or len(contents) >= self.max_k:
+                break
+            n = min(self.step, self.max_k - len(contents))
+
+        winner = self.vote(parsed, similarity)
+        self.logger.info(f"{name or 'sample'}: {len(contents)} samples in {len(responses)} requests, "
+                         f"agreement {agreement:.2f}, majority sample #{winner + 1}.")
+        order = [winner] + [i for i in range(len(contents)) if i != winner]
+        return [contents[i] for i in order], [parsed[i] for i in order], self._merge(responses)
+
+    @staticmethod
+    def vote(samples: List[Any], similarity: Callable[[Any, Any], float]) -> int:
+        """
+        :return: index of the sample with the highest total similarity to the others, the earliest on ties
+        """
+        scores = [sum(similarity(a, b) for j, b in enumerate(samples) if j != i) for i, a in enumerate(samples)]
+        return max(range(len(samples)), key=lambda i: (scores[i], -i)) if samples else 0
+
+    @staticmethod
+    def agreement(samples: List[Any], similarity: Callable[[Any, Any], float]) -> float:
+        if len(samples) < 2:
+            return 0.0
+        pairs = list(itertools.combinations(samples, 2))
+        return sum(similarity(a, b) for a, b in pairs) / len(pairs)
+
+    @staticmethod
+    def _merge(responses: List[LLMResult]) -> LLMResult:
+        if len(responses) == 1:
+            return responses[0]
+        merged = responses[0].copy()
+        merged.messages = [m for r in responses for m in (r.messages or [r.message])]
+        merged.finish_reasons = [f for r in responses for f in (r.finish_reasons or [r.finish_reason])]
+        for key in ("send_tokens", "recv_tokens", "total_tokens"):
+            counts = [getattr(r, key) for r in responses]
+            # usage is unknown (-1) in results recorded before streamed responses were counted
+            setattr(merged, key, sum(counts) if all(_ is not None and _ >= 0 for _ in counts) else -1)
+        return merged
@@ -0,0 +1,83 @@
+import math
+import time
+import asyncio
+from collections import deque
+from typing import Optional, Callable, Awaitable, Any
+from pydantic import BaseModel, Field
+from expertdx.utils.logging_utils import get_logger
+
+
+class HedgePolicy(BaseModel):
+    """
+    Hedged requests: if a request is still running after the `percentile` of recently observed latencies,
+    send a duplicate, keep whichever finishes first and cancel the other.
+    """
+
+    percentile: float = Field(default=95)
+    min_samples: int = Field(default=20)            # observed latencies before hedging starts
+    window: int = Field(default=200)                # number of recent latencies kept
+    min_delay: float = Field(default=1.0)           # never hedge earlier than this (seconds)
+    max_extra_ratio: float = Field(default=0.1)     # cap on hedged requests / all requests
+
+    requests: int = Field(default=0)
+    hedged: int = Field(default=0)
+    hedge_wins: int = Field(default=0)
+    latencies: Any = None
+    logger: Any = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.latencies = deque(maxlen=self.window)
+        self.logger = get_logger(self.__class__.__name__)
+
+    async def run(self, coro_fn: Callable[[], Awaitable]) -> Any:
+        self.requests += 1
+        start = time.monotonic()
+        primary = asyncio.ensure_future(coro_fn())
+
+        delay = self.get_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done and self.hedged < self.max_extra_ratio * self.requests:
+                return await self._hedge(coro_fn, primary, start, delay)
+
+        result = await primary
+        self.latencies.append(time.monotonic() - start)
+        return result
+
+    def get_delay(self) -> Optional[float]:
+        if len(self.latencies) < self.min_samples:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, max(0, math.ceil(self.percentile / 100 * len(latencies)) - 1))
+        return max(self.min_delay, latencies[index])
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+        }
+
+    async def _hedge(self, coro_fn: Callable[[], Awaitable], primary: asyncio.Future, start: float, delay: float):
+        self.hedged += 1
+        self.logger.debug(f"request still running after {delay:.2f}s, send a hedged duplicate.")
+        backup = asyncio.ensure_future(coro_fn())
+        pending = {primary, backup}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None and pending:
+                    continue        # the first one failed, wait for the other
+                if winner is None:
+                    return done.pop().result()
+
+                if winner is backup:
+                    self.hedge_wins += 1
+                self.latencies.append(time.monotonic() - start)
+                return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,127 @@
+import json
+from typing import Any, Callable, List, NamedTuple, Optional
+from .base import BaseLLM, LLMResult
+
+
+class JSONEvent(NamedTuple):
+    key: str                    # top-level field of the JSON object
+    index: Optional[int]        # position of an element of a top-level array, None when the field completed
+    value: Any
+
+
+class JSONStreamParser:
+    """
+    Incremental parser of a streamed JSON object.
+    `feed` returns the events completed by the new text: each element of a top-level array once it closes,
+    and each top-level field once its value closes. Text before the opening brace (e.g. a code fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string: Optional[str] = None
+        self.key: Optional[str] = None
+        self.value_start: Optional[int] = None
+        self.element_start: Optional[int] = None
+        self.index = 0
+        self.done = False
+
+    def feed(self, text: str) -> List[JSONEvent]:
+        self.buffer += text
+        events = []
+        while self.pos < len(self.buffer) and not self.done:
+            self._step(self.buffer[self.pos], self.pos, events)
+            self.pos += 1
+        return events
+
+    def get_result(self) -> Any:
+        start = self.buffer.find("{")
+        return json.loads(self.buffer[start:self.pos] if self.done else self.buffer[start:])
+
+    def _step(self, c: str, i: int, events: List[JSONEvent]) -> None:
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif c == "\\":
+                self.escape = True
+            elif c == '"':
+                self.in_string = False
+                if len(self.stack) == 1 and self.value_start is None:
+                    self.last_string = self.buffer[self.string_start:i + 1]
+            return
+
+        if not self.stack:
+            if c == "{":
+                self.stack.append(c)
+            return
+
+        if c == '"':
+            self.in_string = True
+            self.string_start = i
+        elif c in "{[":
+            self.stack.append(c)
+            if len(self.stack) == 2 and c == "[":
+                self.element_start = i + 1
+                self.index = 0
+        elif c in "}]":
+            if len(self.stack) == 2 and c == "]":
+                self._emit_element(i, events)
+            self.stack.pop()
+            if not self.stack:
+                self._emit_field(i, events)
+                self.done = True
+        elif c == ":" and len(self.stack) == 1:
+            self.key = json.loads(self.last_string)
+            self.value_start = i + 1
+        elif c == ",":
+            if len(self.stack) == 1:
+                self._emit_field(i, events)
+            elif len(self.stack) == 2 and self.stack[-1] == "[":
+                self._emit_element(i, events)
+                self.element_start = i + 1
+
+    def _emit_field(self, end: int, events: List[JSONEvent]) -> None:
+        if self.value_start is None:
+            return
+        text = self.buffer[self.value_start:end].strip()
+        if text:
+            events.append(JSONEvent(self.key, None, json.loads(text)))
+        self.value_start = None
+
+    def _emit_element(self, end: int, events: List[JSONEvent]) -> None:
+        text = self.buffer[self.element_start:end].strip()
+        if text:
+            events.append(JSONEvent(self.key, self.index, json.loads(text)))
+            self.index += 1
+
+
+def stream_json(llm: BaseLLM, on_event: Callable[[JSONEvent], None], **kwargs) -> LLMResult:
+    """
+    Streamed JSON request, calling `on_event` for every completed field or array element while generating.
+    """
+    parser = JSONStreamParser()
+    broken = []
+
+    def callback(delta: str) -> None:
+        if broken:
+            return
+        try:
+            events = parser.feed(delta)
+        except ValueError as e:
+            # malformed output is left to the validation of the complete response
+            llm.logger.warning(f"stop parsing streamed json: {e}")
+            broken.append(e)
+            return
+        for event in events:
+            on_event(event)
+
+    kwargs["stream"] = True
+    response = llm.generate_response(callback=callback, **kwargs)
+    if not parser.buffer:
+        # responses not streamed through the callback (e.g. cache hits) arrive at once
+        callback(response.message.content or "")
+    return response
@@ -0,0 +1,240 @@
+import time
+import random
+import asyncio
+import threading
+from typing import Optional, Callable, Awaitable, Any, Dict
+import openai
+from expertdx.utils.logging_utils import get_logger
+
+logger = get_logger("RateLimiter")
+
+# throttling and transient server-side failures, everything else is raised immediately
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+MAX_CONCURRENCY = 16
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`, holding at most one minute of budget."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for LLM requests:
+    - requests/min and tokens/min budgets enforced with token buckets;
+    - AIMD concurrency: additive increase on success, halved when the endpoint throttles (429);
+    - retries with jittered exponential backoff, honouring `Retry-After`.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: Optional[float] = None,
+            tokens_per_minute: Optional[float] = None,
+            max_concurrency: int = MAX_CONCURRENCY,
+            min_concurrency: int = 1,
+            max_retries: int = 6,
+            base_delay: float = 1.0,
+            max_delay: float = 60.0,
+            poll_interval: float = 0.05,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            try:
+                result = fn()
+            except RETRYABLE_ERRORS as e:
+                delay = self._on_error(e, attempt)
+                attempt += 1
+                time.sleep(delay)
+            except BaseException:
+                self._release(success=False)
+                raise
+            else:
+                self._release(success=True)
+                return result
+
+    async def acall(self, coro_fn: Callable[[], Awaitable], estimated_tokens: int = 0) -> Any:
+        attempt = 0
+        while True:
+            await self.aacquire(estimated_tokens)
+            try:
+                result = await coro_fn()
+            except RETRYABLE_ERRORS as e:
+                delay = self._on_error(e, attempt)
+                attempt += 1
+                await asyncio.sleep(delay)
+            except BaseException:
+                # includes cancellation, e.g. the losing copy of a hedged request
+                self._release(success=False)
+                raise
+            else:
+                self._release(success=True)
+                return result
+
+    def acquire(self, estimated_tokens: int = 0) -> None:
+        while True:
+            wait = self._try_acquire(estimated_tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, estimated_tokens: int = 0) -> None:
+        while True:
+            wait = self._try_acquire(estimated_tokens)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, used_tokens: int) -> None:
+        """
+        correct the tokens/min budget once the actual usage of a request is known.
+        """
+        if self.token_bucket is not None and used_tokens is not None and used_tokens >= 0:
+            with self.lock:
+                self.token_bucket.refund(estimated_tokens - used_tokens)
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "concurrency": round(self.concurrency, 2),
+        }
+
+    def _try_acquire(self, estimated_tokens: int) -> float:
+        """
+        take a slot if all budgets allow it, otherwise return how long to wait before trying again.
+        """
+        with self.lock:
+            if self.in_flight >= int(self.concurrency):
+                return self.poll_interval
+            wait = 0.0
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.wait_time(1))
+            if self.token_bucket is not None:
+                wait = max(wait, self.token_bucket.wait_time(estimated_tokens))
+            if wait > 0:
+                return wait
+
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(estimated_tokens)
+            self.in_flight += 1
+            self.requests += 1
+            return 0
+
+    def _release(self, success: bool, throttled: bool = False) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            if success:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+            elif throttled:
+                self.throttled += 1
+                # concurrent requests fail together, decrease at most once per second
+                now = time.monotonic()
+                if now - self.last_decrease > 1.0:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self.last_decrease = now
+
+    def _on_error(self, error: Exception, attempt: int) -> float:
+        throttled = isinstance(error, openai.RateLimitError)
+        self._release(success=False, throttled=throttled)
+        if attempt >= self.max_retries:
+            raise error
+        self.retries += 1
+
+        retry_after = _get_retry_after(error)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 0.1 * retry_after + 0.1)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        logger.warning(f"{type(error).__name__}, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s "
+                       f"(concurrency: {self.concurrency:.2f})")
+        return delay
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_lock = threading.Lock()
+
+
+def configure_rate_limiter(key: str = "default", shares: int = 1, **kwargs) -> RateLimiter:
+    """
+    (Re)create the limiter shared by all models using `key`.
+    :param shares: number of processes running against the same budgets, each limiter gets an equal share of
+        the requests/min, tokens/min and concurrency
+    """
+    assert shares >= 1, "shares must be at least 1."
+    if shares > 1:
+        for name in ("requests_per_minute", "tokens_per_minute"):
+            if kwargs.get(name):
+                kwargs[name] = kwargs[name] / shares
+        kwargs["max_concurrency"] = max(1, kwargs.get("max_concurrency", MAX_CONCURRENCY) // shares)
+        kwargs["min_concurrency"] = min(kwargs.get("min_concurrency", 1), kwargs["max_concurrency"])
+    with _lock:
+        _limiters[key] = RateLimiter(**kwargs)
+        return _limiters[key]
+
+
+def get_rate_limiter(key: str = "default") -> RateLimiter:
+    with _lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter()
+        return _limiters[key]
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Optional, Any, Dict, List
+from pydantic import Field
+from . import llm_registry
+from .base import BaseLLM, LLMResult
+from .cache import request_key
+
+KEY_PARAMS = ["model", "tools", "tool_choice", "max_tokens", "temperature", "top_p", "response_format", "n"]
+
+
+@llm_registry.register("replay_llm")
+class ReplayLLM(BaseLLM):
+    """
+    Record/replay backend for deterministic, zero-network runs.
+    - record: forward requests to `llm` and append request-hash -> response to the cassette;
+    - replay: serve responses from the cassette, with simulated latency.
+    """
+
+    mode: str = Field(default="replay")         # record or replay
+    cassette_path: str = Field(default=...)
+    llm: Optional[BaseLLM] = Field(default=None)
+    # {"type": "none"}, {"type": "fixed", "value": s}, {"type": "uniform", "low": s, "high": s},
+    # {"type": "lognormal", "mu": m, "sigma": s} or {"type": "recorded", "scale": x}
+    latency: dict = Field(default_factory=lambda: {"type": "none"})
+    seed: Optional[int] = Field(default=None)
+
+    cassette: Dict[str, List[dict]] = Field(default_factory=dict)
+    replayed: Dict[str, int] = Field(default_factory=dict)
+    rng: Any = None
+    lock: Any = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.mode not in ["record", "replay"]:
+            raise ValueError(f"invalid replay_llm mode: {self.mode}, choose from [record, replay].")
+        if self.mode == "record":
+            assert self.llm is not None, "record mode requires the `llm` to record."
+            self.model = self.llm.model
+        self.rng = random.Random(self.seed)
+        self.lock = threading.Lock()
+        self.load_cassette()
+
+    def generate_response(self, messages, **kwargs) -> LLMResult:
+        key = self._get_key(messages, kwargs)
+        if self.mode == "record":
+            start = time.time()
+            result = self.llm.generate_response(messages=messages, **kwargs)
+            self._record(key, result, time.time() - start)
+            return result
+
+        entry = self._replay(key)
+        time.sleep(self._get_latency(entry))
+        return LLMResult.from_dict(entry["response"])
+
+    async def agenerate_response(self, messages, **kwargs) -> LLMResult:
+        key = self._get_key(messages, kwargs)
+        if self.mode == "record":
+            start = time.time()
+            result = await self.llm.agenerate_response(messages=messages, **kwargs)
+            self._record(key, result, time.time() - start)
+            return result
+
+        entry = self._replay(key)
+        await asyncio.sleep(self._get_latency(entry))
+        return LLMResult.from_dict(entry["response"])
+
+    def load_cassette(self) -> None:
+        self.cassette = {}
+        if not os.path.exists(self.cassette_path):
+            if self.mode == "replay":
+                raise FileNotFoundError(f"cassette not found: {self.cassette_path}.")
+            return
+        with open(self.cassette_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.cassette.setdefault(entry["key"], []).append(entry)
+        self.logger.info(f"load {sum(len(_) for _ in self.cassette.values())} responses from {self.cassette_path}")
+
+    def _record(self, key: str, result: LLMResult, latency: float) -> None:
+        entry = {"key": key, "response": result.to_dict(), "latency": latency}
+        with self.lock:
+            self.cassette.setdefault(key, []).append(entry)
+            dir_path = os.path.dirname(self.cassette_path)
+            if dir_path and not os.path.exists(dir_path):
+                os.makedirs(dir_path, exist_ok=True)
+            with open(self.cassette_path, "a") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _replay(self, key: str) -> dict:
+        # repeated identical requests are served the recorded responses in order, cycling when exhausted
+        with self.lock:
+            if key not in self.cassette:
+                raise ValueError(f"request {key[:12]} not recorded in cassette {self.cassette_path}.")
+            entries = self.cassette[key]
+            index = self.replayed.get(key, 0)
+            self.replayed[key] = index + 1
+        return entries[index % len(entries)]
+
+    def _get_latency(self, entry: dict) -> float:
+        latency_type = self.latency.get("type", "none")
+        with self.lock:
+            if latency_type == "none":
+                return 0.0
+            elif latency_type == "fixed":
+                return self.latency["value"]
+            elif latency_type == "uniform":
+                return self.rng.uniform(self.latency["low"], self.latency["high"])
+            elif latency_type == "lognormal":
+                return self.rng.lognormvariate(self.latency["mu"], self.latency["sigma"])
+            elif latency_type == "recorded":
+                return entry.get("latency", 0.0) * self.latency.get("scale", 1.0)
+            else:
+                raise ValueError(f"invalid latency type: {latency_type}.")
+
+    @staticmethod
+    def _get_key(messages, kwargs: dict) -> str:
+        # only explicit arguments are hashed, so record and replay configs need not share model defaults
+        return request_key(messages, **{name: kwargs.get(name) for name in KEY_PARAMS})
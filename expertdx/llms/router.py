@@ -0,0 +1,70 @@
+import json
+from typing import Optional, Tuple, Any, Callable
+from .base import BaseLLM, LLMResult
+from .json_stream import JSONEvent, stream_json
+
+
+def validate_json(content: str, schema: Any) -> Any:
+    """
+    Parse `content` and check it against a minimal schema, raising ValueError on mismatch:
+    - None: any value;
+    - dict: an object with (at least) these keys, each checked against its sub-schema;
+    - [item_schema]: a list whose elements match `item_schema`.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"invalid json: {e}")
+    _check(data, schema, path="$")
+    return data
+
+
+def _check(value: Any, schema: Any, path: str) -> None:
+    if schema is None:
+        return
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise ValueError(f"{path}: expected an object, got {type(value).__name__}")
+        for key, sub_schema in schema.items():
+            if key not in value:
+                raise ValueError(f"{path}: missing key `{key}`")
+            _check(value[key], sub_schema, f"{path}.{key}")
+    elif isinstance(schema, list):
+        if not isinstance(value, list):
+            raise ValueError(f"{path}: expected a list, got {type(value).__name__}")
+        for i, element in enumerate(value):
+            _check(element, schema[0], f"{path}[{i}]")
+    else:
+        raise ValueError(f"invalid schema at {path}: {schema}")
+
+
+def generate_json(llm: BaseLLM, schema: Any, fallback_llm: Optional[BaseLLM] = None,
+                  on_event: Optional[Callable[[JSONEvent], None]] = None, **kwargs) -> Tuple[Any, LLMResult]:
+    """
+    Request a JSON response from `llm`; if it does not match `schema`, ask `fallback_llm` (the strong model) instead.
+    :param on_event: stream the response and receive its fields and array elements as they complete;
+        events of a rejected attempt are followed by those of the fallback, the returned content is authoritative
+    :return: parsed content and the LLMResult, with tokens of a rejected attempt added
+    """
+    kwargs.setdefault("response_format", {"type": "json_object"})
+
+    def request(model: BaseLLM) -> LLMResult:
+        if on_event is not None:
+            return stream_json(model, on_event, **kwargs)
+        return model.generate_response(**kwargs)
+
+    response = request(llm)
+    try:
+        return validate_json(response.message.content, schema), response
+    except ValueError as e:
+        if fallback_llm is None or fallback_llm is llm:
+            raise
+        llm.logger.warning(f"invalid output of {llm.model} ({e}), fall back to {fallback_llm.model}.")
+
+    rejected = response
+    response = request(fallback_llm)
+    if rejected.total_tokens > 0 and response.total_tokens > 0:
+        response.send_tokens += rejected.send_tokens
+        response.recv_tokens += rejected.recv_tokens
+        response.total_tokens += rejected.total_tokens
+    return validate_json(response.message.content, schema), response
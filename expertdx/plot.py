@@ -1,7 +1,18 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-from matplotlib.patches import FancyArrowPatch
+import os
+import json
+import math
+import shutil
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 from expertdx.diagnostics import DiagnosticState
+from expertdx.utils.logging_utils import get_logger
+
+# matplotlib and networkx are imported on the first render, runs without plots never load them
+if TYPE_CHECKING:
+    import networkx as nx
+    from matplotlib.figure import Figure
 
 
 color_map = {
@@ -13,81 +24,262 @@ color_map = {
     'fixed': 'green'
 }
 
+# file extension of each plot format
+PLOT_FORMATS = {"png": "png", "svg": "svg", "dot": "dot", "mermaid": "mmd"}
 
-def plot_causal_graph(causal_graph: DiagnosticState, file_path, select_name=None):
-    nodes = causal_graph.diagnostic_items
-    edges = causal_graph.causal_relationships
+_renderer = None
 
-    fig, ax = plt.subplots(figsize=(6, 2))
-    G = nx.DiGraph()
 
-    for node in nodes:
-        G.add_node(node.name, **node.to_dict(add_fixed=True))
+def plot_causal_graph(causal_graph: DiagnosticState, file_path, select_name=None) -> str:
+    return draw_causal_graph(**get_snapshot(causal_graph), file_path=file_path, select_name=select_name)
 
-    for edge in edges:
-        cause_name = edge["cause"]
-        effect_name = edge["effect"]
-        if cause_name not in G.nodes:
-            print(f"invalid cause_name: {cause_name}")
-        if effect_name not in G.nodes:
-            print(f"invalid effect_name: {effect_name}")
-        G.add_edge(cause_name, effect_name, **edge)
 
-    pos = nx.circular_layout(G)
-    colors = []
-    for node, data in G.nodes(data=True):
-        if data['fixed'] is True:
-            colors.append(color_map['fixed'])
+def get_snapshot(causal_graph: DiagnosticState) -> dict:
+    """
+    plain copy of what is drawn of the state, independent of later changes to it.
+    """
+    return {
+        "nodes": [item.to_dict(add_fixed=True) for item in causal_graph.diagnostic_items],
+        "edges": [dict(edge) for edge in causal_graph.causal_relationships],
+    }
+
+
+def draw_causal_graph(nodes: List[dict], edges: List[dict], file_path, select_name=None) -> str:
+    """
+    draw with the renderer of this process, in the format of the extension of `file_path`.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = CausalGraphRenderer()
+    return _renderer.render(nodes, edges, file_path, select_name)
+
+
+class CausalGraphRenderer:
+    """
+    Draws causal graphs as PNG/SVG (matplotlib), Graphviz DOT or Mermaid, by the extension of the output file.
+    One figure is reused for all renders, and node positions are cached per output directory (i.e. per task):
+    nodes keep their place across steps and only new nodes are laid out, around the fixed ones.
+    """
+
+    def __init__(self, figsize: Tuple[float, float] = (6, 2), dpi: int = 300, max_layouts: int = 8):
+        self.figsize = figsize
+        self.dpi = dpi
+        self.max_layouts = max_layouts
+        self.fig: Optional["Figure"] = None
+        self.layouts: "OrderedDict[str, Dict[str, Tuple[float, float]]]" = OrderedDict()
+        self.logger = get_logger(self.__class__.__name__)
+
+    def render(self, nodes: List[dict], edges: List[dict], file_path: str, select_name=None) -> str:
+        G = self._build_graph(nodes, edges)
+        select_names = self._get_select_names(select_name)
+        title = os.path.basename(file_path).split('.')[0].replace('_', ": ").upper()
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == ".dot":
+            content = to_dot(G, select_names, title)
+        elif ext in (".mmd", ".mermaid"):
+            content = to_mermaid(G, select_names, title)
         else:
-            colors.append(color_map[data['severity']])
-    labels = {node: f"{data['name']}\n({data['product']})" for node, data in G.nodes(data=True)}
+            self._draw(G, select_names, title, file_path)
+            return file_path
+        with open(file_path, "w") as f:
+            f.write(content)
+        return file_path
 
-    special_nodes = list()
-    special_indexes = list()
+    def close(self) -> None:
+        self.fig = None
+        self.layouts.clear()
 
-    if select_name is not None:
-        if isinstance(select_name, str):
-            select_names = [select_name, ]
-        elif isinstance(select_name, list):
-            select_names = select_name
+    def get_positions(self, scope: str, G: "nx.DiGraph") -> Dict[str, Tuple[float, float]]:
+        import networkx as nx
+
+        cached = self.layouts.pop(scope, {})
+        known = {node: cached[node] for node in G.nodes if node in cached}
+        new = [node for node in G.nodes if node not in cached]
+        if not known:
+            pos = {node: tuple(xy) for node, xy in nx.circular_layout(G).items()}
+        elif new:
+            # new nodes start next to their placed neighbours, then settle around the fixed ones
+            init = dict(known)
+            for i, node in enumerate(new):
+                neighbours = [known[n] for n in nx.all_neighbors(G, node) if n in known]
+                cx, cy = [sum(_) / len(neighbours) for _ in zip(*neighbours)] if neighbours else (0.0, 0.0)
+                angle = 2 * math.pi * i / len(new)
+                init[node] = (cx + 0.3 * math.cos(angle), cy + 0.3 * math.sin(angle))
+            pos = nx.spring_layout(G, pos=init, fixed=list(known), seed=0, iterations=30)
+            pos = {node: tuple(xy) for node, xy in pos.items()}
         else:
-            raise ValueError
-        for select_name in select_names:
-            special_index = next((i for i, x in enumerate(G.nodes(data=True)) if x[1]['name'] == select_name), -1)
-            special_node = list(G.nodes())[special_index]
+            pos = known
+        # positions of removed nodes are dropped, so a layout is bounded by its graph
+        self.layouts[scope] = pos
+        while len(self.layouts) > self.max_layouts:
+            self.layouts.popitem(last=False)
+        return pos
 
-            special_nodes.append(special_node)
-            special_indexes.append(special_index)
+    def _draw(self, G: "nx.DiGraph", select_names: List[str], title: str, file_path: str) -> None:
+        import networkx as nx
+        from matplotlib.figure import Figure
+        from matplotlib.patches import FancyArrowPatch
 
+        if self.fig is None:
+            # not registered with pyplot, so never kept alive by it
+            self.fig = Figure(figsize=self.figsize)
+        fig = self.fig
+        fig.clear()
+        ax = fig.add_subplot(1, 1, 1)
+
+        pos = self.get_positions(os.path.dirname(os.path.abspath(file_path)), G)
+        colors = [get_color(data) for _, data in G.nodes(data=True)]
+        labels = {node: f"{data['name']}\n({data['product']})" for node, data in G.nodes(data=True)}
+        special = [node in select_names for node in G.nodes]
+
+        for u, v in G.edges():
+            ax.add_patch(FancyArrowPatch(pos[u], pos[v], arrowstyle='->',
+                                         mutation_scale=5,
+                                         shrinkA=16,
+                                         shrinkB=15,
+                                         connectionstyle="arc3,rad=0.05",
+                                         ))
+
+        for selected, alpha in ((False, 0.3), (True, .75)):
+            nodelist = [node for node, s in zip(G.nodes, special) if s is selected]
+            if nodelist:
+                nx.draw_networkx_nodes(G, pos, ax=ax, nodelist=nodelist, alpha=alpha, node_size=1000,
+                                       node_color=[c for c, s in zip(colors, special) if s is selected])
+        nx.draw_networkx_labels(G, pos, ax=ax, labels=labels, font_size=7, font_family="SimHei")
+
+        if pos:
+            xs, ys = zip(*pos.values())
+            x_min, x_max, y_min, y_max = min(xs), max(xs), min(ys), max(ys)
+            x_pad, y_pad = 0.1 * (x_max - x_min) + 0.25, 0.1 * (y_max - y_min) + 0.25
+            ax.set_xlim(x_min - x_pad, x_max + x_pad)
+            ax.set_ylim(y_min - y_pad, y_max + y_pad)
+
+        ax.set_title(title, fontsize=10, y=1.05)
+        fig.subplots_adjust(top=0.9)
+        fig.savefig(file_path, dpi=self.dpi, bbox_inches='tight')
+
+    def _build_graph(self, nodes: List[dict], edges: List[dict]) -> "nx.DiGraph":
+        import networkx as nx
+
+        G = nx.DiGraph()
+        for node in nodes:
+            G.add_node(node["name"], **node)
+        for edge in edges:
+            if edge["cause"] not in G.nodes or edge["effect"] not in G.nodes:
+                self.logger.warning(f"invalid edge: {edge['cause']} -> {edge['effect']}")
+                continue
+            G.add_edge(edge["cause"], edge["effect"], **edge)
+        return G
+
+    @staticmethod
+    def _get_select_names(select_name) -> List[str]:
+        if select_name is None:
+            return []
+        if isinstance(select_name, str):
+            return [select_name, ]
+        if isinstance(select_name, list):
+            return select_name
+        raise ValueError(f"invalid select_name: {select_name}")
+
+
+def get_color(data: dict) -> str:
+    return color_map['fixed'] if data.get('fixed') is True else color_map[data['severity']]
+
+
+def to_dot(G: "nx.DiGraph", select_names: List[str], title: str = "") -> str:
+    def quote(text) -> str:
+        return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    lines = [f"digraph {quote(title)} {{", "  rankdir=LR;", "  node [shape=box, style=\"rounded,filled\"];"]
+    for node, data in G.nodes(data=True):
+        width = 3 if node in select_names else 1
+        label = quote(f"{data['name']}\n({data['product']})").replace("\n", "\\n")
+        lines.append(f"  {quote(node)} [label={label}, "
+                     f"fillcolor={quote(get_color(data))}, penwidth={width}];")
+    for u, v in G.edges():
+        lines.append(f"  {quote(u)} -> {quote(v)};")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def to_mermaid(G: "nx.DiGraph", select_names: List[str], title: str = "") -> str:
+    def escape(text) -> str:
+        return str(text).replace('"', "#quot;")
+
+    ids = {node: f"n{i}" for i, node in enumerate(G.nodes)}
+    lines = ["---", f"title: {escape(title)}", "---", "flowchart LR"]
+    for node, data in G.nodes(data=True):
+        style = "fixed" if data.get('fixed') is True else data['severity']
+        lines.append(f"  {ids[node]}[\"{escape(data['name'])}<br/>({escape(data['product'])})\"]:::{style}")
     for u, v in G.edges():
-        start = pos[u]
-        end = pos[v]
-        ax = plt.gca()
-        arrow = FancyArrowPatch(start, end, arrowstyle='->',
-                                mutation_scale=5,
-                                shrinkA=16,
-                                shrinkB=15,
-                                connectionstyle="arc3,rad=0.05",
-                                )
-        ax.add_patch(arrow)
-
-    nx.draw_networkx_nodes(G, pos, nodelist=[node for i, node in enumerate(G.nodes()) if i not in special_indexes],
-                           node_color=[color for i, color in enumerate(colors) if i not in special_indexes], alpha=0.3,
-                           node_size=1000)
-
-    if special_nodes:
-        nx.draw_networkx_nodes(G, pos, nodelist=special_nodes, node_color=[colors[i] for i in special_indexes],
-                               alpha=.75, node_size=1000)
-
-    nx.draw_networkx_labels(G, pos, labels=labels, font_size=7, font_family="SimHei")
-
-    x_min, x_max = ax.get_xlim()
-    y_min, y_max = ax.get_ylim()
-    ax.set_xlim(x_min - 0.1 * (x_max - x_min), x_max + 0.1 * (x_max - x_min))
-    ax.set_ylim(y_min - 0.1 * (y_max - y_min), y_max + 0.1 * (y_max - y_min))
-
-    title = plt.title(file_path.split('/')[-1].split('.')[0].replace('_', ": ").upper(), fontsize=10)
-    title.set_position((.5, 1.05))
-    fig.subplots_adjust(top=0.9)
-
-    plt.savefig(file_path, format='png', dpi=300, bbox_inches='tight')
+        lines.append(f"  {ids[u]} --> {ids[v]}")
+    for style, color in color_map.items():
+        lines.append(f"  classDef {style} fill:{color}")
+    selected = [ids[node] for node in select_names if node in ids]
+    if selected:
+        lines.append(f"  style {','.join(selected)} stroke-width:3px")
+    return "\n".join(lines) + "\n"
+
+
+class PlotQueue:
+    """
+    Renders causal graph plots in a worker process, off the critical path of the diagnosis.
+    `submit` takes an immutable snapshot of the state and returns at once. A snapshot identical to the previous
+    one (same graph and selection) is not rendered again, its image is copied when flushed.
+    `flush` waits for all submitted plots.
+    """
+
+    def __init__(self):
+        # a spawned worker does not inherit the event loop, connections or threads of the diagnosis
+        context = multiprocessing.get_context("spawn")
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        self.futures: List[Future] = []
+        self.copies: List[Tuple[Future, str]] = []     # (render, path) of coalesced snapshots
+        self.last_key: Optional[str] = None
+        self.last_future: Optional[Future] = None
+        self.rendered = 0
+        self.coalesced = 0
+        self.logger = get_logger(self.__class__.__name__)
+
+    def submit(self, causal_graph: DiagnosticState, file_path: str,
+               select_name: Optional[Union[str, List[str]]] = None) -> None:
+        snapshot = get_snapshot(causal_graph)
+        key = json.dumps([snapshot, select_name, os.path.splitext(file_path)[1]], sort_keys=True, ensure_ascii=False)
+        if key == self.last_key and self.last_future is not None:
+            self.coalesced += 1
+            self.copies.append((self.last_future, file_path))
+            return
+
+        try:
+            future = self.executor.submit(draw_causal_graph, snapshot["nodes"], snapshot["edges"], file_path, select_name)
+        except RuntimeError as e:
+            # the worker died (e.g. killed by the system), render in place
+            self.logger.warning(f"plot worker unavailable ({e}), render synchronously.")
+            draw_causal_graph(snapshot["nodes"], snapshot["edges"], file_path, select_name)
+            self.last_key, self.last_future = None, None
+            return
+        self.last_key, self.last_future = key, future
+        self.futures.append(future)
+        self.rendered += 1
+
+    def flush(self) -> dict:
+        """
+        wait for the submitted plots, failures are logged and not raised.
+        """
+        futures, self.futures = self.futures, []
+        copies, self.copies = self.copies, []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                self.logger.warning(f"plot failed: {e}")
+        for future, file_path in copies:
+            if future.exception() is None and future.result() != file_path:
+                shutil.copyfile(future.result(), file_path)
+        stats = {"rendered": self.rendered, "coalesced": self.coalesced}
+        self.logger.debug(f"plots: {stats}")
+        return stats
+
+    def close(self) -> None:
+        self.flush()
+        self.executor.shutdown(wait=True)
@@ -1,3 +1,4 @@
+import importlib
 from typing import Dict
 from pydantic import BaseModel
 
@@ -7,6 +8,7 @@ class Registry(BaseModel):
 
     name: str
     entries: Dict = {}
+    lazy_entries: Dict = {}     # key -> module registering it, imported when the key is first built
 
     def register(self, key: str):
         def decorator(class_builder):
@@ -15,12 +17,23 @@ class Registry(BaseModel):
 
         return decorator
 
-    def build(self, type: str, **kwargs):
+    def register_lazy(self, module: str, *keys: str):
+        for key in keys:
+            self.lazy_entries[key] = module
+
+    def get(self, type: str):
+        if type not in self.entries and type in self.lazy_entries:
+            importlib.import_module(self.lazy_entries[type])
         if type not in self.entries:
             raise ValueError(
                 f'{type} is not registered. Please register with the .register("{type}") method provided in {self.name} registry'
             )
-        return self.entries[type](**kwargs)
+        return self.entries[type]
+
+    def build(self, type: str, **kwargs):
+        return self.get(type)(**kwargs)
 
     def get_all_entries(self):
+        for module in set(self.lazy_entries.values()):
+            importlib.import_module(module)
         return self.entries
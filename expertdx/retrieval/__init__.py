@@ -0,0 +1,2 @@
+from .minhash import MinHasher, LSHIndex, jaccard
+from .incident_index import IncidentIndex
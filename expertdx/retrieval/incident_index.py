@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import fcntl
+import threading
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+from expertdx.diagnostics import DiagnosticState, DiagnosticItem
+from expertdx.diagnostics.diagnostic_item import DiagnosisType
+from expertdx.utils.logging_utils import get_logger
+from .minhash import MinHasher, LSHIndex, jaccard
+
+EXIT_CODE_PATTERN = re.compile(r"退出码:\s*(-?\d+)")
+
+
+class IncidentIndex(BaseModel):
+    """
+    Similar-incident retrieval over past diagnoses, persisted as JSON.
+    An incident is fingerprinted by its abnormal rule-based results (product, rule, severity and yarn exit code);
+    MinHash/LSH finds candidates sharing a band of signature, ranked by the exact Jaccard of their fingerprints.
+    Each entry keeps the causal relationships among its rule-based anomalies and the confirmed root causes,
+    so that a close enough match can seed the causal analysis of a new incident instead of the llm.
+    """
+
+    path: str = Field(default="results/index/incidents.json")
+    num_perm: int = Field(default=64)
+    bands: int = Field(default=16)                  # 16 bands of 4 rows: ~50% candidate probability at jaccard 0.5
+    seed: int = Field(default=1)
+    top_k: int = Field(default=3)
+    min_similarity: float = Field(default=0.3)      # matches below are not returned
+    reuse_threshold: float = Field(default=0.9)     # matches above seed the causal graph without the llm
+
+    incidents: Dict[str, dict] = Field(default_factory=dict)
+    hasher: Any = None
+    lsh: Any = None
+    lock: Any = None
+    logger: Any = None
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.hasher = MinHasher(num_perm=self.num_perm, seed=self.seed)
+        self.lock = threading.Lock()
+        self.logger = get_logger(self.__class__.__name__)
+        self.load()
+
+    @staticmethod
+    def fingerprint(state: DiagnosticState) -> List[str]:
+        tokens = set()
+        for item in state.diagnostic_items:
+            criteria = item.diagnostic_criteria
+            if criteria is None or criteria.type != DiagnosisType.RULE or item.is_normal():
+                continue
+            product = item.product.name.lower()
+            tokens.add(f"product:{product}")
+            tokens.add(f"rule:{product}:{item.name}")
+            tokens.add(f"severity:{product}:{item.name}:{item.severity.name.lower()}")
+            if product == "yarn":
+                for code in EXIT_CODE_PATTERN.findall(str(item.symptom)):
+                    tokens.add(f"exitcode:{int(code)}")
+        return sorted(tokens)
+
+    def query(self, state: DiagnosticState, top_k: Optional[int] = None,
+              exclude: Optional[str] = None) -> List[dict]:
+        """
+        :param exclude: task id left out of the results, e.g. the incident itself when re-run
+        :return: closest past incidents, each {task_id, similarity, relationships, root_causes, causal_graph}
+        """
+        tokens = self.fingerprint(state)
+        signature = self.hasher.signature(tokens)
+        with self.lock:
+            candidates = self.lsh.query(signature)
+            matches = []
+            for task_id in candidates:
+                if task_id == exclude:
+                    continue
+                incident = self.incidents[task_id]
+                similarity = jaccard(tokens, incident["tokens"])
+                if similarity >= self.min_similarity:
+                    matches.append(dict(task_id=task_id, similarity=round(similarity, 4), **{
+                        key: incident[key] for key in ("relationships", "root_causes", "causal_graph")
+                    }))
+        matches.sort(key=lambda _: (-_["similarity"], _["task_id"]))
+        return matches[:top_k or self.top_k]
+
+    def reuse_relationships(self, state: DiagnosticState, exclude: Optional[str] = None) -> Optional[List[Dict]]:
+        """
+        :return: causal relationships of the closest incident above `reuse_threshold`, restricted to items of
+            `state`, or None if there is no such incident
+        """
+        matches = self.query(state, top_k=1, exclude=exclude)
+        if not matches or matches[0]["similarity"] < self.reuse_threshold:
+            return None
+        match = matches[0]
+        names = {item.name for item in state.diagnostic_items}
+        relationships = [dict(rel) for rel in match["relationships"]
+                         if rel["cause"] in names and rel["effect"] in names]
+        self.logger.info(f"reuse {len(relationships)} causal relationships of incident `{match['task_id']}` "
+                         f"(similarity {match['similarity']}), root causes: "
+                         f"{[cause['name'] for cause in match['root_causes']]}.")
+        return relationships
+
+    def add(self, task_id: str, state: DiagnosticState, root_causes: List[DiagnosticItem], save: bool = True) -> None:
+        """
+        index a finished incident, replacing a previous entry of the same task.
+        """
+        tokens = self.fingerprint(state)
+        rule_names = {item.name for item in state.diagnostic_items
+                      if item.diagnostic_criteria is not None and item.diagnostic_criteria.type == DiagnosisType.RULE}
+        incident = {
+            "tokens": tokens,
+            "signature": self.hasher.signature(tokens),
+            "relationships": [rel for rel in state.causal_relationships
+                              if rel["cause"] in rule_names and rel["effect"] in rule_names],
+            "root_causes": [cause.to_dict() for cause in root_causes],
+            "causal_graph": {"nodes": state.to_list(), "edges": state.causal_relationships},
+            "created_at": time.time(),
+        }
+        with self.lock:
+            self._insert(task_id, incident)
+        self.logger.info(f"index incident `{task_id}` with {len(tokens)} fingerprint tokens.")
+        if save:
+            self.save()
+
+    def load(self) -> None:
+        incidents = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            if (data.get("num_perm"), data.get("seed")) == (self.num_perm, self.seed):
+                incidents = data["incidents"]
+            else:
+                # signatures of other hash functions are not comparable, re-hash the fingerprints
+                incidents = {task_id: dict(incident, signature=self.hasher.signature(incident["tokens"]))
+                             for task_id, incident in data["incidents"].items()}
+        with self.lock:
+            self.lsh = LSHIndex(num_perm=self.num_perm, bands=self.bands)
+            self.incidents = {}
+            for task_id, incident in incidents.items():
+                self._insert(task_id, incident)
+
+    def save(self) -> None:
+        """
+        merge with incidents added to the file by other processes since loaded, then replace it atomically.
+        the read-merge-replace holds an exclusive lock on `<path>.lock`, so that concurrent workers do not drop
+        each other's incidents.
+        """
+        dir_path = os.path.dirname(self.path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+        with self.lock:
+            incidents = dict(self.incidents)
+        with open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    on_disk = json.load(f)["incidents"]
+                incidents = {**on_disk, **incidents}
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"num_perm": self.num_perm, "seed": self.seed, "incidents": incidents}, f,
+                          ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self.incidents)
+
+    def _insert(self, task_id: str, incident: dict) -> None:
+        previous = self.incidents.get(task_id)
+        if previous is not None:
+            self.lsh.remove(task_id, previous["signature"])
+        self.incidents[task_id] = incident
+        self.lsh.insert(task_id, incident["signature"])
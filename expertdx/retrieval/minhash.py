@@ -0,0 +1,72 @@
+import random
+import hashlib
+from typing import Dict, Iterable, List, Set
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def hash_token(token: str) -> int:
+    """stable 32-bit hash of a token, the same across processes (unlike `hash`)."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def jaccard(a: Iterable[str], b: Iterable[str]) -> float:
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    MinHash signatures of token sets: `num_perm` universal hash functions (a * x + b) mod p,
+    so the fraction of equal signature slots estimates the Jaccard similarity of two sets.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [(rng.randint(1, MERSENNE_PRIME - 1), rng.randint(0, MERSENNE_PRIME - 1))
+                             for _ in range(num_perm)]
+
+    def signature(self, tokens: Iterable[str]) -> List[int]:
+        hashes = [hash_token(token) for token in set(tokens)]
+        if not hashes:
+            return [MAX_HASH] * self.num_perm
+        return [min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashes) for a, b in self.permutations]
+
+    @staticmethod
+    def similarity(sig1: List[int], sig2: List[int]) -> float:
+        assert len(sig1) == len(sig2), "signatures of different lengths."
+        return sum(x == y for x, y in zip(sig1, sig2)) / len(sig1)
+
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing of MinHash signatures: a signature is cut into `bands` bands,
+    and keys sharing all slots of any band are candidates of each other.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        assert num_perm % bands == 0, f"num_perm ({num_perm}) must be a multiple of bands ({bands})."
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: List[Dict[tuple, Set[str]]] = [dict() for _ in range(bands)]
+
+    def insert(self, key: str, signature: List[int]) -> None:
+        for band, bucket in zip(self._bands(signature), self.buckets):
+            bucket.setdefault(band, set()).add(key)
+
+    def remove(self, key: str, signature: List[int]) -> None:
+        for band, bucket in zip(self._bands(signature), self.buckets):
+            bucket.get(band, set()).discard(key)
+
+    def query(self, signature: List[int]) -> Set[str]:
+        candidates = set()
+        for band, bucket in zip(self._bands(signature), self.buckets):
+            candidates |= bucket.get(band, set())
+        return candidates
+
+    def _bands(self, signature: List[int]) -> List[tuple]:
+        return [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
@@ -1,8 +1,28 @@
 from expertdx.registry import Registry
+from expertdx.utils.lazy_utils import lazy_exports
 tool_registry = Registry(name="ToolRegistry")
 
+# tool modules are imported when a tool of theirs is first built or imported
+tool_registry.register_lazy("expertdx.tools.rule_analyzer", "rule_analyzer")
+tool_registry.register_lazy("expertdx.tools.log_analyzer",
+                            "spark_driver_log_analyzer", "spark_executor_log_analyzer", "spark_history_server_analyzer",
+                            "yarn_resource_dashboard_analyzer", "gc_log_analyzer",
+                            "hive_metastore_log_analyzer", "hive_server2_log_analyzer",
+                            "hdfs_nn_log_analyzer", "hdfs_dn_log_analyzer")
+tool_registry.register_lazy("expertdx.tools.code_analyzer", "sql_copilot", "program_analyzer")
+
 from .base import Tool
-from .rule_analyzer import RuleDiagTool
-from .log_analyzer import SparkExecLogTool, SparkDriverLogTool, SparkHistoryServerTool, \
-    YARNResDashTool, HiveServer2LogTool, HiveMetaLogTool, HDFSDataNodeLogTool, HDFSNameNodeLogTool
-from .code_analyzer import SQLCopilot, ProgramAnalyzer
+
+__getattr__ = lazy_exports(__name__, {
+    "RuleDiagTool": ".rule_analyzer",
+    "SparkExecLogTool": ".log_analyzer",
+    "SparkDriverLogTool": ".log_analyzer",
+    "SparkHistoryServerTool": ".log_analyzer",
+    "YARNResDashTool": ".log_analyzer",
+    "HiveServer2LogTool": ".log_analyzer",
+    "HiveMetaLogTool": ".log_analyzer",
+    "HDFSDataNodeLogTool": ".log_analyzer",
+    "HDFSNameNodeLogTool": ".log_analyzer",
+    "SQLCopilot": ".code_analyzer",
+    "ProgramAnalyzer": ".code_analyzer",
+})
@@ -1,6 +1,5 @@
 import os
 import json
-import requests
 from abc import ABC
 from pydantic import Field
 from .. import tool_registry
@@ -23,6 +22,7 @@ class CodeAnalyzer(Tool, ABC):
             with open(filepath) as f:
                 return f.read()
         else:
+            import requests
             r = requests.post(url=self.tool_request_url, headers=self.headers, data=json.dumps(data))
             res = r.json()
             return res
@@ -2,4 +2,6 @@ from .tools import SparkDriverLogTool, SparkExecLogTool, SparkHistoryServerTool,
     YARNResDashTool, YARNGCLogTool, \
     HiveServer2LogTool, HiveMetaLogTool, \
     HDFSDataNodeLogTool, HDFSNameNodeLogTool
+from .template_miner import TemplateMiner, LogTemplate
+from .scanner import LogScanner, FileScan, LogWindow, format_scans, open_log
 # toos on other products anonymized
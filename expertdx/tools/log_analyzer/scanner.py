@@ -0,0 +1,267 @@
+import io
+import os
+import re
+import gzip
+import mmap
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, IO, List, Optional
+from expertdx.utils.logging_utils import get_logger
+
+# error signatures of the prefilter, matched per line
+SIGNATURES = {
+    "exception": r"\b(?:[A-Za-z_$][\w$]*\.)+[A-Z][\w$]*(?:Exception|Error)\b|Caused by:|Traceback \(most recent call last\)",
+    "oom": r"OutOfMemoryError|GC overhead limit exceeded|Java heap space|Direct buffer memory|"
+           r"running beyond (?:physical|virtual) memory|exceeding (?:physical|virtual)? ?memory limits|"
+           r"oom[-_]kill|Killed process",
+    "gc": r"\bFull GC\b|Pause Full|\(Allocation Failure\)|to-space exhausted|concurrent mode failure",
+    "exit_code": r"(?:[Ee]xit ?(?:[Cc]ode|[Ss]tatus)|退出码)[ \t]*[:=]?[ \t]*-?\d+",
+    "yarn_kill": r"Container killed|killed by YARN|Container preempted|Killed by external signal",
+    "error": r"\b(?:ERROR|FATAL)\b",
+}
+# literal anchors of the signatures, only lines containing one are matched against them
+KEYWORDS = ["Exception", "Error", "ERROR", "FATAL", "Caused by", "Traceback", "heap space", "memory", "oom",
+            "GC", "Pause Full", "Allocation Failure", "to-space", "concurrent mode", "xit", "退出码",
+            "killed", "Killed", "preempted"]
+COMPRESSED = (".gz", ".zst")
+CHUNK_SIZE = 1 << 20
+
+
+class LogWindow:
+    """
+    Lines around matching lines of a log, overlapping windows are merged.
+    """
+
+    def __init__(self, first_line: int, lines: List[str]):
+        self.first_line = first_line
+        self.lines = lines
+        self.hits: List[int] = []       # line numbers of the matching lines
+
+    def to_dict(self) -> dict:
+        return {"first_line": self.first_line, "lines": self.lines, "hits": self.hits}
+
+
+class FileScan:
+    """
+    Result of scanning one log: matching lines per signature and the windows around them.
+    """
+
+    def __init__(self, path: str, size: int = 0):
+        self.path = path
+        self.size = size
+        self.counts: Dict[str, int] = {}
+        self.windows: List[LogWindow] = []
+        self.dropped = 0                # matching lines beyond `max_windows`
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "size": self.size, "counts": self.counts, "dropped": self.dropped,
+                "error": self.error, "windows": [_.to_dict() for _ in self.windows]}
+
+
+def open_log(path: str, text: bool = False) -> IO:
+    """
+    open a log for streaming, decompressed if it ends with `.gz` or `.zst` (requires `zstandard`).
+    """
+    if path.endswith(".gz"):
+        f = gzip.open(path, "rb")
+    elif path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(f"reading {path} requires zstandard, install it with `pip install zstandard`.")
+        f = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    else:
+        f = open(path, "rb")
+    return io.TextIOWrapper(f, encoding="utf-8", errors="replace") if text else f
+
+
+class LogScanner:
+    """
+    Scans logs for error signatures without loading them into memory.
+    The literal keywords of all signatures are precompiled into one bytes pattern, a prefilter run by the regex engine
+    from one candidate line to the next over the memory-mapped file (compressed files are streamed line by line).
+    Only candidate lines are matched against the signatures.
+    Only the windows of `context` lines around matching lines are decoded and kept, at most `max_windows` per file.
+    """
+
+    def __init__(self, signatures: Optional[Dict[str, str]] = None, keywords: Optional[List[str]] = None,
+                 context: int = 3, max_windows: int = 50, max_line_chars: int = 500):
+        """
+        :param keywords: every line matching one of `signatures` must contain one of them
+        """
+        self.signatures = signatures or SIGNATURES
+        self.keywords = keywords or KEYWORDS
+        self.context = context
+        self.max_windows = max_windows
+        self.max_line_chars = max_line_chars
+        self.patterns = {name: re.compile(pattern.encode("utf-8")) for name, pattern in self.signatures.items()}
+        self.prefilter = re.compile(b"|".join(re.escape(keyword.encode("utf-8")) for keyword in self.keywords))
+
+    def scan(self, path: str) -> FileScan:
+        result = FileScan(path)
+        try:
+            result.size = os.path.getsize(path)
+            if path.endswith(COMPRESSED):
+                with open_log(path) as f:
+                    self._scan_stream(f, result)
+            elif result.size > 0:
+                with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, "madvise"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    self._scan_mmap(mm, result)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        return result
+
+    def scan_all(self, paths: List[str], workers: int = 4) -> List[FileScan]:
+        """
+        scan logs across a process pool, results are in the order of `paths`.
+        """
+        if workers <= 1 or len(paths) <= 1:
+            results = [self.scan(path) for path in paths]
+        else:
+            # spawned workers start clean, without the event loop and connections of the parent
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=context) as executor:
+                results = list(executor.map(_scan, [self] * len(paths), paths))
+        for result in results:
+            if result.error is not None:
+                get_logger(self.__class__.__name__).warning(f"failed to scan {result.path}: {result.error}")
+        return results
+
+    def _scan_mmap(self, mm: mmap.mmap, result: FileScan) -> None:
+        size = len(mm)
+        pos, counted, line_no = 0, 0, 1        # `line_no` is the line at offset `counted`
+        spans = []                              # byte range of each window, decoded once the scan is done
+        while True:
+            match = self.prefilter.search(mm, pos)
+            if match is None:
+                break
+            start = mm.rfind(b"\n", 0, match.start()) + 1
+            end = mm.find(b"\n", match.end())
+            end = size if end < 0 else end
+            pos = end + 1
+            if not self._count(mm[start:end], result):
+                continue
+            line_no += _count_lines(mm, counted, start)
+            counted = start
+
+            window_start = self._before(mm, start)
+            if spans and window_start <= spans[-1][1] + 1:
+                # overlaps or adjoins the previous window, extend it
+                spans[-1][1] = self._after(mm, end)
+                result.windows[-1].hits.append(line_no)
+                continue
+            if len(result.windows) >= self.max_windows:
+                result.dropped += 1
+                continue
+            window = LogWindow(line_no - _count_lines(mm, window_start, start), [])
+            window.hits.append(line_no)
+            result.windows.append(window)
+            spans.append([window_start, self._after(mm, end)])
+
+        for window, (start, end) in zip(result.windows, spans):
+            window.lines = [self._line(line) for line in mm[start:end].split(b"\n")]
+
+    def _scan_stream(self, f: IO, result: FileScan) -> None:
+        # same windows as `_scan_mmap`: a hit within `2 * context + 1` lines of the last one joins its window
+        before = deque(maxlen=self.context)
+        window: Optional[LogWindow] = None
+        pending: List[bytes] = []               # lines after the last hit of `window`
+        for line_no, line in enumerate(f, 1):
+            if self.prefilter.search(line) is not None and self._count(line, result):
+                if window is not None:
+                    window.lines.extend(self._line(_) for _ in pending)
+                    pending.clear()
+                elif len(result.windows) >= self.max_windows:
+                    result.dropped += 1
+                    before.append(line)
+                    continue
+                else:
+                    window = LogWindow(line_no - len(before), [self._line(_) for _ in before])
+                    result.windows.append(window)
+                    before.clear()
+                window.lines.append(self._line(line))
+                window.hits.append(line_no)
+            elif window is not None:
+                pending.append(line)
+                if len(pending) > 2 * self.context:
+                    # too far for the next hit to join, close the window
+                    window.lines.extend(self._line(_) for _ in pending[:self.context])
+                    before.extend(pending[self.context:])
+                    window, pending = None, []
+            else:
+                before.append(line)
+        if window is not None:
+            window.lines.extend(self._line(_) for _ in pending[:self.context])
+
+    def _count(self, line: bytes, result: FileScan) -> bool:
+        matched = False
+        for name, pattern in self.patterns.items():
+            if pattern.search(line) is not None:
+                result.counts[name] = result.counts.get(name, 0) + 1
+                matched = True
+        return matched
+
+    def _before(self, mm: mmap.mmap, start: int) -> int:
+        for _ in range(self.context):
+            if start == 0:
+                break
+            start = mm.rfind(b"\n", 0, start - 1) + 1
+        return start
+
+    def _after(self, mm: mmap.mmap, end: int) -> int:
+        for _ in range(self.context):
+            # `end` is at a newline or the end of the map, no line follows the final newline
+            if end >= len(mm) - 1:
+                break
+            end = mm.find(b"\n", end + 1)
+            end = len(mm) if end < 0 else end
+        return end
+
+    def _line(self, line: bytes) -> str:
+        line = line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+        return line if len(line) <= self.max_line_chars else line[:self.max_line_chars] + "..."
+
+
+def format_scans(results: List[FileScan], root: Optional[str] = None) -> str:
+    """
+    plain-text report for the llm: signature counts, then the windows of each log with matching lines marked `>`.
+    """
+    totals: Dict[str, int] = {}
+    for result in results:
+        for name, count in result.counts.items():
+            totals[name] = totals.get(name, 0) + count
+    matched = [result for result in results if result.counts or result.error]
+    size = sum(result.size for result in results)
+    lines = [f"scanned {len(results)} logs ({size / 2 ** 20:.1f} MiB), {len(matched)} with matches: "
+             + (", ".join(f"{name} x{count}" for name, count in totals.items()) or "no error signature found")]
+    for result in matched:
+        name = os.path.relpath(result.path, root) if root else result.path
+        if result.error is not None:
+            lines.append(f"== {name}: failed to scan, {result.error}")
+            continue
+        counts = ", ".join(f"{name} x{count}" for name, count in result.counts.items())
+        dropped = f", {result.dropped} more matching lines not shown" if result.dropped else ""
+        lines.append(f"== {name}: {counts}{dropped}")
+        for window in result.windows:
+            hits = set(window.hits)
+            for i, line in enumerate(window.lines):
+                line_no = window.first_line + i
+                lines.append(f"{'>' if line_no in hits else ' '}{line_no:>7}| {line}")
+            lines.append("   ...")
+    return "\n".join(lines)
+
+
+def _count_lines(mm: mmap.mmap, start: int, end: int) -> int:
+    # in chunks, a slice of the map is a copy
+    count = 0
+    for i in range(start, end, CHUNK_SIZE):
+        count += mm[i:min(i + CHUNK_SIZE, end)].count(b"\n")
+    return count
+
+
+def _scan(scanner: LogScanner, path: str) -> FileScan:
+    return scanner.scan(path)
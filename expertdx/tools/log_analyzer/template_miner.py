@@ -0,0 +1,206 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+WILDCARD = "<*>"
+# `24/03/01 12:00:01 INFO ...` (spark), `2024-03-01 12:00:01,123 INFO ...` (hadoop), `2024-03-01T12:00:01.123+0800: ...` (gc)
+HEADER = re.compile(r"^\s*\[?(?P<ts>\d{2,4}[-/]\d{2}[-/]\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d{1,6})?)\]?\s*"
+                    r"(?:(?P<level>TRACE|DEBUG|INFO|WARN|WARNING|ERROR|FATAL)\b\s*)?(?P<message>.*)$")
+# stack frames and other indented continuation lines of a record
+CONTINUATION = re.compile(r"^\s+\S")
+DIGIT = re.compile(r"\d")
+# a variable token keeps its brackets, punctuation and `key=`, e.g. `(TID 42).` is `(TID <*>).`
+VARIABLE = re.compile(r"^([(\[{<\"']*(?:[A-Za-z_][\w.\-]*=)?)(.*?\d.*?)([)\]}>\"',;:.]*)$")
+SEVERE_LEVELS = {"ERROR", "FATAL", "WARN", "WARNING"}
+SEVERE_WORDS = re.compile(r"exception|error|fail|killed|denied|timeout|timed out|oom|outofmemory", re.IGNORECASE)
+
+
+class LogTemplate:
+    """
+    A mined template: the tokens of its lines, with `<*>` where they differ.
+    """
+
+    def __init__(self, template_id: int, tokens: List[str], line_no: int, level: Optional[str] = None):
+        self.template_id = template_id
+        self.tokens = tokens
+        self.level = level
+        self.count = 0
+        self.first_line = line_no
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+        self.samples: List[List[str]] = []      # parameters of the first distinct lines
+        self.stack: List[str] = []              # continuation lines of the first record
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+    def is_severe(self) -> bool:
+        return self.level in SEVERE_LEVELS or SEVERE_WORDS.search(self.template) is not None
+
+    def similarity(self, tokens: List[str]) -> float:
+        same = sum(1 for t, token in zip(self.tokens, tokens) if t == token or t == WILDCARD)
+        return same / len(tokens)
+
+    def to_dict(self) -> dict:
+        return {
+            "template_id": self.template_id,
+            "template": self.template,
+            "level": self.level,
+            "count": self.count,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "samples": self.samples,
+            "stack": self.stack,
+        }
+
+
+class TemplateMiner:
+    """
+    Streaming log template mining after Drain (He et al., ICWS 2017).
+    Lines are split into timestamp, level and message, tokens with digits are masked, and the message is routed
+    through a fixed-depth prefix tree (by token count, then the first tokens) to a few candidate templates. It joins
+    the most similar one if at least `similarity_threshold` of its tokens match, else it starts a new template.
+    Memory is bounded by the number of templates, not the size of the log.
+    """
+
+    def __init__(self, depth: int = 3, similarity_threshold: float = 0.5, max_children: int = 100,
+                 max_templates: int = 2000, max_samples: int = 3, max_stack: int = 3):
+        assert depth >= 1, "depth must be at least 1."
+        self.depth = depth
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_templates = max_templates
+        self.max_samples = max_samples
+        self.max_stack = max_stack
+
+        self.tree: Dict[int, dict] = {}
+        self.templates: List[LogTemplate] = []
+        self.total_lines = 0
+        self.unmatched = 0      # lines dropped once `max_templates` is reached
+        self.last: Optional[LogTemplate] = None
+
+    def add_lines(self, lines: Iterable[str]) -> "TemplateMiner":
+        for line in lines:
+            self.add_line(line)
+        return self
+
+    def add_line(self, line: str) -> Optional[LogTemplate]:
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            return None
+        self.total_lines += 1
+
+        if CONTINUATION.match(line) and self.last is not None:
+            if self.last.count == 1 and len(self.last.stack) < self.max_stack:
+                self.last.stack.append(line.strip())
+            return self.last
+
+        timestamp, level, message = None, None, line
+        header = HEADER.match(line)
+        if header is not None:
+            timestamp, level, message = header.group("ts"), header.group("level"), header.group("message")
+        raw = message.split()
+        if level is not None:
+            raw = [level, ] + raw
+        if not raw:
+            return None
+        tokens = [_mask(token) for token in raw]
+
+        template = self._match(tokens)
+        if template is None:
+            if len(self.templates) >= self.max_templates:
+                self.unmatched += 1
+                self.last = None
+                return None
+            template = LogTemplate(len(self.templates), tokens, self.total_lines, level)
+            self.templates.append(template)
+            self._insert(template)
+        else:
+            template.tokens = [t if t == token else WILDCARD for t, token in zip(template.tokens, tokens)]
+
+        template.count += 1
+        if timestamp is not None:
+            template.first_timestamp = template.first_timestamp or timestamp
+            template.last_timestamp = timestamp
+        params = [_unmask(t, token) for t, token in zip(template.tokens, raw) if WILDCARD in t]
+        if params and len(template.samples) < self.max_samples and params not in template.samples:
+            template.samples.append(params)
+        self.last = template
+        return template
+
+    def get_templates(self) -> List[LogTemplate]:
+        """
+        :return: templates with errors and warnings first, each in order of first appearance
+        """
+        return sorted(self.templates, key=lambda _: (not _.is_severe(), _.first_line))
+
+    def summarize(self, max_templates: int = 50, max_chars: int = 200) -> str:
+        """
+        plain-text summary for the llm: one line per template with its count and time range,
+        then sample parameters and the first stack frames.
+        """
+        templates = self.get_templates()
+        shown = templates[:max_templates]
+        lines = [f"{self.total_lines} log lines mined into {len(templates)} templates "
+                 f"(errors and warnings first, `<*>` marks variable tokens):"]
+        for template in shown:
+            span = ""
+            if template.first_timestamp is not None:
+                span = f" [{template.first_timestamp}" + \
+                       (f" ~ {template.last_timestamp}]" if template.last_timestamp != template.first_timestamp else "]")
+            lines.append(f"- x{template.count}{span} {_truncate(template.template, max_chars)}")
+            if template.samples:
+                samples = " | ".join(", ".join(params) for params in template.samples)
+                lines.append(f"    params: {_truncate(samples, max_chars)}")
+            for frame in template.stack:
+                lines.append(f"    {_truncate(frame, max_chars)}")
+
+        omitted = templates[max_templates:]
+        if omitted:
+            lines.append(f"... {len(omitted)} more templates ({sum(_.count for _ in omitted)} lines) omitted.")
+        if self.unmatched:
+            lines.append(f"... {self.unmatched} lines beyond {self.max_templates} templates not mined.")
+        return "\n".join(lines)
+
+    def _match(self, tokens: List[str]) -> Optional[LogTemplate]:
+        node = self.tree.get(len(tokens))
+        for token in tokens[:self.depth]:
+            if node is None:
+                return None
+            node = node.get(token, node.get(WILDCARD))
+        if node is None:
+            return None
+
+        best, best_similarity = None, -1.0
+        for template in node["templates"]:
+            similarity = template.similarity(tokens)
+            if similarity > best_similarity:
+                best, best_similarity = template, similarity
+        return best if best_similarity >= self.similarity_threshold else None
+
+    def _insert(self, template: LogTemplate) -> None:
+        node = self.tree.setdefault(len(template.tokens), {})
+        for token in template.tokens[:self.depth]:
+            if token not in node and token != WILDCARD and len(node) >= self.max_children:
+                token = WILDCARD
+            node = node.setdefault(token, {})
+        node.setdefault("templates", []).append(template)
+
+
+def _mask(token: str) -> str:
+    variable = VARIABLE.match(token) if DIGIT.search(token) else None
+    return token if variable is None else variable.group(1) + WILDCARD + variable.group(3)
+
+
+def _unmask(template_token: str, token: str) -> str:
+    # the value of a variable token in its line, without the punctuation kept in the template
+    if template_token == WILDCARD:
+        return token
+    prefix, suffix = template_token.split(WILDCARD, 1)
+    if token.startswith(prefix) and token.endswith(suffix):
+        return token[len(prefix):len(token) - len(suffix)]
+    return token
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
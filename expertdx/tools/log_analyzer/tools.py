@@ -1,10 +1,12 @@
 import os
 import json
-import requests
 from abc import ABC
+from typing import Iterable, List, Optional
 from pydantic import Field
 from .. import tool_registry
 from ..base import Tool, AgentEnum
+from .template_miner import TemplateMiner
+from .scanner import LogScanner, format_scans, open_log
 
 
 class LogAnalyzer(Tool, ABC):
@@ -14,19 +16,88 @@ class LogAnalyzer(Tool, ABC):
         'accept': '*/*',
         'Content-Type': 'application/json'
     }
+    # raw logs are mined into templates before they reach the llm, shorter outputs are returned as they are
+    mine_templates: bool = Field(default=True)
+    min_lines: int = Field(default=200)
+    max_templates: int = Field(default=50)
+    similarity_threshold: float = Field(default=0.5)
+
+    # many logs of a tool (files under `<task_id>/<name>/`) are triaged instead: scanned in parallel for error
+    # signatures, only the matching lines with `context_lines` around them are returned
+    scan_logs: Optional[bool] = Field(default=None)     # None: for a directory of logs
+    scan_workers: int = Field(default=4)
+    context_lines: int = Field(default=3)
+    max_windows: int = Field(default=20)                # per log
 
     def __call__(self, data: dict):
         # cached tool observation for offline evaluation
         if self.offline:
-            filepath = os.path.join(self.data_dir, f"{data['task_id']}/{self.name}.txt")
-            self.logger.info(f"offline simulation of tool requests. loading from {filepath}")
-            with open(filepath) as f:
-                return f.read()
+            paths = self.find_logs(data['task_id'])
+            self.logger.info(f"offline simulation of tool requests. loading from {paths[0]}"
+                             + (f" and {len(paths) - 1} more logs" if len(paths) > 1 else ""))
+            if self.scan_logs or (self.scan_logs is None and len(paths) > 1):
+                return self.triage_logs(paths, root=os.path.join(self.data_dir, data['task_id']))
+            lines = _read_lines(paths)
+            if not self.mine_templates:
+                return "".join(lines)
+            return self.summarize_log(lines)
         else:
+            import requests
             r = requests.post(url=self.tool_request_url, headers=self.headers, data=json.dumps(data))
             res = r.json()
+            if self.mine_templates and isinstance(res, str):
+                return self.summarize_log(res.splitlines(keepends=True))
             return res
 
+    def find_logs(self, task_id: str) -> List[str]:
+        """
+        :return: `<task_id>/<name>.txt`, also gzip (`.gz`) or zstd (`.zst`) compressed, and the files under
+        `<task_id>/<name>/`
+        """
+        task_dir = os.path.join(self.data_dir, task_id)
+        paths = [os.path.join(task_dir, f"{self.name}.txt{ext}") for ext in ("", ".gz", ".zst")]
+        paths = [path for path in paths if os.path.isfile(path)]
+        for root, dirs, files in os.walk(os.path.join(task_dir, self.name)):
+            dirs.sort()
+            paths.extend(os.path.join(root, file) for file in sorted(files))
+        if not paths:
+            raise FileNotFoundError(f"no log of {self.name} in {task_dir}.")
+        return paths
+
+    def triage_logs(self, paths: List[str], root: Optional[str] = None) -> str:
+        scanner = LogScanner(context=self.context_lines, max_windows=self.max_windows)
+        results = scanner.scan_all(paths, workers=self.scan_workers)
+        report = format_scans(results, root=root)
+        self.logger.info(f"scanned {len(paths)} logs ({sum(_.size for _ in results)} bytes) "
+                         f"into {sum(len(_.windows) for _ in results)} windows ({len(report)} chars).")
+        return report
+
+    def summarize_log(self, lines: Iterable[str]) -> str:
+        """
+        stream the lines through a template miner: a log of `min_lines` or more becomes its templates
+        with counts, time ranges and sample parameters.
+        """
+        miner = TemplateMiner(similarity_threshold=self.similarity_threshold)
+        head, size = [], 0
+        for line in lines:
+            if len(head) < self.min_lines:
+                head.append(line)
+            size += len(line)
+            miner.add_line(line)
+        if len(head) < self.min_lines:
+            return "".join(head)
+
+        summary = miner.summarize(max_templates=self.max_templates)
+        self.logger.info(f"mined {miner.total_lines} lines ({size} chars) into {len(miner.templates)} templates "
+                         f"({len(summary)} chars).")
+        return summary
+
+
+def _read_lines(paths: List[str]) -> Iterable[str]:
+    for path in paths:
+        with open_log(path, text=True) as f:
+            yield from f
+
 
 @tool_registry.register("spark_driver_log_analyzer")
 class SparkDriverLogTool(LogAnalyzer):
@@ -76,6 +147,7 @@ class SparkExecLogTool(LogAnalyzer):
 @tool_registry.register("spark_history_server_analyzer")
 class SparkHistoryServerTool(LogAnalyzer):
     name = "spark_history_server_analyzer"
+    mine_templates = False     # a report, not a log
     description = (
         "The Spark History Server is a web interface that provides a visual representation of completed Spark applications. "
         "It allows users to review the details of past Spark jobs, stages, and tasks, and to understand their performance characteristics. "
@@ -98,6 +170,7 @@ class SparkHistoryServerTool(LogAnalyzer):
 @tool_registry.register("yarn_resource_dashboard_analyzer")
 class YARNResDashTool(LogAnalyzer):
     name = "yarn_resource_dashboard_analyzer"
+    mine_templates = False     # a report, not a log
     description = (
         "This is a monitoring tool that provides a visual interface for tracking and managing resources within a YARN cluster. "
         "It allows users to observe the allocation and usage of resources (like CPU, memory, and disk space) across different nodes and applications. "
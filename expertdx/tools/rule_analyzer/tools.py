@@ -3,7 +3,7 @@ import json
 from typing import List, Dict, Optional
 from pydantic import Field
 from string import Template
-from expertdx.llms import AzureOpenAIChat
+from expertdx.llms import BaseLLM, SelfConsistency, edge_set_similarity
 from expertdx.diagnostics import DiagnosticState, DiagnosticItem, create_diagnostic_item, product_id2name
 from .prompt import CAUSAL_ANALYSIS_PROMPT, CAUSAL_ANALYSIS_DEMO, SUMMARY_PROMPT, PRODUCT_DESCRIPTION
 from ..base import Tool, AgentEnum
@@ -16,20 +16,26 @@ class RuleDiagTool(Tool):
     description = "Analyze the causal relationship among the results of rule-based diagnosis."
     belong_to = AgentEnum.helper
 
-    llm: AzureOpenAIChat
+    llm: BaseLLM
 
     task_id: str = Field(default="")
     diagnostic_state: Optional[DiagnosticState] = Field(default=None)
     save: bool = Field(default=True)
     offline_test: bool = Field(default=True)
+    self_consistency: Optional[SelfConsistency] = Field(default=None)   # adaptive sample count of causal analysis
 
     def __call__(
             self,
             task_id,
             stream=True,
             merge_runtime=True,
+            incident_index=None,
             **kwargs
     ) -> DiagnosticState:
+        """
+        :param incident_index: `IncidentIndex` of past incidents; the causal relationships of a close enough match
+            are reused instead of the llm causal analysis
+        """
 
         self.task_id = task_id
         rule_path = f"{self.data_dir}/{task_id}/rule_diagnostic_results.json"
@@ -45,8 +51,12 @@ class RuleDiagTool(Tool):
         self.diagnostic_state = DiagnosticState(diagnostic_items=diagnostic_items)
 
         # step 2: causal analysis
-        self.logger.info("causal analysis.")
-        causal_relationships = self.causal_analysis()
+        causal_relationships = None
+        if incident_index is not None:
+            causal_relationships = incident_index.reuse_relationships(self.diagnostic_state, exclude=task_id)
+        if causal_relationships is None:
+            self.logger.info("causal analysis.")
+            causal_relationships = self.causal_analysis(stream=stream, consist_k=kwargs.get("consist_k", 3))
         self.diagnostic_state.causal_relationships = causal_relationships
 
         # # step 3: summarize (optional; llm-prompt)
@@ -106,28 +116,42 @@ class RuleDiagTool(Tool):
         )
         anomaly_state = DiagnosticState(diagnostic_items=anomalies)
         system_prompt = Template(CAUSAL_ANALYSIS_PROMPT).substitute(product_description=PRODUCT_DESCRIPTION)
-        # self-consistency
-        repeated = []
-        for i in range(consist_k):
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content":
+                f"## Rule-based Diagnostic Results\n"
+                f"{json.dumps({'anomalies': anomaly_state.to_list()}, indent=2, ensure_ascii=False)}"
+             },
+            {"role": "user", "content": CAUSAL_ANALYSIS_DEMO},      # in-context learning
+        ]
+        if self.self_consistency is not None:
+            # sample until the edge sets agree, `consist_k` is ignored
+            _, repeated, _ = self.self_consistency.sample(
+                self.llm,
+                similarity=lambda a, b: edge_set_similarity(self._get_edges(a), self._get_edges(b)),
+                parse=lambda content: json.loads(content)["causal_relationships"],
+                name="causal analysis",
+                messages=messages,
+                stream=stream,
+                response_format={"type": "json_object"}
+            )
+        else:
+            # self-consistency, sampled as `consist_k` choices of one request
+            repeated = []
             response = self.llm.generate_response(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content":
-                        f"## Rule-based Diagnostic Results\n"
-                        f"{json.dumps({'anomalies': anomaly_state.to_list()}, indent=2, ensure_ascii=False)}"
-                     },
-                    {"role": "user", "content": CAUSAL_ANALYSIS_DEMO},      # in-context learning
-                ],
+                messages=messages,
                 stream=stream,
                 response_format={"type": "json_object"},
+                n=consist_k
             )
-            content = response.message.content
-            _causal_relationship = json.loads(content)["causal_relationships"]
-            repeated.append(_causal_relationship)
+            for message in response.messages:
+                content = message.content
+                _causal_relationship = json.loads(content)["causal_relationships"]
+                repeated.append(_causal_relationship)
 
         causal_relationships = {}
-        for i in range(consist_k):
-            for item in repeated[i]:
+        for sample in repeated:
+            for item in sample:
                 key = (item["cause"], item["effect"])
                 if key not in causal_relationships:
                     causal_relationships[key] = item["description"]
@@ -158,6 +182,10 @@ class RuleDiagTool(Tool):
 
         return summary
 
+    @staticmethod
+    def _get_edges(relationships: List[Dict]) -> set:
+        return {(rel["cause"], rel["effect"]) for rel in relationships}
+
     @staticmethod
     def get_rule_type(group_name):
         if group_name.startswith('metric'):
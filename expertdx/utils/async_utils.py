@@ -0,0 +1,51 @@
+import os
+import asyncio
+import threading
+from typing import Any, Awaitable, List
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide background event loop, starting it on first use.
+    Async clients are bound to the loop they were first used on, so every coroutine runs on this one.
+    """
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="expertdx-event-loop", daemon=True)
+            _thread.start()
+    return _loop
+
+
+def run_sync(coro: Awaitable) -> Any:
+    """
+    Run a coroutine on the background event loop and block until it finishes.
+    """
+    if threading.current_thread() is _thread:
+        raise RuntimeError("run_sync() cannot be called from the background event loop.")
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    return future.result()
+
+
+def run_concurrently(coros: List[Awaitable]) -> List[Any]:
+    """
+    Run independent coroutines concurrently and return their results in order.
+    """
+    async def _gather():
+        return await asyncio.gather(*coros)
+
+    return run_sync(_gather())
+
+
+def _reset_after_fork():
+    # the loop thread does not survive fork(), start a fresh one on demand in the child
+    global _loop, _thread, _lock
+    _loop, _thread, _lock = None, None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
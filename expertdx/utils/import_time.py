@@ -0,0 +1,80 @@
+"""
+Import-time budget of expertdx, every batch worker and CLI invocation pays it.
+
+    python -m expertdx.utils.import_time [modules ...] [--budget-ms 800] [--forbid matplotlib ...]
+
+Each module is imported in a fresh interpreter with `-X importtime`. The check fails if its cumulative import time
+exceeds the budget, or if it imports a dependency that must only be loaded on first use.
+"""
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ["expertdx.initialize", "expertdx.agents", "expertdx.verification"]
+DEFAULT_BUDGET_MS = 800
+# loaded on first use: plotting, ELBO verification and online tool requests
+DEFAULT_FORBIDDEN = ["matplotlib", "networkx", "numpy", "scipy", "requests"]
+
+
+def measure_import(module: str, repeat: int = 3) -> Tuple[float, Dict[str, float]]:
+    """
+    :return: best cumulative import time of `module` in ms, and the self time in ms of every module it imported
+    """
+    best, best_modules = float("inf"), {}
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"failed to import {module}:\n{result.stderr}")
+        total, modules = _parse_importtime(result.stderr, module)
+        if total < best:
+            best, best_modules = total, modules
+    return best, best_modules
+
+
+def check_import_time(modules: List[str], budget_ms: float = DEFAULT_BUDGET_MS,
+                      forbidden: List[str] = DEFAULT_FORBIDDEN, top: int = 10) -> bool:
+    ok = True
+    for module in modules:
+        total, imported = measure_import(module)
+        violations = sorted(_ for _ in forbidden if _ in imported)
+        status = "ok" if total <= budget_ms and not violations else "FAIL"
+        print(f"[{status}] {module}: {total:.1f} ms (budget {budget_ms:.0f} ms)")
+        for name, self_ms in sorted(imported.items(), key=lambda _: -_[1])[:top]:
+            print(f"    {self_ms:8.1f} ms  {name}")
+        if violations:
+            print(f"    imports {', '.join(violations)}, which must be loaded on first use")
+        ok = ok and status == "ok"
+    return ok
+
+
+def _parse_importtime(stderr: str, module: str) -> Tuple[float, Dict[str, float]]:
+    # lines of `import time: self [us] | cumulative | imported package`
+    total, modules = 0.0, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue    # header
+        name = fields[2].strip()
+        modules[name.split(".")[0]] = modules.get(name.split(".")[0], 0.0) + int(fields[0]) / 1000
+        if name == module:
+            total = int(fields[1]) / 1000
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="check the import time of expertdx against a budget.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="top-level packages the modules must not import")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level packages to report")
+    args = parser.parse_args()
+    sys.exit(0 if check_import_time(args.modules, args.budget_ms, args.forbid, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
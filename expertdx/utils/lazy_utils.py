@@ -0,0 +1,18 @@
+import importlib
+from typing import Callable, Dict
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Callable:
+    """
+    Module `__getattr__` of a package re-exporting `exports` (name -> relative submodule) on first access,
+    so importing the package does not import the submodules and their dependencies.
+    """
+    def __getattr__(name: str):
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        # later lookups find it in the module dict and skip __getattr__
+        setattr(importlib.import_module(package), name, value)
+        return value
+
+    return __getattr__
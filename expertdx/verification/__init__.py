@@ -1,2 +1,7 @@
-from .llm_evaluation import LLMEval
-from .elbo import calculate_elbo, parse_diagnostic_outcome
+from expertdx.utils.lazy_utils import lazy_exports
+
+__getattr__ = lazy_exports(__name__, {
+    "LLMEval": ".llm_evaluation",
+    "calculate_elbo": ".elbo",
+    "parse_diagnostic_outcome": ".elbo",
+})
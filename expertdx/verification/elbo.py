@@ -1,21 +1,23 @@
 import json
 import re
-import numpy as np
-from numpy import ndarray
-from scipy.stats import beta, entropy
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Optional
 from string import Template
-from expertdx.llms import BaseLLM
+from expertdx.llms import BaseLLM, generate_json
 from expertdx.diagnostics import DiagnosticState, Severity
-from .prompt import DECODE_PROMPT, EXTRACT_PROMPT, ENCODE_PROMPT, SAMPLED_CAUSES
+from .prompt import DECODE_PROMPT, EXTRACT_PROMPT, ENCODE_PROMPT, SAMPLED_CAUSES, PREDICTION_SCHEMA
 
+# numpy and scipy are imported when the ELBO is first calculated
+if TYPE_CHECKING:
+    from numpy import ndarray
 
-def calculate_elbo(llm, causes, observation, alpha=0.5):
+
+def calculate_elbo(llm, causes, observation, alpha=0.5, extract_llm: Optional[BaseLLM] = None):
     """
     Calculate the ELBO value.
+    `extract_llm`, if given, extracts the prediction vector instead of `llm`, which remains the fallback.
     """
     # Calculate the first term: log p(O|C)
-    log_prob_o_given_c = calculate_log_prob_o_given_c(llm, causes, observation)
+    log_prob_o_given_c = calculate_log_prob_o_given_c(llm, causes, observation, extract_llm=extract_llm)
 
     # Simulate the prior distribution p(C)
     p_C = stick_breaking_process(alpha)
@@ -24,6 +26,7 @@ def calculate_elbo(llm, causes, observation, alpha=0.5):
     q_phi_C_given_O = llm_encode(llm, causes, SAMPLED_CAUSES)
 
     # KL divergence calculation
+    from scipy.stats import entropy
     kl_divergence = entropy(q_phi_C_given_O, p_C)
 
     # Compute ELBO
@@ -32,11 +35,14 @@ def calculate_elbo(llm, causes, observation, alpha=0.5):
     return elbo
 
 
-def calculate_log_prob_o_given_c(llm: BaseLLM, causes: List[str], observation: Dict[str, int]) -> float:
+def calculate_log_prob_o_given_c(llm: BaseLLM, causes: List[str], observation: Dict[str, int],
+                                 extract_llm: Optional[BaseLLM] = None) -> float:
     """
     Calculate the log joint probability of the observation sequence O given condition C.
     """
-    prediction = llm_decode(llm, causes, observation)
+    import numpy as np
+
+    prediction = llm_decode(llm, causes, observation, extract_llm=extract_llm)
     log_prob_sum = 0
     for o_i, p_i in zip(observation.values(), prediction):
         p_i = max(min(p_i, 1 - 1e-15), 1e-15)
@@ -44,10 +50,13 @@ def calculate_log_prob_o_given_c(llm: BaseLLM, causes: List[str], observation: D
     return log_prob_sum
 
 
-def stick_breaking_process(alpha=0.5) -> ndarray:
+def stick_breaking_process(alpha=0.5) -> "ndarray":
     """
     Generate samples from a Dirichlet Process using the Stick-Breaking Process.
     """
+    import numpy as np
+    from scipy.stats import beta
+
     num_samples = len(SAMPLED_CAUSES)
     betas = beta.rvs(1, alpha, size=num_samples)
     pis = np.zeros(num_samples)
@@ -79,7 +88,7 @@ def parse_diagnostic_outcome(state: DiagnosticState):
     return observation
 
 
-def llm_decode(llm: BaseLLM, causes, observation) -> List[int]:
+def llm_decode(llm: BaseLLM, causes, observation, extract_llm: Optional[BaseLLM] = None) -> List[int]:
     """
     returns the probability p_i given condition C and observation o_i.
     """
@@ -92,12 +101,8 @@ def llm_decode(llm: BaseLLM, causes, observation) -> List[int]:
     )
     messages.append({"role": "assistant", "content": response.message.content})
     messages.append({"role": "user", "content": EXTRACT_PROMPT})
-    response = llm.generate_response(
-        messages=messages, stream=True, response_format={"type": "json_object"}
-    )
-    content = response.message.content
-    prediction = json.loads(content)["prediction"]
-    return prediction
+    content, _ = generate_json(extract_llm or llm, PREDICTION_SCHEMA, fallback_llm=llm, messages=messages, stream=True)
+    return content["prediction"]
 
 
 def llm_encode(llm, causes, sampled_causes) -> List[int]:
@@ -3,11 +3,12 @@ import re
 import json
 from string import Template
 from pydantic import Field, BaseModel
-from expertdx.llms import AzureOpenAIChat
+from expertdx.llms import BaseLLM
+from expertdx.utils.async_utils import run_concurrently
 
 
 class LLMEval(BaseModel):
-    llm: AzureOpenAIChat
+    llm: BaseLLM
     acc_prompt: str = Field(default="")
     coh_prompt: str = Field(default="")
     con_prompt: str = Field(default="")
@@ -15,31 +16,51 @@ class LLMEval(BaseModel):
 
     def load_prompts(self):
         path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
-        with open(os.path.join(path, "accuracy.txt")) as f:
-            self.acc_prompt = f.read()
+        if os.path.exists(os.path.join(path, "accuracy.txt")):
+            with open(os.path.join(path, "accuracy.txt")) as f:
+                self.acc_prompt = f.read()
         with open(os.path.join(path, "coherence.txt")) as f:
             self.coh_prompt = f.read()
-        with open(os.path.join(path, "consistency.txt.txt")) as f:
+        with open(os.path.join(path, "consistency.txt")) as f:
             self.con_prompt = f.read()
         with open(os.path.join(path, "relevance.txt")) as f:
             self.rel_prompt = f.read()
 
     def evaluate_metric(self, report, metric="coherence"):
+        input_content = self._get_prompt(metric).substitute(report=report)
+        response = self.llm.generate_response(
+            messages=[{"role": "system", "content": input_content}], stream=True
+        )
+        return self._parse_score(response.message.content, metric)
+
+    async def aevaluate_metric(self, report, metric="coherence"):
+        input_content = self._get_prompt(metric).substitute(report=report)
+        response = await self.llm.agenerate_response(
+            messages=[{"role": "system", "content": input_content}], stream=True
+        )
+        return self._parse_score(response.message.content, metric)
+
+    def evaluate(self, report):
+        # metrics are scored independently of each other
+        results = run_concurrently([
+            self.aevaluate_metric(report, metric) for metric in ["coherence", "consistency", "relevance"]
+        ])
+        scores = [score for score, content in results]
+        return scores
+
+    def _get_prompt(self, metric) -> Template:
         if metric == "coherence":
             prompt = Template(self.coh_prompt)
-        elif metric == "consistency.txt":
+        elif metric == "consistency":
             prompt = Template(self.con_prompt)
         elif metric == "relevance":
             prompt = Template(self.rel_prompt)
         else:
             raise NotImplementedError(f"invalid automated metric: {metric}.")
+        return prompt
 
-        input_content = prompt.substitute(report=report)
-        response = self.llm.generate_response(
-            messages=[{"role": "system", "content": input_content}], stream=True
-        )
-        content = response.message.content
-
+    @staticmethod
+    def _parse_score(content, metric):
         pattern = rf"- {metric.capitalize()} Score: (\d+)"
         match = re.search(pattern, content)
         if match:
@@ -53,11 +74,3 @@ class LLMEval(BaseModel):
                 return score, content
             except:
                 raise NotImplementedError(f"{metric.capitalize()} score not found in content\n{content}.")
-
-    def evaluate(self, report):
-        scores = []
-        for metric in ["coherence", "consistency.txt", "relevance"]:
-            score, content = self.evaluate_metric(report, metric)
-            scores.append(score)
-
-        return scores
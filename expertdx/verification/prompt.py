@@ -26,6 +26,8 @@ Extract a 0-1 vector.
 ```
 """
 
+PREDICTION_SCHEMA = {"prediction": [None]}
+
 ENCODE_PROMPT = """As an expert in cloud computing platforms, I will provide you with a `diagnosed root cause` and a list of `common root cause` names. 
 I need you to help me identify which of the listed root causes are synonymous with the diagnosed root cause by returning a binary vector, where 1 indicates identical meaning and 0 indicates different meanings.
 
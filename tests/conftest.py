@@ -0,0 +1,52 @@
+import pytest
+from typing import List, Optional, Set, Tuple, Union
+from pydantic import Field
+from expertdx.message import AssistantMessage
+from expertdx.llms.base import BaseLLM, LLMResult
+from expertdx.agents import ModuleAgent
+
+
+class CountingLLM(BaseLLM):
+    """Deterministic llm answering `answer <n>` to its n-th request."""
+    temperature: float = 0
+    calls: int = 0
+
+    def generate_response(self, messages, **kwargs) -> LLMResult:
+        self.calls += 1
+        return LLMResult(message=AssistantMessage(content=f"answer {self.calls}"), finish_reason="stop",
+                         send_tokens=10, recv_tokens=2, total_tokens=12)
+
+
+@pytest.fixture
+def counting_llm() -> CountingLLM:
+    return CountingLLM()
+
+
+class MitigatingAgent(ModuleAgent):
+    """
+    Module agent fixing every anomaly it mitigates;
+    checks confirm the effects, or (effect, cause) pairs, in `fixes` (all when None).
+    """
+    fixes: Optional[Set[Union[str, Tuple[str, str]]]] = None
+    mitigated: List[str] = Field(default_factory=list)
+    batches: List[List[dict]] = Field(default_factory=list)
+
+    def mitigate(self, task_id, anomaly, state, stream=True) -> bool:
+        self.mitigated.append(anomaly.name)
+        anomaly.set_fixed()
+        return True
+
+    def check_mitigation_batch(self, task_id, items) -> List[bool]:
+        self.batches.append(items)
+        return [self.fixes is None or item["anomaly"] in self.fixes or (item["anomaly"], item["cause"]) in self.fixes
+                for item in items]
+
+
+@pytest.fixture
+def spark_agent(counting_llm) -> MitigatingAgent:
+    return MitigatingAgent(name="spark_agent", role_description="", llm=counting_llm)
+
+
+@pytest.fixture
+def yarn_agent(counting_llm) -> MitigatingAgent:
+    return MitigatingAgent(name="yarn_agent", role_description="", llm=counting_llm)
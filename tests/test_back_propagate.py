@@ -0,0 +1,69 @@
+from expertdx.agents import HelperAgent
+from expertdx.diagnostics import DiagnosticState, Product, create_diagnostic_item
+from expertdx.environments.diagnose import DiagEnvironment
+
+
+def make_env(edges, agents, products=None) -> DiagEnvironment:
+    """
+    :param edges: (cause, effect) names, the first cause is fixed
+    """
+    names = list(dict.fromkeys(name for edge in edges for name in edge))
+    products = products or {}
+    items = [create_diagnostic_item(name=name, product_id=products.get(name, Product.SPARK.value), severity_status=2,
+                                    diagnostic_criteria_type="rule", diagnostic_criteria_subtype="rule",
+                                    diagnostic_criteria_name=name) for name in names]
+    items[0].set_fixed()
+    state = DiagnosticState(diagnostic_items=items)
+    state.update(relationships=[{"cause": cause, "effect": effect, "description": ""} for cause, effect in edges])
+    helper = HelperAgent(llm=agents[0].llm, async_plot=False)
+    env = DiagEnvironment(agents=[helper] + agents, task_id="task")
+    env.state = state
+    return env
+
+
+def checks(agent) -> list:
+    return [[(item["anomaly"], item["cause"]) for item in batch] for batch in agent.batches]
+
+
+def fixed(env) -> list:
+    return [item.name for item in env.state.diagnostic_items if item.is_fixed()]
+
+
+def test_cycle(spark_agent):
+    env = make_env([("a", "b"), ("b", "c"), ("c", "a")], [spark_agent])
+    env.back_propagate(env.state.get_item_by_name("a"))
+    assert fixed(env) == ["a", "b", "c"]
+    assert checks(env.agents[1]) == [[("b", "a")], [("c", "b")]]
+
+
+def test_diamond_checks_an_effect_once_fixed(spark_agent):
+    env = make_env([("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")], [spark_agent])
+    env.back_propagate(env.state.get_item_by_name("a"))
+    assert fixed(env) == ["a", "b", "c", "d"]
+    assert checks(env.agents[1]) == [[("b", "a"), ("c", "a")], [("d", "b")]]
+
+
+def test_diamond_checks_again_with_another_fixed_cause(spark_agent):
+    spark_agent.fixes = {"b", "c", ("d", "c")}
+    env = make_env([("a", "b"), ("a", "c"), ("b", "d"), ("c", "d"), ("d", "e")], [spark_agent])
+    env.back_propagate(env.state.get_item_by_name("a"))
+    assert fixed(env) == ["a", "b", "c", "d"]
+    assert checks(env.agents[1]) == [[("b", "a"), ("c", "a")], [("d", "b")], [("d", "c")], [("e", "d")]]
+
+
+def test_unfixed_effects_stop_the_propagation(spark_agent):
+    spark_agent.fixes = {"b"}
+    env = make_env([("a", "b"), ("a", "c"), ("c", "d")], [spark_agent])
+    env.back_propagate(env.state.get_item_by_name("a"))
+    assert fixed(env) == ["a", "b"]
+    assert checks(env.agents[1]) == [[("b", "a"), ("c", "a")]]
+
+
+def test_one_batch_per_agent_and_round(spark_agent, yarn_agent):
+    products = {"b": Product.YARN.value, "d": Product.YARN.value}
+    env = make_env([("a", "b"), ("a", "c"), ("a", "d"), ("b", "e"), ("c", "f")], [spark_agent, yarn_agent],
+                   products=products)
+    env.back_propagate(env.state.get_item_by_name("a"))
+    assert fixed(env) == ["a", "b", "c", "d", "e", "f"]
+    assert checks(env.agents[1]) == [[("c", "a")], [("e", "b"), ("f", "c")]]
+    assert checks(env.agents[2]) == [[("b", "a"), ("d", "a")]]
@@ -0,0 +1,116 @@
+from typing import Dict, List, Optional, Tuple
+from pydantic import Field
+from expertdx.agents import HelperAgent
+from expertdx.agents.history import HISTORY_FILE, open_run_history
+from expertdx.diagnostics import DiagnosticState, create_diagnostic_item
+from expertdx.environments.best_first import BestFirstDiagEnvironment
+
+EXPANSIONS = {
+    "job failed": [("executor oom", 0.9), ("disk full", 0.4), ("slow shuffle", 0.3), ("node lost", 0.2)],
+    "executor memory exceeded": [("large broadcast", 0.5)],
+}
+# verdict and new name of each suspect
+VERDICTS = {
+    "executor oom": ("abnormal", "executor memory exceeded"),
+    "large broadcast": ("root", None),
+    "disk full": ("normal", None),
+}
+
+
+class ScriptedHelper(HelperAgent):
+    """Helper expanding and verifying from a script, each step uses 12 tokens."""
+    expansions: Dict[str, List[Tuple[str, float]]] = Field(default_factory=dict)
+    verdicts: Dict[str, Tuple[str, Optional[str]]] = Field(default_factory=dict)
+
+    def causal_analyze(self, task_id, plot=True, consist_k: int = 3) -> DiagnosticState:
+        self.task_id = task_id
+        open_run_history(self._get_filepath(HISTORY_FILE), reset=True)
+        self.history = []
+        anomaly = create_diagnostic_item(name="job failed", product_id=4, severity_status=3,
+                                         diagnostic_criteria_type="rule", diagnostic_criteria_subtype="rule",
+                                         diagnostic_criteria_name="job failed")
+        anomaly.set_possible_root_cause(False)
+        state = DiagnosticState(diagnostic_items=[anomaly])
+        self.update_history({"step": 0, "action": "causal_analysis", "diagnostic_state": state.to_dict()})
+        return state
+
+    def select(self, state, plot=True, **kwargs):
+        self.step("select", state)
+        return next(item for item in state.diagnostic_items if item.is_abnormal() and not item.is_fixed())
+
+    def expand(self, item, state, plot=True, **kwargs):
+        suspects = []
+        for name, likelihood in self.expansions.get(item.name, []):
+            suspect = create_diagnostic_item(name=name, product_id=4, severity_status=-1)
+            suspect.likelihood = likelihood
+            suspects.append(suspect)
+        state.update(items=suspects, relationships=[{"cause": _.name, "effect": item.name, "description": ""}
+                                                    for _ in suspects])
+        self.step("expand", state)
+        return suspects
+
+    def verify(self, item, state, plot=True, **kwargs):
+        verdict, new_name = self.verdicts[item.name]
+        if verdict == "normal":
+            item.set_normal()
+        else:
+            item.set_abnormal()
+        item.set_possible_root_cause(verdict == "root")
+        if new_name is not None:
+            state.rename_item(item, new_name)
+        self.step("verify", state)
+        return item.is_abnormal()
+
+    def summarize(self):
+        return "summary"
+
+    def step(self, action: str, state: DiagnosticState) -> None:
+        self.iteration += 1
+        self.update_history({"step": self.iteration, "action": action, "diagnostic_state": state.to_dict(),
+                             "tokens": [10, 2, 12]})
+
+
+def make_env(tmp_path, spark_agent, **kwargs) -> BestFirstDiagEnvironment:
+    helper = ScriptedHelper(llm=spark_agent.llm, data_dir=str(tmp_path), async_plot=False,
+                            expansions=EXPANSIONS, verdicts=VERDICTS)
+    return BestFirstDiagEnvironment(agents=[helper, spark_agent], **kwargs)
+
+
+def test_analyzes_the_best_candidate_first(tmp_path, spark_agent):
+    env = make_env(tmp_path, spark_agent, beam_width=2)
+    root_causes, _ = env.run("task", plot=False)
+    assert [item.name for item in root_causes] == ["large broadcast"]
+    assert env.state.is_fixed()
+    # disk full (score 0.58) is left for large broadcast (0.8), one level deeper under the renamed suspect
+    assert env.helper.iteration == 5
+    assert env.get_depth(env.state.get_item_by_name("executor memory exceeded")) == 1
+    assert env.get_depth(env.state.get_item_by_name("large broadcast")) == 2
+    assert "executor oom" not in env.depths
+    assert [item.name for _, item in env.pruned] == ["slow shuffle", "node lost"]
+    assert env.ranked_candidates() == []
+
+
+def test_stops_at_the_step_budget_with_confirmed_causes_only(tmp_path, spark_agent):
+    env = make_env(tmp_path, spark_agent, beam_width=2, max_steps=3)
+    root_causes, _ = env.run("task", plot=False)
+    assert root_causes == [] and env.ranked_root_causes() == []
+    assert env.helper.iteration == 4        # the analysis of `executor oom` started at step 3
+    assert not env.state.is_fixed()
+    candidates = env.ranked_candidates()
+    assert [item.name for item, _ in candidates] == ["large broadcast", "disk full", "slow shuffle", "node lost"]
+    assert [round(score, 2) for _, score in candidates] == [0.8, 0.58, 0.46, 0.34]
+
+
+def test_stops_at_the_token_budget(tmp_path, spark_agent):
+    env = make_env(tmp_path, spark_agent, max_tokens=30)
+    env.run("task", plot=False)
+    # checked before each analysis, the verify and expand of `executor oom` run past it
+    assert env.helper.iteration == 4
+    assert env.get_used_tokens() == 48
+
+
+def test_unbounded_beam_keeps_all_candidates(tmp_path, spark_agent):
+    env = make_env(tmp_path, spark_agent, beam_width=0, max_steps=2)
+    env.run("task", plot=False)
+    assert env.pruned == []
+    assert len(env.frontier) == 4
@@ -0,0 +1,77 @@
+from expertdx.llms.budget import ContextBudget, Tokenizer, ELISION_MARKER
+
+
+def text(tokens: int, tag: str = "x") -> str:
+    # 4 characters per token with the approximate tokenizer
+    return (tag * 4) * tokens
+
+
+def prompt_tokens(budget: ContextBudget, messages) -> int:
+    return sum(budget._count_message(message) for message in messages)
+
+
+def conversation(turns: int):
+    messages = [{"role": "system", "content": text(100, "s")}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": text(2000, str(i % 10))})
+        messages.append({"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{i}", "type": "function", "function": {"name": "get_log", "arguments": "{}"}}]})
+        messages.append({"role": "tool", "tool_call_id": f"call_{i}", "name": "get_log", "content": text(200, "t")})
+    return messages
+
+
+def test_elide_keeps_head_and_tail():
+    tokenizer = Tokenizer()
+    elided = tokenizer.elide("a" * 400 + "b" * 400, 100)
+    assert elided.startswith("a") and elided.endswith("b")
+    assert tokenizer.count(elided) <= 100
+    assert "tokens elided" in elided
+    assert tokenizer.elide("short", 100) == "short"
+
+
+def test_fits_within_budget_keeping_system_and_latest_turns(counting_llm):
+    budget = ContextBudget(context_window=8000, tokenizer="approx")
+    counting_llm.context_budget = budget
+    messages = conversation(5)
+    fitted = counting_llm.fit_context(messages, max_tokens=1000)
+    assert prompt_tokens(budget, messages) > 7000
+    assert prompt_tokens(budget, fitted) <= 7000
+    assert budget.last_metrics["budget"] == 7000 and budget.truncated_calls == 1
+
+    assert fitted[0] == messages[0]
+    # the latest turns are kept whole, the oldest ones are elided first
+    assert fitted[-6:] == messages[-6:]
+    assert fitted[-9]["content"] != messages[-9]["content"] and fitted[-9]["content"].startswith("2222")
+    assert fitted[1]["content"] == ELISION_MARKER.format(2000).strip()
+    assert budget.elided_tokens == prompt_tokens(budget, messages) - prompt_tokens(budget, fitted)
+
+
+def test_tool_messages_stay_with_their_calls():
+    budget = ContextBudget(context_window=6000, tokenizer="approx")
+    messages = conversation(4)
+    fitted = budget.fit(messages)
+    assert len(fitted) == len(messages)
+    for message, original in zip(fitted, messages):
+        assert message["role"] == original["role"]
+        assert message.get("tool_calls") == original.get("tool_calls")
+        assert message.get("tool_call_id") == original.get("tool_call_id")
+        if message["role"] == "tool":
+            assert message["content"]
+
+
+def test_reserves_completion_and_tools():
+    budget = ContextBudget(context_window=4000, tokenizer="approx")
+    tools = [{"type": "function", "function": {"name": "get_log", "description": text(200)}}]
+    messages = [{"role": "system", "content": text(100, "s")}, {"role": "user", "content": text(2000)}]
+    fitted = budget.fit(messages, tools=tools, max_tokens=500, n=2)
+    assert budget.last_metrics["budget"] < 3000
+    assert prompt_tokens(budget, fitted) <= budget.last_metrics["budget"]
+    assert fitted[0] == messages[0]
+
+
+def test_short_prompts_pass_unchanged(counting_llm):
+    messages = conversation(1)
+    assert counting_llm.fit_context(messages) is messages
+    counting_llm.context_budget = ContextBudget(tokenizer="approx")
+    assert counting_llm.fit_context(messages) is messages
+    assert counting_llm.context_budget.get_stats()["truncated_calls"] == 0
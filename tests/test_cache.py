@@ -0,0 +1,56 @@
+import time
+from expertdx.llms.cache import CacheStore, CachedLLM, request_key
+
+MESSAGES = [{"role": "user", "content": "why did the job fail?"}]
+
+
+def test_request_key_is_order_independent():
+    assert request_key(MESSAGES, a=1, b=2) == request_key(MESSAGES, b=2, a=1)
+    assert request_key(MESSAGES, a=1) != request_key(MESSAGES, a=2)
+
+
+def test_store_expires_entries(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite"), ttl=0.05)
+    store.put("key", {"value": 1})
+    assert store.get("key") == {"value": 1}
+    time.sleep(0.1)
+    assert store.get("key") is None
+    store.close()
+
+
+def test_store_evicts_least_recently_accessed(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite"), max_size_mb=250 / 2 ** 20)
+    store.put("old", {"value": "x" * 100})
+    time.sleep(0.01)
+    store.put("new", {"value": "y" * 100})
+    time.sleep(0.01)
+    store.get("old")
+    store.put("newest", {"value": "z" * 100})
+    assert store.get("new") is None
+    assert store.get("old") is not None and store.get("newest") is not None
+    store.close()
+
+
+def test_cached_llm_reuses_deterministic_answers(tmp_path, counting_llm):
+    llm = CachedLLM(llm=counting_llm, cache_path=str(tmp_path / "cache.sqlite"))
+    first = llm.generate_response(MESSAGES)
+    second = llm.generate_response(MESSAGES)
+    assert llm.llm.calls == 1
+    assert second.message.content == first.message.content
+    assert second.total_tokens == first.total_tokens
+    assert llm.get_stats() == {"hits": 1, "misses": 1, "bypasses": 0}
+
+    llm.generate_response(MESSAGES, max_tokens=100)
+    assert llm.llm.calls == 2
+
+
+def test_cached_llm_bypasses_sampled_requests(tmp_path, counting_llm):
+    llm = CachedLLM(llm=counting_llm, cache_path=str(tmp_path / "cache.sqlite"))
+    llm.generate_response(MESSAGES, temperature=0.7)
+    llm.generate_response(MESSAGES, temperature=0.7)
+    assert llm.llm.calls == 2
+    assert llm.bypasses == 2
+
+    llm.generate_response(MESSAGES, temperature=0.7, use_cache=True)
+    llm.generate_response(MESSAGES, temperature=0.7, use_cache=True)
+    assert llm.llm.calls == 3
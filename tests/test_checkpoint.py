@@ -0,0 +1,53 @@
+import json
+from expertdx.agents.checkpoint import Checkpoint, input_key, open_checkpoint, get_checkpoint
+
+
+def test_replays_recorded_steps_in_order(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    assert checkpoint.replay("select", input_key("state 0")) is None
+    checkpoint.record("select", input_key("state 0"), {"name": "a"})
+    checkpoint.record("verify", input_key("a"), {"node": {"name": "a"}})
+
+    resumed = Checkpoint(path)
+    assert resumed.is_replaying()
+    output = resumed.replay("select", input_key("state 0"))
+    assert output == {"name": "a"}
+    output["name"] = "changed"
+    assert resumed.records[0]["output"] == {"name": "a"}
+    assert resumed.replay("verify", input_key("a")) == {"node": {"name": "a"}}
+    assert not resumed.is_replaying()
+
+
+def test_drops_records_after_divergence(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    for i in range(3):
+        checkpoint.record("select", input_key(f"state {i}"), {"step": i})
+
+    resumed = Checkpoint(path)
+    assert resumed.replay("select", input_key("state 0")) == {"step": 0}
+    assert resumed.replay("select", input_key("other state")) is None
+    resumed.record("select", input_key("other state"), {"step": "new"})
+    with open(path) as f:
+        assert [json.loads(line)["output"] for line in f] == [{"step": 0}, {"step": "new"}]
+
+
+def test_ignores_torn_record(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    checkpoint.record("select", input_key("state 0"), {"step": 0})
+    with open(path, "a") as f:
+        f.write('{"seq": 1, "kind": "ver')
+
+    resumed = Checkpoint(path)
+    assert len(resumed.records) == 1
+    with open(path) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_shared_by_path(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = open_checkpoint(path)
+    assert get_checkpoint(path) is checkpoint
+    assert open_checkpoint(path) is not checkpoint
@@ -0,0 +1,61 @@
+from typing import List
+from expertdx.message import AssistantMessage
+from expertdx.llms.base import BaseLLM, LLMResult
+from expertdx.llms.consistency import SelfConsistency, cause_name_similarity, extract_cause_names
+
+
+class ScriptedLLM(BaseLLM):
+    """Answers the next `n` contents of `answers`, 10 tokens each."""
+    answers: List[str]
+    requests: List[int] = []
+
+    def generate_response(self, messages, n: int = 1, **kwargs) -> LLMResult:
+        self.requests.append(n)
+        contents, self.answers = self.answers[:n], self.answers[n:]
+        messages = [AssistantMessage(content=content) for content in contents]
+        return LLMResult(message=messages[0], finish_reason="stop", messages=messages, finish_reasons=["stop"] * n,
+                         send_tokens=5 * n, recv_tokens=5 * n, total_tokens=10 * n)
+
+
+def same(a, b) -> float:
+    return float(a == b)
+
+
+def test_stops_early_when_samples_agree():
+    llm = ScriptedLLM(answers=["x", "x", "y"])
+    contents, _, response = SelfConsistency(min_k=2, max_k=5).sample(llm, same, messages=[])
+    assert contents == ["x", "x"]
+    assert llm.requests == [2]
+    assert response.total_tokens == 20
+
+
+def test_samples_up_to_max_k_while_they_disagree():
+    llm = ScriptedLLM(answers=["a", "b", "c", "d", "e", "f"])
+    contents, _, response = SelfConsistency(min_k=2, max_k=5, step=2).sample(llm, same, messages=[])
+    assert contents == ["a", "b", "c", "d", "e"]
+    assert llm.requests == [2, 2, 1]
+    assert len(response.messages) == 5 and response.total_tokens == 50
+
+
+def test_majority_sample_comes_first():
+    llm = ScriptedLLM(answers=["y", "x", "z", "x"])
+    contents, parsed, response = SelfConsistency(min_k=2, max_k=4, threshold=0.5).sample(llm, same, messages=[])
+    assert contents == parsed == ["x", "y", "z", "x"]
+    # the choices of the response stay in the order they were sampled
+    assert [message.content for message in response.messages] == ["y", "x", "z", "x"]
+
+
+def test_ties_go_to_the_earliest_sample():
+    assert SelfConsistency.vote(["a", "b", "c"], same) == 0
+    assert SelfConsistency.vote(["a", "b", "b", "a"], same) == 0
+    assert SelfConsistency.vote(["a", "b", "b"], same) == 1
+    assert SelfConsistency.vote([], same) == 0
+
+
+def test_votes_on_parsed_cause_names():
+    llm = ScriptedLLM(answers=["1. Disk full: no space", "1. Executor OOM: heap\n2. Long GC: pauses",
+                               "1. executor oom: memory\n2. long gc pauses: young gen"])
+    contents, parsed, _ = SelfConsistency(min_k=3, max_k=3).sample(
+        llm, cause_name_similarity, parse=extract_cause_names, messages=[])
+    assert parsed == [["executor oom", "long gc"], ["disk full"], ["executor oom", "long gc pauses"]]
+    assert contents[0].startswith("1. Executor OOM")
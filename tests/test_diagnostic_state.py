@@ -0,0 +1,99 @@
+import pytest
+from expertdx.diagnostics import DiagnosticState, create_diagnostic_item, update_item_name
+
+NAMES = ["job failed", "executor lost", "long gc", "disk full"]
+EDGES = [("executor lost", "job failed"), ("long gc", "executor lost"), ("disk full", "executor lost"),
+         ("long gc", "job failed")]
+
+
+def make_state() -> DiagnosticState:
+    items = [create_diagnostic_item(name=name, product_id=4, severity_status=-1) for name in NAMES]
+    state = DiagnosticState(diagnostic_items=items)
+    state.update(relationships=[{"cause": cause, "effect": effect, "description": f"{cause} -> {effect}"}
+                                for cause, effect in EDGES])
+    return state
+
+
+def assert_index_matches_scan(state: DiagnosticState) -> None:
+    names = {item.name for item in state.diagnostic_items} | {"missing"}
+    for name in names:
+        items = [item for item in state.diagnostic_items if item.name == name]
+        if len(items) == 1:
+            assert state.get_item_by_name(name) is items[0]
+        else:
+            with pytest.raises(AssertionError):
+                state.get_item_by_name(name)
+        assert state.get_relationships_by_cause(name) == [rel for rel in state.causal_relationships
+                                                          if rel["cause"] == name]
+        assert state.get_relationships_by_effect(name) == [rel for rel in state.causal_relationships
+                                                           if rel["effect"] == name]
+    for cause in names:
+        for effect in names:
+            rels = [rel for rel in state.causal_relationships if (rel["cause"], rel["effect"]) == (cause, effect)]
+            if rels:
+                assert state.get_relationship_by_cause_and_effect(cause, effect) is rels[0]
+            else:
+                with pytest.raises(ValueError):
+                    state.get_relationship_by_cause_and_effect(cause, effect)
+
+
+def test_update():
+    state = make_state()
+    assert_index_matches_scan(state)
+    state.update(items=[create_diagnostic_item(name="slow disk", product_id=9, severity_status=-1)],
+                 relationships=[{"cause": "slow disk", "effect": "disk full", "description": ""}])
+    assert_index_matches_scan(state)
+
+
+def test_rename_renames_both_edge_ends():
+    state = make_state()
+    item = state.get_item_by_name("executor lost")
+    update_item_name(item, state, "executor killed")
+    assert item.name == "executor killed"
+    assert_index_matches_scan(state)
+    assert [rel["cause"] for rel in state.get_relationships_by_effect("executor killed")] == ["long gc", "disk full"]
+    assert [rel["effect"] for rel in state.get_relationships_by_cause("executor killed")] == ["job failed"]
+    assert state.get_relationships_by_cause("executor lost") == []
+    assert state.get_relationships_by_effect("executor lost") == []
+
+
+def test_rename_onto_an_existing_name():
+    state = make_state()
+    state.rename_item(state.get_item_by_name("disk full"), "long gc")
+    assert_index_matches_scan(state)
+    state.rename_item(state.diagnostic_items[3], "disk full")
+    assert_index_matches_scan(state)
+
+
+def test_replace():
+    state = make_state()
+    new_items = [create_diagnostic_item(name=name, product_id=4, severity_status=-1) for name in ["oom", "gc storm"]]
+    state.replace(state.get_item_by_name("long gc"), new_items)
+    assert [item.name for item in state.diagnostic_items] == ["job failed", "executor lost", "oom", "gc storm",
+                                                              "disk full"]
+    assert all("long gc" not in (rel["cause"], rel["effect"]) for rel in state.causal_relationships)
+    assert_index_matches_scan(state)
+
+
+def test_lists_changed_from_outside():
+    state = make_state()
+    state.diagnostic_items = state.diagnostic_items[:2]
+    state.causal_relationships = state.causal_relationships[:1]
+    assert_index_matches_scan(state)
+
+    state.diagnostic_items.append(create_diagnostic_item(name="long gc", product_id=4, severity_status=-1))
+    state.causal_relationships.append({"cause": "long gc", "effect": "executor lost", "description": ""})
+    assert_index_matches_scan(state)
+
+    state.diagnostic_items.append(create_diagnostic_item(name="long gc", product_id=4, severity_status=-1))
+    assert_index_matches_scan(state)
+
+
+def test_copies_are_indexed_separately():
+    state = make_state()
+    state.get_item_by_name("job failed")
+    snapshot = state.copy(deep=True)
+    update_item_name(snapshot.get_item_by_name("long gc"), snapshot, "gc storm")
+    assert_index_matches_scan(snapshot)
+    assert_index_matches_scan(state)
+    assert state.get_item_by_name("long gc") is state.diagnostic_items[2]
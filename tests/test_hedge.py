@@ -0,0 +1,104 @@
+import time
+import types
+import asyncio
+from expertdx.llms.azure_openai import AzureOpenAIChat
+from expertdx.llms.hedge import HedgePolicy
+
+
+class SlowServer:
+    """Stand-in endpoint: answers in `fast` seconds, except the requests listed in `slow`."""
+
+    def __init__(self, fast: float = 0.001, slow_latency: float = 2.0, slow=()):
+        self.fast = fast
+        self.slow_latency = slow_latency
+        self.slow = set(slow)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def request(self) -> int:
+        self.calls += 1
+        call = self.calls
+        try:
+            await asyncio.sleep(self.slow_latency if call in self.slow else self.fast)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return call
+
+
+def warm_up(policy: HedgePolicy, server: SlowServer) -> None:
+    for _ in range(policy.min_samples):
+        asyncio.run(policy.run(server.request))
+
+
+def test_hedge_cuts_tail_latency():
+    policy = HedgePolicy(min_samples=5, min_delay=0.02, max_extra_ratio=0.5)
+    server = SlowServer(slow={6})
+    warm_up(policy, server)
+    assert policy.get_delay() == 0.02
+
+    start = time.monotonic()
+    answer = asyncio.run(policy.run(server.request))
+    assert time.monotonic() - start < 0.5
+    assert answer == 7        # the duplicate, sent after the primary stalled
+    assert server.cancelled == 1
+    assert policy.get_stats()["hedged"] == 1 and policy.hedge_wins == 1
+
+
+def test_hedge_respects_budget():
+    policy = HedgePolicy(min_samples=5, min_delay=0.01, max_extra_ratio=0.0)
+    server = SlowServer(slow_latency=0.05, slow={6})
+    warm_up(policy, server)
+    assert asyncio.run(policy.run(server.request)) == 6
+    assert policy.hedged == 0
+
+
+def test_hedge_falls_back_when_one_copy_fails():
+    policy = HedgePolicy(min_samples=1, min_delay=0.01, max_extra_ratio=1.0)
+    asyncio.run(policy.run(SlowServer().request))
+    calls = []
+
+    async def request():
+        calls.append(None)
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            return "primary"
+        raise ConnectionError("reset by peer")
+
+    assert asyncio.run(policy.run(request)) == "primary"
+
+
+def test_hedged_stream_forwards_one_copy_to_callback():
+    def chunk(content):
+        delta = types.SimpleNamespace(content=content, tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+
+    calls = []
+
+    async def create(messages, stream, **params):
+        calls.append(None)
+        copy = len(calls)
+
+        async def chunks():
+            if copy == 1:
+                # the primary starts streaming, then stalls long enough to be hedged
+                yield chunk("primary ")
+                await asyncio.sleep(0.1)
+                yield chunk("answer")
+            else:
+                for content in ["backup ", "answer"]:
+                    yield chunk(content)
+        return chunks()
+
+    llm = AzureOpenAIChat(endpoint="https://example.com", apikey="key", rate_limit_key="test_hedge",
+                          hedge=HedgePolicy(min_samples=1, min_delay=0.01, max_extra_ratio=1.0))
+    llm.hedge.latencies.append(0.01)
+    llm.async_client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+    )
+    deltas = []
+    result = llm.generate_response([{"role": "user", "content": "why did it fail?"}], stream=True,
+                                   callback=deltas.append)
+    assert len(calls) == 2
+    assert deltas == ["primary ", "answer"]
+    assert result.message.content == "primary answer"
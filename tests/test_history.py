@@ -0,0 +1,72 @@
+import random
+from expertdx.agents.history import RunHistory, diff_state, apply_state_delta
+
+
+def node(name: str, severity: str = "major") -> dict:
+    return {"name": name, "severity": severity}
+
+
+def edge(cause: str, effect: str) -> dict:
+    return {"cause": cause, "effect": effect, "description": f"{cause} -> {effect}"}
+
+
+def test_delta_round_trip():
+    old = {"nodes": [node("a"), node("b"), node("c")], "edges": [edge("b", "a"), edge("c", "a")]}
+    new = {"nodes": [node("c"), node("a", "normal"), node("d")], "edges": [edge("c", "a"), edge("d", "c")]}
+    delta = diff_state(old, new)
+    assert delta["nodes"] == [node("a", "normal"), node("d")]
+    assert delta["removed_nodes"] == ["b"]
+    assert apply_state_delta(old, delta) == new
+    assert diff_state(new, new) == {}
+
+
+def test_duplicate_names_are_not_delta_encoded():
+    state = {"nodes": [node("a"), node("a")], "edges": []}
+    assert diff_state({"nodes": [], "edges": []}, state) is None
+
+
+def random_states(steps: int):
+    rng = random.Random(0)
+    names = [f"item {i}" for i in range(30)]
+    nodes, edges = {}, {}
+    for _ in range(steps):
+        name = rng.choice(names)
+        if name in nodes and rng.random() < 0.2:
+            del nodes[name]
+            edges = {key: value for key, value in edges.items() if name not in key}
+        else:
+            nodes[name] = node(name, rng.choice(["major", "normal", "unknown"]))
+        if len(nodes) > 1:
+            cause, effect = rng.sample(sorted(nodes), 2)
+            edges[(cause, effect)] = edge(cause, effect)
+        yield {"nodes": list(nodes.values()), "edges": list(edges.values())}
+
+
+def test_rebuilds_the_state_of_every_step(tmp_path):
+    path = str(tmp_path / "run_history.jsonl")
+    history = RunHistory(path, snapshot_every=5)
+    states = list(random_states(40))
+    for i, state in enumerate(states):
+        history.append({"step": i, "action": "verify", "diagnostic_state": state, "tokens": [10, 1, 11]})
+    assert history.snapshots == [0, 5, 10, 15, 20, 25, 30, 35]
+
+    reopened = RunHistory(path, snapshot_every=5)
+    assert len(reopened) == 40
+    for i in [0, 3, 5, 21, 39, -1]:
+        assert reopened.get_record(i)["diagnostic_state"] == states[i]
+    assert [record["diagnostic_state"] for record in reopened.read(with_state=True)] == states
+    assert "diagnostic_state" not in reopened.read()[7]
+    assert reopened.get_tokens() == [400, 40, 440]
+
+
+def test_drops_torn_record(tmp_path):
+    path = str(tmp_path / "run_history.jsonl")
+    history = RunHistory(path)
+    history.append({"step": 1, "action": "select", "diagnostic_state": {"nodes": [node("a")], "edges": []}})
+    with open(path, "a") as f:
+        f.write('{"step": 2, "act')
+
+    reopened = RunHistory(path)
+    assert len(reopened) == 1
+    reopened.append({"step": 2, "action": "verify", "diagnostic_state": {"nodes": [node("a", "normal")], "edges": []}})
+    assert reopened.get_record(1)["diagnostic_state"]["nodes"] == [node("a", "normal")]
@@ -0,0 +1,13 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_time_within_budget():
+    # heavy dependencies and registry entries are loaded on first use, see README
+    result = subprocess.run([sys.executable, "-m", "expertdx.utils.import_time", "--budget-ms", "800"],
+                            cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.count("[ok]") == 3
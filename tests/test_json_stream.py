@@ -0,0 +1,83 @@
+import json
+from expertdx.message import AssistantMessage
+from expertdx.llms.base import BaseLLM, LLMResult
+from expertdx.llms.json_stream import JSONEvent, JSONStreamParser, stream_json
+from expertdx.llms.router import generate_json
+
+CONTENT = json.dumps({
+    "name": "executor OOM",
+    "need_verify": True,
+    "nodes": [{"name": "skewed join", "product": "spark"}, {"name": "small heap {\"x\"}", "product": "yarn"}],
+    "edges": [],
+})
+
+
+def feed(text: str, size: int) -> list:
+    parser = JSONStreamParser()
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+    assert parser.get_result() == json.loads(text[text.find("{"):text.rfind("}") + 1])
+    return events
+
+
+def test_events_do_not_depend_on_chunking():
+    expected = [
+        JSONEvent("name", None, "executor OOM"),
+        JSONEvent("need_verify", None, True),
+        JSONEvent("nodes", 0, {"name": "skewed join", "product": "spark"}),
+        JSONEvent("nodes", 1, {"name": "small heap {\"x\"}", "product": "yarn"}),
+        JSONEvent("nodes", None, json.loads(CONTENT)["nodes"]),
+        JSONEvent("edges", None, []),
+    ]
+    for size in [1, 3, 7, len(CONTENT)]:
+        assert feed(CONTENT, size) == expected
+
+
+def test_skips_code_fence():
+    events = feed("```json\n" + CONTENT + "\n```", 5)
+    assert events[0] == JSONEvent("name", None, "executor OOM")
+
+
+def test_name_arrives_before_the_object_closes():
+    parser = JSONStreamParser()
+    prefix = CONTENT[:CONTENT.index('"nodes"')]
+    assert [event.key for event in parser.feed(prefix)] == ["name", "need_verify"]
+    assert not parser.done
+
+
+class ScriptedLLM(BaseLLM):
+    """Streams the scripted answers one character at a time, one answer per call."""
+
+    answers: list = []
+    calls: int = 0
+
+    def generate_response(self, messages, callback=None, **kwargs) -> LLMResult:
+        content = self.answers[self.calls]
+        self.calls += 1
+        for c in content:
+            if callback is not None:
+                callback(c)
+        return LLMResult(message=AssistantMessage(content=content), finish_reason="stop",
+                         send_tokens=10, recv_tokens=len(content), total_tokens=10 + len(content))
+
+
+def test_stream_json_feeds_unstreamed_responses():
+    class AtOnceLLM(ScriptedLLM):
+        def generate_response(self, messages, callback=None, **kwargs) -> LLMResult:
+            return super().generate_response(messages)
+
+    events = []
+    stream_json(AtOnceLLM(answers=[CONTENT]), events.append, messages=[])
+    assert events[0] == JSONEvent("name", None, "executor OOM")
+
+
+def test_generate_json_reports_rejected_attempt_events():
+    schema = {"name": None, "need_verify": None}
+    llm = ScriptedLLM(answers=['{"name": "gc pause"}'])
+    fallback = ScriptedLLM(answers=['{"name": "executor OOM", "need_verify": false}'])
+    events = []
+    content, response = generate_json(llm, schema, fallback_llm=fallback, on_event=events.append, messages=[])
+    assert content == {"name": "executor OOM", "need_verify": False}
+    assert [event.value for event in events if event.key == "name"] == ["gc pause", "executor OOM"]
+    assert response.send_tokens == 20
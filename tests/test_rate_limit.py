@@ -0,0 +1,120 @@
+import types
+import asyncio
+import httpx
+import openai
+import pytest
+from expertdx.llms.azure_openai import AzureOpenAIChat
+from expertdx.llms.rate_limit import RateLimiter, TokenBucket, configure_rate_limiter
+
+
+def connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://example.com"))
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    bucket.refund(30)
+    assert bucket.wait_time(1) == 0
+
+
+def test_retries_transient_errors():
+    limiter = RateLimiter(max_retries=3, base_delay=0.001)
+    attempts = []
+
+    def flaky():
+        attempts.append(limiter.in_flight)
+        if len(attempts) < 3:
+            raise connection_error()
+        return "ok"
+
+    assert limiter.call(flaky) == "ok"
+    assert attempts == [1, 1, 1]
+    assert limiter.retries == 2 and limiter.in_flight == 0
+
+
+def test_gives_up_after_max_retries():
+    limiter = RateLimiter(max_retries=1, base_delay=0.001)
+
+    def failing():
+        raise connection_error()
+
+    with pytest.raises(openai.APIConnectionError):
+        limiter.call(failing)
+    assert limiter.in_flight == 0
+
+
+def test_raises_other_errors_immediately():
+    limiter = RateLimiter(max_retries=3)
+
+    def failing():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(failing)
+    assert limiter.requests == 1 and limiter.in_flight == 0
+
+
+def test_caps_concurrency():
+    limiter = RateLimiter(max_concurrency=2, poll_interval=0.001)
+    running, peak = [0], [0]
+
+    async def request():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*[limiter.acall(request) for _ in range(6)])
+
+    asyncio.run(main())
+    assert peak[0] == 2
+
+
+def test_settle_refunds_unused_tokens():
+    limiter = RateLimiter(tokens_per_minute=1000)
+    limiter.call(lambda: None, estimated_tokens=800)
+    assert limiter.token_bucket.tokens == pytest.approx(200, abs=1)
+    limiter.settle(800, 100)
+    assert limiter.token_bucket.tokens == pytest.approx(900, abs=1)
+
+
+def test_budgets_split_across_processes():
+    limiter = configure_rate_limiter("test_shares", shares=4, requests_per_minute=300, tokens_per_minute=150000,
+                                     max_concurrency=16)
+    assert limiter.request_bucket.capacity == 75
+    assert limiter.token_bucket.capacity == 37500
+    assert limiter.max_concurrency == 4
+    limiter = configure_rate_limiter("test_shares", shares=32, max_concurrency=16, min_concurrency=2)
+    assert limiter.request_bucket is None and limiter.token_bucket is None
+    assert limiter.max_concurrency == limiter.min_concurrency == 1
+
+
+def test_streamed_response_holds_slot_and_settles_usage():
+    limiter = configure_rate_limiter("test_stream", tokens_per_minute=100000)
+    in_flight, settled = [], []
+    limiter.settle = lambda estimated_tokens, used_tokens: settled.append(used_tokens)
+
+    def chunk(content, finish_reason=None):
+        delta = types.SimpleNamespace(content=content, tool_calls=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(index=0, delta=delta, finish_reason=finish_reason)])
+
+    def create(messages, stream, **params):
+        for content in ["the job ", "ran out of memory"]:
+            in_flight.append(limiter.in_flight)
+            yield chunk(content)
+        yield chunk(None, "stop")
+
+    llm = AzureOpenAIChat(endpoint="https://example.com", apikey="key", rate_limit_key="test_stream")
+    llm.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    deltas = []
+    result = llm.generate_response([{"role": "user", "content": "why did it fail?"}], stream=True,
+                                   callback=deltas.append)
+
+    assert result.message.content == "the job ran out of memory"
+    assert deltas == ["the job ", "ran out of memory"]
+    assert in_flight == [1, 1] and limiter.in_flight == 0
+    assert result.total_tokens == result.send_tokens + result.recv_tokens > 0
+    assert settled == [result.total_tokens]
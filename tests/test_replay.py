@@ -0,0 +1,45 @@
+import json
+import asyncio
+import pytest
+from expertdx.llms.replay import ReplayLLM
+
+MESSAGES = [{"role": "user", "content": "why did the job fail?"}]
+
+
+def test_replays_recorded_responses_in_order(tmp_path, counting_llm):
+    path = str(tmp_path / "cassettes" / "run.jsonl")
+    recorder = ReplayLLM(mode="record", cassette_path=path, llm=counting_llm)
+    recorded = [recorder.generate_response(MESSAGES, temperature=0.7).message.content for _ in range(2)]
+    recorder.generate_response(MESSAGES, temperature=0)
+    with open(path) as f:
+        assert len([json.loads(line) for line in f]) == 3
+
+    player = ReplayLLM(mode="replay", cassette_path=path)
+    replayed = [player.generate_response(MESSAGES, temperature=0.7).message.content for _ in range(3)]
+    assert replayed == recorded + recorded[:1]
+    assert player.generate_response(MESSAGES, temperature=0).message.content == "answer 3"
+    assert asyncio.run(player.agenerate_response(MESSAGES, temperature=0)).total_tokens == 12
+
+
+def test_unrecorded_request_fails(tmp_path, counting_llm):
+    path = str(tmp_path / "run.jsonl")
+    ReplayLLM(mode="record", cassette_path=path, llm=counting_llm).generate_response(MESSAGES)
+    player = ReplayLLM(mode="replay", cassette_path=path)
+    with pytest.raises(ValueError):
+        player.generate_response(MESSAGES, max_tokens=10)
+    with pytest.raises(FileNotFoundError):
+        ReplayLLM(mode="replay", cassette_path=str(tmp_path / "missing.jsonl"))
+
+
+def test_seeded_latency_is_reproducible(tmp_path, counting_llm):
+    path = str(tmp_path / "run.jsonl")
+    ReplayLLM(mode="record", cassette_path=path, llm=counting_llm).generate_response(MESSAGES)
+    latency = {"type": "uniform", "low": 0, "high": 0.01}
+    samples = []
+    for _ in range(2):
+        player = ReplayLLM(mode="replay", cassette_path=path, latency=latency, seed=7)
+        samples.append([player._get_latency({}) for _ in range(3)])
+    assert samples[0] == samples[1]
+
+    player = ReplayLLM(mode="replay", cassette_path=path, latency={"type": "recorded", "scale": 2})
+    assert player._get_latency({"latency": 0.5}) == 1.0
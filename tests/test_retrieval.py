@@ -0,0 +1,73 @@
+import multiprocessing
+from expertdx.diagnostics import DiagnosticState, create_diagnostic_item
+from expertdx.retrieval import MinHasher, LSHIndex, IncidentIndex, jaccard
+
+
+def tokens(n: int, start: int = 0) -> list:
+    return [f"token:{i}" for i in range(start, start + n)]
+
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    a, b = tokens(100), tokens(100, start=50)      # jaccard 1/3
+    estimate = hasher.similarity(hasher.signature(a), hasher.signature(b))
+    assert abs(estimate - jaccard(a, b)) < 0.1
+    assert hasher.signature(a) == MinHasher(num_perm=256).signature(reversed(a))
+    assert hasher.similarity(hasher.signature(a), hasher.signature(a)) == 1.0
+
+
+def test_lsh_finds_near_duplicates_only():
+    hasher = MinHasher(num_perm=64)
+    index = LSHIndex(num_perm=64, bands=16)
+    index.insert("near", hasher.signature(tokens(20) + ["extra"]))
+    index.insert("far", hasher.signature(tokens(20, start=1000)))
+    assert index.query(hasher.signature(tokens(20))) == {"near"}
+
+    index.remove("near", hasher.signature(tokens(20) + ["extra"]))
+    assert index.query(hasher.signature(tokens(20))) == set()
+
+
+def make_state(rules) -> DiagnosticState:
+    items = [create_diagnostic_item(name=name, product_id=product_id, severity_status=2,
+                                    diagnostic_criteria_type="rule", diagnostic_criteria_subtype="rule",
+                                    diagnostic_criteria_name=name, diagnostic_criteria_description="")
+             for name, product_id in rules]
+    return DiagnosticState(diagnostic_items=items)
+
+
+def test_incident_index_persists_and_reuses_relationships(tmp_path):
+    path = str(tmp_path / "incidents.json")
+    rules = [("executor lost", 4), ("container killed", 7), ("long gc", 4)]
+    state = make_state(rules)
+    state.update(relationships=[{"cause": "long gc", "effect": "executor lost", "description": "gc pauses"}])
+
+    index = IncidentIndex(path=path)
+    index.add("task-1", state, root_causes=[state.get_item_by_name("long gc")])
+    index.add("task-2", make_state([("slow shuffle", 4), ("disk full", 9)]), root_causes=[])
+
+    reloaded = IncidentIndex(path=path)
+    assert len(reloaded) == 2
+    matches = reloaded.query(make_state(rules))
+    assert [match["task_id"] for match in matches] == ["task-1"]
+    assert matches[0]["similarity"] == 1.0
+    assert reloaded.reuse_relationships(make_state(rules[:2])) is None
+    assert reloaded.reuse_relationships(make_state(rules)) == state.causal_relationships
+    assert reloaded.query(make_state(rules), exclude="task-1") == []
+
+
+def add_incidents(path: str, worker: int, count: int) -> None:
+    index = IncidentIndex(path=path)
+    for i in range(count):
+        index.add(f"task-{worker}-{i}", make_state([(f"rule {worker} {i}", 4)]), root_causes=[])
+
+
+def test_concurrent_saves_keep_all_incidents(tmp_path):
+    path = str(tmp_path / "incidents.json")
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=add_incidents, args=(path, worker, 20)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert all(process.exitcode == 0 for process in workers)
+    assert len(IncidentIndex(path=path)) == 80
@@ -0,0 +1,112 @@
+import gzip
+import os
+import pytest
+from expertdx.tools.log_analyzer.scanner import LogScanner, format_scans
+
+
+def write_log(path, lines):
+    text = "\n".join(lines) + "\n"
+    if str(path).endswith(".gz"):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+    elif str(path).endswith(".zst"):
+        zstandard = pytest.importorskip("zstandard")
+        with open(path, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(text.encode("utf-8")))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return str(path)
+
+
+def executor_log(n: int = 200) -> list:
+    lines = [f"24/03/01 12:00:00 INFO Executor: Finished task {i}.0 in stage 3.0" for i in range(n)]
+    lines[50] = "24/03/01 12:00:05 ERROR Executor: Exception in task 50.0 in stage 3.0"
+    lines[51] = "java.lang.OutOfMemoryError: Java heap space"
+    lines[53] = "24/03/01 12:00:06 WARN YarnAllocator: Container killed by YARN for exceeding memory limits"
+    lines[150] = "Container exited with a non-zero exit code 143"
+    return lines
+
+
+def windows(result):
+    return [(_.first_line, _.lines, _.hits) for _ in result.windows]
+
+
+def test_finds_signatures_with_line_numbers(tmp_path):
+    lines = executor_log()
+    result = LogScanner(context=2).scan(write_log(tmp_path / "stderr", lines))
+    assert result.error is None and result.dropped == 0
+    assert result.counts == {"exception": 1, "oom": 2, "error": 1, "yarn_kill": 1, "exit_code": 1}
+    # the matches at lines 51, 52 and 54 share one window
+    assert windows(result)[0] == (49, lines[48:56], [51, 52, 54])
+    assert windows(result)[1] == (149, lines[148:153], [151])
+
+
+SPACED = ["ERROR a", "x", "y", "z", "w", "ERROR b", "q"]
+DENSE = [f"line {i}" if i % 4 else f"ERROR at {i}" for i in range(40)]
+APART = [f"line {i}" if i % 6 else f"ERROR at {i}" for i in range(60)]
+
+
+@pytest.mark.parametrize("lines,context,max_windows", [
+    (executor_log(), 3, 50), (SPACED, 2, 50), (SPACED, 1, 50), (SPACED, 2, 1), (SPACED, 1, 1),
+    (DENSE, 1, 50), (DENSE, 1, 2), (APART, 2, 50), (APART, 2, 3), (APART, 3, 50), (["ERROR only"], 2, 50),
+])
+def test_mmap_and_stream_agree(tmp_path, lines, context, max_windows):
+    scanner = LogScanner(context=context, max_windows=max_windows)
+    plain = scanner.scan(write_log(tmp_path / "stderr", lines))
+    gz = scanner.scan(write_log(tmp_path / "stderr.gz", lines))
+    assert plain.error is None and gz.error is None
+    assert gz.counts == plain.counts
+    assert windows(gz) == windows(plain)
+    assert gz.dropped == plain.dropped
+
+
+def test_nearby_hits_share_a_window(tmp_path):
+    # within 2 * context + 1 lines the windows of two hits adjoin
+    result = LogScanner(context=2).scan(write_log(tmp_path / "spaced.log.gz", SPACED))
+    assert windows(result) == [(1, SPACED, [1, 6])]
+    result = LogScanner(context=1).scan(write_log(tmp_path / "spaced.log.gz", SPACED))
+    assert windows(result) == [(1, SPACED[:2], [1]), (5, SPACED[4:], [6])]
+
+
+def test_zst(tmp_path):
+    lines = executor_log()
+    scanner = LogScanner(context=3)
+    zst = scanner.scan(write_log(tmp_path / "stderr.zst", lines))
+    assert windows(zst) == windows(scanner.scan(write_log(tmp_path / "stderr", lines)))
+
+
+def test_windows_at_file_edges(tmp_path):
+    lines = ["ERROR first", "a", "b", "c", "d", "e", "ERROR last"]
+    for name in ("edges.log", "edges.log.gz"):
+        result = LogScanner(context=2).scan(write_log(tmp_path / name, lines))
+        assert windows(result) == [(1, lines[:3], [1]), (5, lines[4:], [7])]
+
+
+def test_max_windows(tmp_path):
+    lines = [f"line {i}" if i % 10 else f"ERROR at {i}" for i in range(100)]
+    for name in ("many.log", "many.log.gz"):
+        result = LogScanner(context=1, max_windows=3).scan(write_log(tmp_path / name, lines))
+        assert len(result.windows) == 3
+        assert result.dropped == 7
+        assert result.counts == {"error": 10}
+
+
+def test_missing_and_empty_files(tmp_path):
+    scanner = LogScanner()
+    missing = scanner.scan(str(tmp_path / "missing.log"))
+    assert missing.error.startswith("FileNotFoundError")
+    empty = scanner.scan(write_log(tmp_path / "empty.log", []))
+    assert empty.error is None and empty.windows == []
+
+
+def test_format_scans(tmp_path):
+    scanner = LogScanner(context=1)
+    paths = [write_log(tmp_path / "stderr", executor_log()), write_log(tmp_path / "clean.log", ["all good"]),
+             str(tmp_path / "missing.log")]
+    report = format_scans(scanner.scan_all(paths, workers=1), root=str(tmp_path))
+    assert report.startswith("scanned 3 logs")
+    assert "== stderr: " in report and "clean.log" not in report
+    assert "== missing.log: failed to scan, FileNotFoundError" in report
+    assert ">     52| java.lang.OutOfMemoryError: Java heap space" in report
+    assert "      53| " in report
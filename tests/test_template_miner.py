@@ -0,0 +1,51 @@
+from expertdx.tools.log_analyzer.template_miner import TemplateMiner, WILDCARD
+
+
+def spark_log(tasks: int) -> list:
+    lines = []
+    for i in range(tasks):
+        lines.append(f"24/03/01 12:00:{i % 60:02d} INFO Executor: Finished task {i}.0 in stage 3.0 (TID {100 + i}). "
+                     f"{2000 + i} bytes result sent to driver")
+    lines.append("24/03/01 12:01:00 ERROR Executor: Exception in task 7.0 in stage 3.0 (TID 107)")
+    lines.append("java.lang.OutOfMemoryError: Java heap space")
+    lines.append("\tat java.util.Arrays.copyOf(Arrays.java:3236)")
+    lines.append("\tat java.io.ByteArrayOutputStream.grow(ByteArrayOutputStream.java:118)")
+    return lines
+
+
+def test_mines_one_template_per_message_shape():
+    miner = TemplateMiner().add_lines(spark_log(100))
+    assert miner.total_lines == 104
+    finished = next(_ for _ in miner.templates if "Finished" in _.template)
+    assert finished.count == 100
+    assert finished.template == (f"INFO Executor: Finished task {WILDCARD} in stage {WILDCARD} (TID {WILDCARD}). "
+                                 f"{WILDCARD} bytes result sent to driver")
+    assert finished.first_timestamp == "24/03/01 12:00:00" and finished.last_timestamp == "24/03/01 12:00:39"
+    assert finished.samples[0] == ["0.0", "3.0", "100", "2000"]
+    assert len(finished.samples) == 3
+
+
+def test_errors_first_with_their_stack():
+    miner = TemplateMiner().add_lines(spark_log(10))
+    templates = miner.get_templates()
+    assert templates[0].level == "ERROR"
+    assert templates[0].stack == []
+    oom = next(_ for _ in templates if "OutOfMemoryError" in _.template)
+    assert oom.is_severe()
+    assert oom.stack == ["at java.util.Arrays.copyOf(Arrays.java:3236)",
+                         "at java.io.ByteArrayOutputStream.grow(ByteArrayOutputStream.java:118)"]
+
+
+def test_memory_is_bounded_by_templates():
+    miner = TemplateMiner(max_templates=2)
+    miner.add_lines(f"unrelated message shape number {'x ' * i}" for i in range(10))
+    assert len(miner.templates) == 2
+    assert miner.unmatched == 8
+    assert "8 lines beyond 2 templates not mined" in miner.summarize()
+
+
+def test_summary_is_compact():
+    miner = TemplateMiner().add_lines(spark_log(5000))
+    summary = miner.summarize(max_templates=50)
+    assert summary.startswith("5004 log lines mined into 3 templates")
+    assert len(summary) < 2000
@@ -0,0 +1,60 @@
+import re
+import json
+import time
+from expertdx.message import AssistantMessage
+from expertdx.llms.base import BaseLLM, LLMResult
+from expertdx.agents.helper_agent.agent import HelperAgent
+from expertdx.diagnostics import DiagnosticState, create_diagnostic_item
+
+SUSPECTS = ["executor oom", "disk full", "slow shuffle", "node lost"]
+
+
+class VerifyLLM(BaseLLM):
+    """Answers verify conversations, the tool loop of earlier suspects takes longer so they complete last."""
+
+    def generate_response(self, messages, **kwargs) -> LLMResult:
+        name = re.search(r"If `(.+?)` can be definitively identified", messages[1]["content"]).group(1)
+        index = SUSPECTS.index(name)
+        if "response_format" in kwargs:
+            content = json.dumps({
+                "name": f"{name} confirmed" if index % 2 == 0 else name,
+                "symptom": f"symptom of {name}",
+                "severity": "major" if index % 2 == 0 else "normal",
+                "diagnostic_criteria": {"name": name, "type": "log", "description": ""},
+                "expert_suggests": "",
+                "expert_analysis": f"analysis of {name}",
+            })
+        else:
+            time.sleep(0.05 * (len(SUSPECTS) - index))
+            content = f"summary of {name}"
+        return LLMResult(message=AssistantMessage(content=content), finish_reason="stop",
+                         send_tokens=10, recv_tokens=2, total_tokens=12)
+
+
+def make_agent(tmp_path, task_id: str):
+    agent = HelperAgent(llm=VerifyLLM(), data_dir=str(tmp_path), task_id=task_id, async_plot=False)
+    anomaly = create_diagnostic_item(name="job failed", product_id=4, severity_status=3, diagnostic_criteria_type="rule",
+                                     diagnostic_criteria_subtype="rule", diagnostic_criteria_name="job failed")
+    suspects = [create_diagnostic_item(name=name, product_id=4, severity_status=-1) for name in SUSPECTS]
+    state = DiagnosticState(diagnostic_items=[anomaly] + suspects)
+    state.update(relationships=[{"cause": name, "effect": "job failed", "description": ""} for name in SUSPECTS])
+    return agent, state
+
+
+def test_verify_batch_applies_results_in_sibling_order(tmp_path):
+    sequential, sequential_state = make_agent(tmp_path, "sequential")
+    expected = [sequential.verify(sequential_state.get_item_by_name(name), sequential_state, plot=False)
+                for name in SUSPECTS]
+
+    batched, state = make_agent(tmp_path, "batched")
+    items = [state.get_item_by_name(name) for name in SUSPECTS]
+    assert batched.verify_batch(items, state, max_workers=len(SUSPECTS), plot=False) == expected == \
+        [True, False, True, False]
+    assert batched.iteration == sequential.iteration == len(SUSPECTS)
+    assert state.to_dict() == sequential_state.to_dict()
+    assert [(info["step"], info["node_name"]) for info in batched.history] == \
+        [(info["step"], info["node_name"]) for info in sequential.history] == \
+        [(1, "executor oom confirmed"), (2, "disk full"), (3, "slow shuffle confirmed"), (4, "node lost")]
+    for step, name in enumerate(SUSPECTS, 1):
+        with open(tmp_path / "batched" / "results" / f"step{step}_query_summary.md") as f:
+            assert f.read() == f"summary of {name}"